@@ -1,84 +1,69 @@
-import PyPDF2
-import pandas as pd
-import re
+import argparse
+
+from csv_pipeline import stream_pdf_to_csv
+from dataset_artifact import write_artifact
+from page_cache import DEFAULT_CACHE_DIR, DEFAULT_MAX_BYTES, PageCache
+from record_tokenizer import tokenize_page
 
 
 def process_text(texts):
     all_rows = []  # Initialize a list to hold all processed data rows
     # Loop through each text chunk (usually each page of the PDF)
     for text in texts:
-        # Find all start positions of dates in the text using regular expression
-        date_starts = [match.start() for match in re.finditer(
-            r'\d{2}/[A-Za-z]{3}/20\d{2}', text)]
-        # Segment the text into individual records, because each new date marks the start of a new record
-        segments = [text[date_starts[i]:date_starts[i + 1]]
-                    for i in range(len(date_starts) - 1)]
-        # If there are dates found, add the segment from the last date to the end of the text
-        if date_starts:
-            segments.append(text[date_starts[-1]:])
-
-        for segment in segments:  # Loop through each segmented text
-            # Search for the date and denomination within each text segment
-            date_match = re.search(r'\d{2}/[A-Za-z]{3}/20\d{2}', segment)
-            denomination_match = re.search(
-                r'(1,000|10,000|1,00,000|10,00,000|1,00,00,000|10,00,00,000)', segment)
-            # Check if both a date and a denomination are found
-            if date_match and denomination_match:
-                # Extract the date and denomination information
-                date_of_purchase = date_match.group()
-                denomination = denomination_match.group().replace(
-                    ',', '')  # Remove commas for numerical conversion
-                # Extract the purchaser name by removing the date and denomination from the segment
-                purchaser_name = segment.replace(date_of_purchase, '').replace(
-                    denomination_match.group(), '').strip()
-                # Append the processed data row to the all_rows list
-                all_rows.append(
-                    [date_of_purchase, purchaser_name, int(denomination)])
+        # Walk the page once, collecting (date, name, denomination) records
+        all_rows.extend(tokenize_page(text).records)
 
     return all_rows  # Return the list of processed data rows
 
 
-def convert_pdf_to_csv(pdf_path, csv_path):
-    with open(pdf_path, 'rb') as file:  # Open the PDF file
-        reader = PyPDF2.PdfReader(file)  # Create a PDF reader object
-        texts = []  # List to hold text extracted from each page
+def convert_pdf_to_csv(pdf_path, csv_path, workers=None, cache=None, resume=False):
+    # Columns of the output CSV, 'Sr No.' is numbered in page order by the pipeline
+    columns = ['Sr No.', 'Date of Purchase', 'Purchaser Name', 'Denomination']
+
+    # Stream each page's rows into the CSV as soon as the page is extracted; pages are extracted
+    # across `workers` processes (all cores by default, 1 for a serial run) and always come back
+    # in page order. Pages found in the optional page cache are not extracted again, and with
+    # `resume` an interrupted run continues after the last completed page.
+    for i, page in stream_pdf_to_csv(pdf_path, csv_path, columns, workers=workers, cache=cache, resume=resume):
+        print(f"Page {i + 1} completed")  # Print status message
 
-        # Loop through each page in the PDF
-        for i, page in enumerate(reader.pages):
-            text = page.extract_text()  # Extract text from the current page
-            print(f"Page {i + 1} completed")  # Print status message
-            texts.append(text)  # Add the extracted text to the texts list
+        # Perform consistency checks between dates and denominations
+        if page.date_count != page.denomination_count:
+            # Print warning if there is a mismatch on the current page
+            print(
+                f"Mismatch found on Page {i + 1}: Date of Encashment Length = {page.date_count}, Denomination Length = {page.denomination_count}")
 
-            # Perform consistency checks between dates and denominations
-            date_matches = re.findall(r'\d{2}/[A-Za-z]{3}/20\d{2}', text)
-            denomination_matches = re.findall(
-                r'(1,000|10,000|1,00,000|10,00,000|1,00,00,000|10,00,00,000)', text)
-            # Check if counts of dates and denominations match
-            if len(date_matches) != len(denomination_matches):
-                # Print warning if there is a mismatch on the current page
-                print(
-                    f"Mismatch found on Page {i + 1}: Date of Encashment Length = {len(date_matches)}, Denomination Length = {len(denomination_matches)}")
+    # Print completion message
+    print("\nConversion to CSV completed for Purchaser PDF Data.")
 
-        # Process the extracted text to get data rows
-        data = process_text(texts)
-        # Convert the data rows into a pandas DataFrame
-        df = pd.DataFrame(
-            data, columns=['Date of Purchase', 'Purchaser Name', 'Denomination'])
-        # Convert 'Denomination' column to numerical format
-        df['Denomination'] = df['Denomination'].replace(
-            {',': ''}, regex=True).astype(int)
-        # Insert a 'Sr No.' column as the first column
-        df.insert(0, 'Sr No.', range(1, 1 + len(df)))
-        # Write the DataFrame to a CSV file
-        df.to_csv(csv_path, index=False)
-        # Print completion message
-        print("\nConversion to CSV completed for Purchaser PDF Data.")
+    # Write the typed columnar copy of the CSV that load_data_purchaser memory-maps
+    print(f"Dataset artifact written to {write_artifact(csv_path, 'Date of Purchase', 'Purchaser Name')}")
 
 
 if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description='Convert the Purchaser Details PDF into CSV')
+    parser.add_argument('--workers', type=int, default=None,
+                        help='Number of processes used to extract pages (default: number of cores, 1 = serial)')
+    parser.add_argument('--cache-dir', default=DEFAULT_CACHE_DIR,
+                        help='Directory of the page cache used to skip unchanged pages on re-runs')
+    parser.add_argument('--cache-size-mb', type=int, default=DEFAULT_MAX_BYTES // (1024 * 1024),
+                        help='Size cap of the page cache, least recently used pages are evicted beyond it')
+    parser.add_argument('--no-cache', action='store_true',
+                        help='Extract every page, without reading or writing the page cache')
+    parser.add_argument('--resume', action='store_true',
+                        help='Continue an interrupted conversion after its last completed page')
+    args = parser.parse_args()
+    cache = None if args.no_cache else PageCache(
+        args.cache_dir, max_bytes=args.cache_size_mb * 1024 * 1024)
+
     # Set the path to Purchaser Details PDF and output CSV file
     pdf_path = './pdf_data/Purchaser_Details_Final.pdf'
     csv_path = '01_Purchaser_Details.csv'
 
     # Convert the PDF to CSV
-    convert_pdf_to_csv(pdf_path, csv_path)
+    convert_pdf_to_csv(pdf_path, csv_path, workers=args.workers, cache=cache, resume=args.resume)
+
+    if cache is not None:
+        print(f"Page cache: {cache.stats()}")
+        cache.close()
@@ -1,88 +1,71 @@
-import PyPDF2  # Import PyPDF2 for reading PDF files
-import pandas as pd  # Import pandas for data manipulation
-import re  # Import re for regular expressions
+import argparse  # Import argparse for command line options
+
+from csv_pipeline import stream_pdf_to_csv  # Streaming page -> records -> CSV pipeline
+from dataset_artifact import write_artifact  # Typed columnar copy of the CSV for the app
+from page_cache import DEFAULT_CACHE_DIR, DEFAULT_MAX_BYTES, PageCache  # On-disk cache of extracted pages
+from record_tokenizer import tokenize_page  # Single-pass page tokenizer shared by both cleaners
 
 
 def process_text(texts):
     all_rows = []  # List to store all rows of data
     # Loop through each extracted text block (typically one per PDF page)
     for text in texts:
-        # Find all starting positions of date strings within the text using a regular expression
-        date_starts = [match.start() for match in re.finditer(
-            r'\d{2}/[A-Za-z]{3}/20\d{2}', text)]
-        # Create segments of text between each pair of dates (assuming each segment is a record)
-        segments = [text[date_starts[i]:date_starts[i + 1]]
-                    for i in range(len(date_starts) - 1)]
-        # If there are dates, add the last segment from the last date to the end of text
-        if date_starts:
-            segments.append(text[date_starts[-1]:])
-
-        for segment in segments:  # Process each text segment
-            # Find the date and denomination in the segment using regular expressions
-            date_match = re.search(r'\d{2}/[A-Za-z]{3}/20\d{2}', segment)
-            denomination_match = re.search(
-                r'(1,000|10,000|1,00,000|10,00,000|1,00,00,000|10,00,00,000)', segment)
-            # If both a date and a denomination were found
-            if date_match and denomination_match:
-                date_of_purchase = date_match.group()  # Extract the date
-                # Extract and clean the denomination value
-                denomination = denomination_match.group().replace(',', '')
-                # Extract the purchaser name by removing the date and denomination from the segment
-                purchaser_name = segment.replace(date_of_purchase, '').replace(
-                    denomination_match.group(), '').strip()
-                # Add the extracted data to the all_rows list
-                all_rows.append(
-                    [date_of_purchase, purchaser_name, int(denomination)])
+        # Tokenize the page in a single pass and keep its (date, name, denomination) records
+        all_rows.extend(tokenize_page(text).records)
 
     return all_rows  # Return the list of processed rows
 
 
-def convert_pdf_to_csv(pdf_path, csv_path):
-    with open(pdf_path, 'rb') as file:  # Open the PDF file
-        reader = PyPDF2.PdfReader(file)  # Create a PDF reader object
-        texts = []  # Initialize a list to hold the text of each page
-
-        # Loop through each page in the PDF
-        for i, page in enumerate(reader.pages):
-            text = page.extract_text()  # Extract text from the page
-            # Print the current page being processed
-            print(f"Processing Page {i + 1}")
-            texts.append(text)  # Append the extracted text to the list
-
-            # Compare the number of date and denomination matches in the current page's text
-            date_matches = re.findall(r'\d{2}/[A-Za-z]{3}/20\d{2}', text)
-            denomination_matches = re.findall(
-                r'(1,000|10,000|1,00,000|10,00,000|1,00,00,000|10,00,00,000)', text)
-            # If the number of dates and denominations found does not match
-            if len(date_matches) != len(denomination_matches):
-                # Print a message indicating a mismatch on the current page
-                print(
-                    f"Mismatch found on Page {i + 1}: Date of Encashment Length = {len(date_matches)}, Denomination Length = {len(denomination_matches)}")
+def convert_pdf_to_csv(pdf_path, csv_path, workers=None, cache=None, resume=False):
+    # Columns of the output CSV, 'Sr No.' is numbered in page order by the pipeline
+    columns = ['Sr No.', 'Date of Encashment', 'Name of the Political Party', 'Denomination']
 
-        # Process the extracted texts to obtain data rows
-        data = process_text(texts)
+    # Stream each page's rows into the CSV as soon as the page is extracted; pages are extracted
+    # across `workers` processes (all cores by default, 1 for a serial run) and always come back
+    # in page order. Pages found in the optional page cache are not extracted again, and with
+    # `resume` an interrupted run continues after the last completed page.
+    for i, page in stream_pdf_to_csv(pdf_path, csv_path, columns, workers=workers, cache=cache, resume=resume):
+        # Print the current page being processed
+        print(f"Processing Page {i + 1}")
 
-        # Convert the list of data rows into a pandas DataFrame
-        df = pd.DataFrame(data, columns=[
-                          'Date of Encashment', 'Name of the Political Party', 'Denomination'])
+        # If the number of dates and denominations found does not match
+        if page.date_count != page.denomination_count:
+            # Print a message indicating a mismatch on the current page
+            print(
+                f"Mismatch found on Page {i + 1}: Date of Encashment Length = {page.date_count}, Denomination Length = {page.denomination_count}")
 
-        # Clean the 'Denomination' column by removing commas and converting to integers
-        df['Denomination'] = df['Denomination'].replace(
-            {',': ''}, regex=True).astype(int)
+    # Indicate that the CSV conversion is complete
+    print("\nConversion to CSV completed for Encasher PDF Data.")
 
-        # Insert a 'Sr No.' column at the beginning of the DataFrame
-        df.insert(0, 'Sr No.', range(1, 1 + len(df)))
-
-        # Write the DataFrame to a CSV file
-        df.to_csv(csv_path, index=False)
-        # Indicate that the CSV conversion is complete
-        print("\nConversion to CSV completed for Encasher PDF Data.")
+    # Write the typed columnar copy of the CSV that load_data_encasher memory-maps
+    artifact = write_artifact(csv_path, 'Date of Encashment', 'Name of the Political Party')
+    print(f"Dataset artifact written to {artifact}")
 
 
 if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description='Convert the Encashment Details PDF into CSV')
+    parser.add_argument('--workers', type=int, default=None,
+                        help='Number of processes used to extract pages (default: number of cores, 1 = serial)')
+    parser.add_argument('--cache-dir', default=DEFAULT_CACHE_DIR,
+                        help='Directory of the page cache used to skip unchanged pages on re-runs')
+    parser.add_argument('--cache-size-mb', type=int, default=DEFAULT_MAX_BYTES // (1024 * 1024),
+                        help='Size cap of the page cache, least recently used pages are evicted beyond it')
+    parser.add_argument('--no-cache', action='store_true',
+                        help='Extract every page, without reading or writing the page cache')
+    parser.add_argument('--resume', action='store_true',
+                        help='Continue an interrupted conversion after its last completed page')
+    args = parser.parse_args()
+    cache = None if args.no_cache else PageCache(
+        args.cache_dir, max_bytes=args.cache_size_mb * 1024 * 1024)
+
     # Specify the path to the Encashment PDF file and the output CSV file
     pdf_path = './pdf_data/Encashment_Details_Final.pdf'
     csv_path = '02_Encasher_Details.csv'
 
     # Call the function to convert the PDF to a CSV file
-    convert_pdf_to_csv(pdf_path, csv_path)
+    convert_pdf_to_csv(pdf_path, csv_path, workers=args.workers, cache=cache, resume=args.resume)
+
+    if cache is not None:
+        print(f"Page cache: {cache.stats()}")
+        cache.close()
@@ -0,0 +1,55 @@
+# app_cache.py
+
+import functools
+import os
+import threading
+
+import derived_cache
+from entity_resolution import names_path
+
+# One loaded copy of each dataset per process, shared by every session of the app (Streamlit runs
+# the sessions as threads of one process) and by batch runs alike, so memory doesn't grow with the
+# number of sessions. The column values are read-only views of the memory-mapped artifacts (see
+# dataset_artifact.read_artifact), but nothing stops a column being assigned or attrs being edited
+# on the frame, and every session would see that: callers must treat it as read-only and change a
+# copy instead.
+_datasets = {}
+_lock = threading.Lock()
+
+
+def file_stamp(path):
+    stat = os.stat(path)
+    return stat.st_mtime_ns, stat.st_size
+
+
+def dataset_stamp(file_name):
+    # The CSV's stamp, and its names file's when it has one: either changing means a reload
+    names = names_path(file_name)
+    return file_stamp(file_name), file_stamp(names) if os.path.exists(names) else None
+
+
+def shared_dataset(load):
+    # Decorator for the load_data_* functions. The first call loads the file; later calls return
+    # the same frame until the modification time or size of the file (or of its names file)
+    # changes, then it's loaded again (load_dataset compares the content hash with the artifact's)
+    # and the results derived from the old version are dropped from derived_cache.
+    @functools.wraps(load)
+    def wrapper(file_name):
+        key = (load.__module__, load.__qualname__, os.path.abspath(file_name))
+        stamp = dataset_stamp(file_name)
+        with _lock:
+            entry = _datasets.get(key)
+            if entry is not None and entry[0] == stamp:
+                return entry[1]
+            # Loaded under the lock, so sessions that start together load the file once
+            df = load(file_name)
+            _datasets[key] = (stamp, df)
+        if entry is not None and entry[1].attrs.get('version') != df.attrs.get('version'):
+            derived_cache.drop_version(entry[1].attrs.get('version'))
+        return df
+    return wrapper
+
+
+def clear():
+    with _lock:
+        _datasets.clear()
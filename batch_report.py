@@ -0,0 +1,194 @@
+# batch_report.py
+#
+# Every analysis of the Streamlit app, computed without it: one process per dataset (plus one for
+# the reconciliation), written as JSON files and a static HTML report. Only the analysis core is
+# imported, streamlit never and plotly only for the HTML charts.
+#
+#   python batch_report.py                        # reports/*.json and reports/report.html
+#   python batch_report.py --format json --workers 1
+
+import argparse
+import html
+import json
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import pandas as pd
+
+import encasher_details_analysis
+import purchaser_details_analysis
+from dataset_graph import SCHEMAS
+from reconciliation import reconcile_datasets
+from time_buckets import GRANULARITIES, PERIOD_COLUMNS
+
+DATASETS = {
+    'purchaser': {
+        'title': 'Purchaser Details',
+        'schema': SCHEMAS['purchaser'],
+        'load': purchaser_details_analysis.load_data_purchaser,
+        'summary': purchaser_details_analysis.analyze_purchasers,
+        'by_name': purchaser_details_analysis.analyze_purchaser_sum,
+        'by_period': purchaser_details_analysis.sum_denomination_period_purchaser,
+    },
+    'encasher': {
+        'title': 'Encasher Details',
+        'schema': SCHEMAS['encasher'],
+        'load': encasher_details_analysis.load_data_encasher,
+        'summary': encasher_details_analysis.analyze_encashers,
+        'by_name': encasher_details_analysis.analyze_encasher_sum,
+        'by_period': encasher_details_analysis.sum_denomination_period_encasher,
+    },
+}
+
+# Rows of the per-name tables shown in the HTML report; the JSON files have all of them
+HTML_TABLE_ROWS = 50
+
+
+def records(df):
+    # JSON-ready list of row dicts, dates as ISO strings
+    return json.loads(df.to_json(orient='records', date_format='iso'))
+
+
+def dataset_report(name, data_dir):
+    # Every analysis of one dataset, as a JSON-ready dict. Runs in a worker process.
+    start = time.perf_counter()
+    spec = DATASETS[name]
+    df = spec['load'](os.path.join(data_dir, spec['schema'].csv_file))
+    stats = spec['summary'](df)
+    by_name = spec['by_name'](df).sort_values('Denomination', ascending=False, kind='stable')
+    return {
+        'dataset': name,
+        'csv': spec['schema'].csv_file,
+        'version': df.attrs.get('version'),
+        'rows': len(df),
+        'summary': {
+            'unique_names': int(stats.unique_names),
+            'total_denomination': int(stats.total_denomination),
+            'mean': float(stats.mean),
+            'median': float(stats.median),
+            'q1': float(stats.q1),
+            'q3': float(stats.q3),
+            'iqr': float(stats.iqr),
+            'quantiles': records(stats.quantiles.rename_axis('Quantile').reset_index()),
+        },
+        'by_name': records(by_name),
+        'by_period': {granularity: records(spec['by_period'](df, granularity)) for granularity in GRANULARITIES},
+        'seconds': time.perf_counter() - start,
+    }
+
+
+def reconciliation_report(data_dir):
+    start = time.perf_counter()
+    purchases = DATASETS['purchaser']['load'](os.path.join(data_dir, SCHEMAS['purchaser'].csv_file))
+    encashments = DATASETS['encasher']['load'](os.path.join(data_dir, SCHEMAS['encasher'].csv_file))
+    result = reconcile_datasets(purchases, encashments)
+    return {
+        'dataset': 'reconciliation',
+        'versions': [purchases.attrs.get('version'), encashments.attrs.get('version')],
+        'totals': records(result.totals)[0],
+        'by_party': records(result.by_party),
+        'by_purchaser': records(result.by_purchaser),
+        'flows': records(result.flows),
+        'seconds': time.perf_counter() - start,
+    }
+
+
+def build_reports(data_dir='.', workers=None):
+    # Reports of both datasets and the reconciliation, computed in up to `workers` processes
+    # (one per report by default, 1 = serially in this process)
+    tasks = [(dataset_report, name, data_dir) for name in DATASETS] + [(reconciliation_report, data_dir)]
+    workers = min(len(tasks), workers or os.cpu_count() or 1)
+    if workers <= 1:
+        return [func(*args) for func, *args in tasks]
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        futures = [executor.submit(func, *args) for func, *args in tasks]
+        return [future.result() for future in futures]
+
+
+def write_json(reports, output_dir):
+    paths = []
+    for report in reports:
+        path = os.path.join(output_dir, report['dataset'] + '.json')
+        with open(path, 'w') as f:
+            json.dump(report, f, indent=2)
+        paths.append(path)
+    return paths
+
+
+def _table(rows, limit=None):
+    df = pd.DataFrame(rows[:limit] if limit else rows)
+    return df.to_html(index=False, border=0, classes='table')
+
+
+def _chart(rows, x, title, include_plotlyjs):
+    import plotly.express as px  # only the HTML report draws charts
+    fig = px.line(rows, x=x, y='Denomination', title=title, markers=True)
+    return fig.to_html(full_html=False, include_plotlyjs=include_plotlyjs)
+
+
+def write_html(reports, output_dir, charts=True):
+    # One static page with the summary, the largest names and the period charts of each dataset,
+    # and the reconciliation tables. plotly.js is loaded once from its CDN.
+    parts = ['<!DOCTYPE html><html><head><meta charset="utf-8"><title>Electoral Bonds Report</title>'
+             '<style>body{font-family:sans-serif;margin:2em} .table{border-collapse:collapse;font-size:13px}'
+             ' .table td,.table th{padding:2px 8px;border-bottom:1px solid #ddd}</style></head><body>',
+             '<h1>Electoral Bonds Report</h1>']
+    include_plotlyjs = 'cdn'
+    for report in reports:
+        if report['dataset'] == 'reconciliation':
+            parts.append('<h2>Purchase to Encashment Reconciliation</h2>')
+            parts.append(_table([report['totals']]))
+            parts.append('<h3>By party</h3>' + _table(report['by_party']))
+            parts.append(f'<h3>By purchaser (largest {HTML_TABLE_ROWS})</h3>' + _table(report['by_purchaser'], HTML_TABLE_ROWS))
+            parts.append(f'<h3>Largest matched flows (largest {HTML_TABLE_ROWS})</h3>' + _table(report['flows'], HTML_TABLE_ROWS))
+            continue
+
+        spec = DATASETS[report['dataset']]
+        summary = {key: value for key, value in report['summary'].items() if key != 'quantiles'}
+        parts.append(f"<h2>{html.escape(spec['title'])}</h2>")
+        parts.append(f"<p>{html.escape(spec['schema'].csv_file)}, {report['rows']} rows, version {html.escape(str(report['version']))}</p>")
+        parts.append(_table([summary]))
+        parts.append('<h3>Quantiles</h3>' + _table(report['summary']['quantiles']))
+        parts.append(f"<h3>Sum of Denomination by {html.escape(spec['schema'].name_column)} (largest {HTML_TABLE_ROWS})</h3>")
+        # The date lists are left to the JSON file, the page shows how many dates there are
+        parts.append(_table([{key: len(value) if isinstance(value, list) else value for key, value in row.items()}
+                             for row in report['by_name'][:HTML_TABLE_ROWS]]))
+        if charts:
+            for granularity in ('Year', 'Month', 'Week'):
+                parts.append(_chart(report['by_period'][granularity], PERIOD_COLUMNS[granularity],
+                                    f'Sum of Denomination per {granularity}', include_plotlyjs))
+                include_plotlyjs = False
+    parts.append('</body></html>')
+
+    path = os.path.join(output_dir, 'report.html')
+    with open(path, 'w', encoding='utf-8') as f:
+        f.write('\n'.join(parts))
+    return path
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description='Compute every analysis of both datasets and write static JSON / HTML reports')
+    parser.add_argument('--data-dir', default='.',
+                        help='Directory holding 01_Purchaser_Details.csv and 02_Encasher_Details.csv')
+    parser.add_argument('--output-dir', default='reports')
+    parser.add_argument('--format', nargs='+', choices=['json', 'html'], default=['json', 'html'])
+    parser.add_argument('--no-charts', action='store_true',
+                        help='Leave the charts out of the HTML report (and skip importing plotly)')
+    parser.add_argument('--workers', type=int, default=None,
+                        help='Number of processes (default: one per report, up to the number of cores; 1 = serial)')
+    args = parser.parse_args()
+
+    start = time.perf_counter()
+    reports = build_reports(args.data_dir, args.workers)
+    for report in reports:
+        print(f"{report['dataset']}: computed in {report['seconds']:.2f} s")
+
+    os.makedirs(args.output_dir, exist_ok=True)
+    if 'json' in args.format:
+        for path in write_json(reports, args.output_dir):
+            print(f"Written {path}")
+    if 'html' in args.format:
+        print(f"Written {write_html(reports, args.output_dir, charts=not args.no_charts)}")
+    print(f"Done in {time.perf_counter() - start:.2f} s")
@@ -0,0 +1,82 @@
+# benchmarks/bench_chunked.py
+#
+# Wall time and peak memory of the chunked analysis against the in-memory one, on synthetic
+# purchaser CSVs. Each run is a fresh process, so the peak resident size is that run's own.
+#
+#   python -m benchmarks.bench_chunked
+#   python -m benchmarks.bench_chunked --scales 10 100 1000 --workers 1 4
+
+import argparse
+import json
+import os
+import subprocess
+import sys
+import tempfile
+
+from benchmarks.common import PURCHASER_CSV, ROOT_DIR
+from benchmarks.synthetic_data import synthetic_csv
+
+DATE_COLUMN = 'Date of Purchase'
+NAME_COLUMN = 'Purchaser Name'
+
+# Run in a child process; prints {"seconds": ..., "peak_mb": ..., "worker_peak_mb": ...}
+RUN_SCRIPT = '''
+import json, resource, sys, time
+mode, csv_path, workers = sys.argv[1], sys.argv[2], int(sys.argv[3])
+start = time.perf_counter()
+if mode == 'in-memory':
+    import pandas as pd
+    from dataset_artifact import build_dataset
+    from entity_rollup import rollup_by_entity
+    from summary_stats import compute_summary
+    from time_buckets import GRANULARITIES, sum_by_period
+    df = build_dataset(pd.read_csv(csv_path), %(date)r, %(name)r)
+    compute_summary(df, %(name)r)
+    rollup_by_entity(df, %(name)r, %(date)r)
+    for granularity in GRANULARITIES:
+        sum_by_period(df, %(date)r, granularity)
+else:
+    from chunked_analytics import analyze_csv
+    analyze_csv(csv_path, %(date)r, %(name)r, workers=workers)
+seconds = time.perf_counter() - start
+# VmHWM is this process's own peak (ru_maxrss would carry over the parent's across exec);
+# the pool workers are forked after the exec, so RUSAGE_CHILDREN is theirs alone (in kilobytes)
+with open('/proc/self/status') as status:
+    peak = next(int(line.split()[1]) for line in status if line.startswith('VmHWM:'))
+workers_peak = resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss
+print(json.dumps({'seconds': seconds, 'peak_mb': peak / 1024, 'worker_peak_mb': workers_peak / 1024}))
+''' % {'date': DATE_COLUMN, 'name': NAME_COLUMN}
+
+
+def run(mode, csv_path, workers):
+    output = subprocess.run([sys.executable, '-c', RUN_SCRIPT, mode, csv_path, str(workers)],
+                            cwd=ROOT_DIR, check=True, capture_output=True, text=True).stdout
+    return json.loads(output.splitlines()[-1])
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Compare wall time and peak memory of the chunked and in-memory analyses')
+    parser.add_argument('--scales', type=float, nargs='+', default=[10, 100])
+    parser.add_argument('--workers', type=int, nargs='+', default=[1])
+    parser.add_argument('--skip-in-memory-above', type=float, default=100,
+                        help='Skip the in-memory run above this scale')
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as work_dir:
+        for scale in args.scales:
+            csv_path = os.path.join(work_dir, f'purchaser_{scale:g}x.csv')
+            synthetic_csv(PURCHASER_CSV, csv_path, scale, NAME_COLUMN, DATE_COLUMN)
+            size_mb = os.path.getsize(csv_path) / 1024 / 1024
+            cases = [('in-memory', 1)] if scale <= args.skip_in_memory_above else []
+            cases += [('chunked', workers) for workers in args.workers]
+            for mode, workers in cases:
+                result = run(mode, csv_path, workers)
+                label = mode if mode == 'in-memory' else f'{mode}, {workers} worker(s)'
+                print(f'{scale:>6g}x ({size_mb:>7.0f} MB CSV)  {label:<22} '
+                      f'{result["seconds"]:>8.2f} s  peak {result["peak_mb"]:>7.0f} MB'
+                      + (f', workers {result["worker_peak_mb"]:.0f} MB each' if workers > 1 else ''))
+            os.remove(csv_path)
+
+
+if __name__ == '__main__':
+    main()
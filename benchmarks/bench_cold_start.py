@@ -0,0 +1,49 @@
+# benchmarks/bench_cold_start.py
+#
+# Cold start of a fresh interpreter: importing the Streamlit app versus importing the
+# analysis core, and a full batch report run with and without charts.
+#
+#   python -m benchmarks.bench_cold_start
+
+import argparse
+import subprocess
+import sys
+import tempfile
+import time
+
+from benchmarks.common import ROOT_DIR
+
+CORE_MODULES = ('purchaser_details_analysis, encasher_details_analysis, reconciliation, '
+                'dataset_artifact, dataset_graph, summary_stats, entity_rollup, name_index, time_buckets')
+
+
+def run_seconds(args, repeat):
+    # Best wall time of a fresh Python process running `args`
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        subprocess.run([sys.executable] + args, cwd=ROOT_DIR, check=True, capture_output=True)
+        timings.append(time.perf_counter() - start)
+    return min(timings)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Time importing the app and the analysis core, and full batch report runs')
+    parser.add_argument('--repeat', type=int, default=5)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as output_dir:
+        cases = [
+            ('python (empty)', ['-c', 'pass']),
+            ('import app (main.py)', ['-c', 'import main']),
+            ('import analysis core', ['-c', f'import {CORE_MODULES}']),
+            ('import batch_report', ['-c', 'import batch_report']),
+            ('batch report, json', ['batch_report.py', '--format', 'json', '--output-dir', output_dir]),
+            ('batch report, json + html', ['batch_report.py', '--output-dir', output_dir]),
+        ]
+        for label, command in cases:
+            print(f'{label:<28} {run_seconds(command, args.repeat) * 1000:>8.0f} ms')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,97 @@
+# benchmarks/bench_entity_resolution.py
+#
+# Entity resolution on synthetic name lists up to 100x the purchaser names. The published names
+# are copy 0; every further copy of a name has its leading words replaced by random words of the
+# published names, so it's a different, plausible company. A share of all names get a planted
+# variant (spaces dropped, suffix spelt differently, cut off, two letters swapped).
+# Reported: time, candidate pairs compared against all pairs, how many planted variants were
+# merged with their original, and groups that wrongly merge two synthetic companies.
+#
+#   python -m benchmarks.bench_entity_resolution
+#   python -m benchmarks.bench_entity_resolution --scales 1 10 100 --variants 0.3
+
+import argparse
+import random
+import time
+from collections import Counter
+
+import pandas as pd
+
+import entity_resolution
+from benchmarks.common import PURCHASER_CSV
+
+
+def plant_variant(name, rng):
+    # A spelling of `name` like the ones PDF extraction produces, or None if none applies
+    choices = [lambda: name.replace(' ', ''), lambda: name.replace(' ', '  ', 1)]
+    if name.endswith(' PRIVATE LIMITED'):
+        choices.append(lambda: name[:-len('PRIVATE LIMITED')] + 'PVT LTD')
+    if name.endswith(' PVT LTD'):
+        choices.append(lambda: name[:-len('PVT LTD')] + 'PRIVATE LIMITED')
+    if len(name) > 40:
+        choices.append(lambda: name[:35])
+    if len(name) >= 25:
+        position = rng.randrange(5, len(name) - 1)
+        if name[position].isalpha():
+            choices.append(lambda: name[:position] + name[position + 1] + name[position] + name[position + 2:])
+    return rng.choice(choices)()
+
+
+def synthetic_names(names, scale, share, seed=0):
+    # ({name: rows}, {variant: original}, {name: copy}) for `scale` copies of `names`
+    rng = random.Random(seed)
+    words = sorted({word for name in names for word in name.split() if word.isalpha() and len(word) >= 3})
+    counts, planted, copies = Counter(), {}, {}
+    for copy in range(max(1, int(scale))):
+        for name in names:
+            if copy:
+                tokens = name.split()
+                name = ' '.join(rng.sample(words, 2) + tokens[min(2, len(tokens) - 1):])
+                if name in counts:
+                    continue
+            counts[name] += rng.randint(1, 20)
+            copies[name] = copy
+            if rng.random() < share:
+                variant = plant_variant(name, rng)
+                if variant != name and variant not in counts:
+                    counts[variant] += 1
+                    planted[variant] = name
+    return counts, planted, copies
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Time entity resolution on synthetic name lists and count the merges it finds')
+    parser.add_argument('--scales', type=float, nargs='+', default=[1, 10, 100])
+    parser.add_argument('--variants', type=float, default=0.2, help='Share of names given a planted variant')
+    args = parser.parse_args()
+
+    names = sorted(pd.read_csv(PURCHASER_CSV)['Purchaser Name'].dropna().unique())
+    for scale in args.scales:
+        counts, planted, copies = synthetic_names(names, scale, args.variants)
+        keys = sorted({entity_resolution.name_key(name) for name in counts})
+
+        start = time.perf_counter()
+        pairs = entity_resolution.candidate_pairs(keys)
+        candidate_seconds = time.perf_counter() - start
+        start = time.perf_counter()
+        mapping, _ = entity_resolution.resolve(counts)
+        seconds = time.perf_counter() - start
+
+        canonical = lambda name: mapping.get(name, name)
+        found = sum(canonical(variant) == canonical(original) for variant, original in planted.items())
+        # Synthetic companies (copies after the first, which is the published names with their own
+        # variants) that ended up in the same group as another one
+        companies = {}
+        for name, copy in copies.items():
+            if copy:
+                companies.setdefault(canonical(name), []).append(name)
+        false_merges = sum(len(members) - 1 for members in companies.values())
+        all_pairs = len(keys) * (len(keys) - 1) // 2
+        print(f'{scale:>5g}x: {len(counts):>7,} names  {seconds:>6.2f} s  '
+              f'({candidate_seconds:.2f} s candidates)  {len(pairs):>8,} candidate pairs '
+              f'({len(pairs) / max(all_pairs, 1):.4%} of all)  '
+              f'planted found {found}/{len(planted)}  false merges {false_merges}')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,57 @@
+# benchmarks/bench_reconciliation.py
+#
+# Purchase to encashment reconciliation on synthetic data up to 100x the current size. The
+# redemption window's boundary is checked first: a bond encashed on the last day of the window
+# is matched, one encashed the day after isn't.
+#
+#   python -m benchmarks.bench_reconciliation
+#   python -m benchmarks.bench_reconciliation --scales 1 10 100 1000
+
+import argparse
+
+import pandas as pd
+
+from benchmarks.common import ENCASHER_CSV, PURCHASER_CSV, best_time, synthetic_dataset
+from dataset_artifact import load_dataset
+from reconciliation import REDEMPTION_WINDOW_DAYS, reconcile
+
+
+def check_window_boundary(window=REDEMPTION_WINDOW_DAYS):
+    # One bond bought on 1 Apr, encashed window - 1 days later (the last day of the window,
+    # counting the day of purchase) and window days later (the day after)
+    purchases = pd.DataFrame({'Purchaser Name': ['A'], 'Denomination': [1000],
+                              'Date of Purchase': pd.to_datetime(['2019-04-01'])})
+    for days, expected in ((window - 1, 1), (window, 0)):
+        encashments = pd.DataFrame({'Name of the Political Party': ['B'], 'Denomination': [1000],
+                                    'Date of Encashment': pd.Timestamp('2019-04-01') + pd.to_timedelta([days], unit='D')})
+        result = reconcile(purchases, encashments, window=window)
+        matched = result.totals['Matched bonds'][0]
+        candidates = result.by_purchaser['Mean candidates'][0]
+        assert matched == expected and candidates == expected, \
+            f'encashed {days} days after purchase: {matched} matched, {candidates} candidates, expected {expected}'
+    print(f'Window boundary: encashed after {window - 1} days matched, after {window} days not')
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Time the purchase to encashment reconciliation on synthetic data')
+    parser.add_argument('--scales', type=float, nargs='+', default=[1, 10, 100])
+    parser.add_argument('--repeat', type=int, default=3)
+    args = parser.parse_args()
+
+    check_window_boundary()
+    purchases = load_dataset(PURCHASER_CSV, 'Date of Purchase', 'Purchaser Name')
+    encashments = load_dataset(ENCASHER_CSV, 'Date of Encashment', 'Name of the Political Party')
+    for scale in args.scales:
+        p = synthetic_dataset(purchases, scale, 'Purchaser Name', 'Date of Purchase')
+        e = synthetic_dataset(encashments, scale, 'Name of the Political Party', 'Date of Encashment')
+        p['Purchaser Name'] = p['Purchaser Name'].astype('category')
+        e['Name of the Political Party'] = e['Name of the Political Party'].astype('category')
+
+        seconds = best_time(lambda: reconcile(p, e), args.repeat)
+        matched = reconcile(p, e).totals['Matched bonds'][0]
+        print(f'{scale:>6g}x: {len(p):>9,} purchases {len(e):>9,} encashments  '
+              f'{matched:>9,} matched  {seconds * 1000:>9.1f} ms')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,55 @@
+# benchmarks/bench_rollup.py
+#
+# Vectorized per-entity rollup (analyze_purchaser_sum / analyze_encasher_sum) versus the
+# original groupby with a per-group lambda, on synthetic data up to 100x the current size.
+#
+#   python -m benchmarks.bench_rollup
+#   python -m benchmarks.bench_rollup --scales 1 10 100 --legacy-max-scale 10
+
+import argparse
+
+import pandas as pd
+
+from benchmarks.common import ENCASHER_CSV, PURCHASER_CSV, best_time, synthetic_dataset
+from dataset_artifact import load_dataset
+from entity_rollup import rollup_by_entity
+
+
+def legacy_rollup(df, name_column, date_column):
+    # The analyze_*_sum implementation before entity_rollup, kept as the baseline
+    return df.groupby(name_column, observed=True).agg(
+        {'Denomination': 'sum', date_column: lambda x: x.sort_values(ascending=False).dt.strftime('%d/%m/%Y').tolist()}).reset_index()
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Compare the vectorized per-entity rollup with the original groupby')
+    parser.add_argument('--scales', type=float, nargs='+', default=[1, 10, 100])
+    parser.add_argument('--legacy-max-scale', type=float, default=100,
+                        help='Skip the (slow) legacy implementation above this scale')
+    parser.add_argument('--repeat', type=int, default=3)
+    args = parser.parse_args()
+
+    datasets = [
+        ('Purchaser', PURCHASER_CSV, 'Date of Purchase', 'Purchaser Name'),
+        ('Encasher', ENCASHER_CSV, 'Date of Encashment', 'Name of the Political Party'),
+    ]
+    for label, csv_path, date_column, name_column in datasets:
+        base = load_dataset(csv_path, date_column, name_column)
+        for scale in args.scales:
+            df = synthetic_dataset(base, scale, name_column, date_column)
+            df[name_column] = df[name_column].astype('category')
+            groups = df[name_column].nunique()
+
+            seconds = best_time(lambda: rollup_by_entity(df, name_column, date_column), args.repeat)
+            line = f'{label} {scale:>6g}x: {len(df):>9,} rows {groups:>8,} names  vectorized {seconds * 1000:>9.1f} ms'
+
+            if scale <= args.legacy_max_scale:
+                expected = legacy_rollup(df, name_column, date_column)
+                pd.testing.assert_frame_equal(rollup_by_entity(df, name_column, date_column), expected)
+                legacy_seconds = best_time(lambda: legacy_rollup(df, name_column, date_column), 1)
+                line += f'  legacy {legacy_seconds * 1000:>9.1f} ms  ({legacy_seconds / seconds:.0f}x)'
+            print(line)
+
+
+if __name__ == '__main__':
+    main()
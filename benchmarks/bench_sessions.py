@@ -0,0 +1,78 @@
+# benchmarks/bench_sessions.py
+#
+# Memory of the app's process as the number of sessions grows. Each session is a thread that
+# loads the purchaser dataset, runs the page's analysis and keeps the frame, the way a session
+# of the Streamlit app does. Compared are the one shared dataset the loaders return and a
+# per-session copy unpickled from a cache, which is what st.cache_data hands every session.
+# Memory is measured with tracemalloc (numpy and pandas allocations included): what the sessions
+# still hold once they're done, and the peak while they ran.
+#
+#   python -m benchmarks.bench_sessions
+#   python -m benchmarks.bench_sessions --scale 10 --sessions 1 10 50
+
+import argparse
+import inspect
+import os
+import pickle
+import tempfile
+import threading
+import time
+import tracemalloc
+
+import app_cache
+import derived_cache
+import purchaser_details_analysis
+from benchmarks.common import PURCHASER_CSV
+from benchmarks.synthetic_data import synthetic_csv
+
+
+def run_sessions(load, count):
+    # Start `count` sessions at once; returns the frames they hold and the wall time
+    frames = [None] * count
+
+    def session(i):
+        df = load()
+        purchaser_details_analysis.analyze_purchasers(df)
+        purchaser_details_analysis.analyze_purchaser_sum(df)
+        frames[i] = df
+
+    start = time.perf_counter()
+    threads = [threading.Thread(target=session, args=(i,)) for i in range(count)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return frames, time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Measure the memory of the app process as the number of sessions grows')
+    parser.add_argument('--scale', type=float, default=10)
+    parser.add_argument('--sessions', type=int, nargs='+', default=[1, 10, 50])
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as work_dir:
+        csv_path = os.path.join(work_dir, 'purchaser.csv')
+        synthetic_csv(PURCHASER_CSV, csv_path, args.scale, 'Purchaser Name', 'Date of Purchase')
+        raw_load = inspect.unwrap(purchaser_details_analysis.load_data_purchaser)
+        pickled = pickle.dumps(raw_load(csv_path))
+        modes = {
+            'shared': lambda: purchaser_details_analysis.load_data_purchaser(csv_path),
+            'copy per session': lambda: pickle.loads(pickled),
+        }
+        for label, load in modes.items():
+            for count in args.sessions:
+                app_cache.clear()
+                derived_cache.clear()
+                tracemalloc.start()
+                before = tracemalloc.get_traced_memory()[0]
+                frames, seconds = run_sessions(load, count)
+                held, peak = tracemalloc.get_traced_memory()
+                tracemalloc.stop()
+                print(f'{label:<18} {count:>4} sessions  {seconds:>7.2f} s  '
+                      f'held {(held - before) / 2 ** 20:>7.1f} MB  peak {(peak - before) / 2 ** 20:>7.1f} MB')
+                del frames
+
+
+if __name__ == '__main__':
+    main()
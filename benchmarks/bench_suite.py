@@ -0,0 +1,221 @@
+# benchmarks/bench_suite.py
+#
+# End-to-end timings of the hot paths on synthetic data at multiples of the size of the
+# published CSVs, from PDF conversion to chart data. Results are written as JSON, and a
+# previous result file can be passed with --compare to print the change of every timing.
+# First it checks that page fingerprints, the keys of the page cache and of tranche ingestion,
+# come out the same in separate processes.
+#
+#   python -m benchmarks.bench_suite                                # 1x 10x 100x 1000x
+#   python -m benchmarks.bench_suite --scales 1 10 --output before.json
+#   python -m benchmarks.bench_suite --scales 1 10 --output after.json --compare before.json
+
+import argparse
+import contextlib
+import inspect
+import io
+import json
+import os
+import platform
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+
+import pandas as pd
+
+import derived_cache
+import encasher_details_analysis
+import purchaser_details_analysis
+from benchmarks.common import ENCASHER_CSV, PURCHASER_CSV, ROOT_DIR, best_time, load_cleaner
+from benchmarks.synthetic_data import page_texts, synthetic_csv, write_pdf
+from dataset_artifact import artifact_path
+from dataset_graph import value
+
+RESULT_FORMAT = 1
+
+# Names plotted in the chart-data timings: a few, the way a user would pick them in the app,
+# and many, like the top N view at daily granularity
+PLOTTED_NAMES = 5
+MANY_PLOTTED_NAMES = 50
+
+DATASETS = [
+    {
+        'dataset': 'purchaser',
+        'csv': PURCHASER_CSV,
+        'cleaner': '01_clean_purchaser_data.py',
+        'header': 'Date of Purchase Purchaser Name Denomination',
+        'date_column': 'Date of Purchase',
+        'name_column': 'Purchaser Name',
+        'module': purchaser_details_analysis,
+        'functions': ('load_data_purchaser', 'analyze_purchasers', 'analyze_purchaser_sum',
+                      'sum_denomination_year_purchaser', 'sum_denomination_month_purchaser'),
+    },
+    {
+        'dataset': 'encasher',
+        'csv': ENCASHER_CSV,
+        'cleaner': '02_clean_encasher_data.py',
+        'header': 'Date of \nEncashment Name of the Political Party Denomination',
+        'date_column': 'Date of Encashment',
+        'name_column': 'Name of the Political Party',
+        'module': encasher_details_analysis,
+        'functions': ('load_data_encasher', 'analyze_encashers', 'analyze_encasher_sum',
+                      'sum_denomination_year_encasher', 'sum_denomination_month_encasher'),
+    },
+]
+
+
+def git_commit():
+    try:
+        return subprocess.run(['git', 'rev-parse', 'HEAD'], cwd=ROOT_DIR, capture_output=True,
+                              text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def remove_artifact(csv_path):
+    with contextlib.suppress(FileNotFoundError):
+        os.remove(artifact_path(csv_path))
+
+
+def plot_data(df, names, granularity):
+    # What the history section of an analysis page computes: the rows of the selected names
+    # and their chart (aggregated per period, downsampled, WebGL above the point threshold)
+    return value(df, 'history', names), value(df, 'entity_chart', names, granularity, None)
+
+
+def bench_dataset(spec, scale, work_dir, args):
+    # Timings of one dataset at one scale, as a list of result dicts
+    label = f"{spec['dataset']}_{scale:g}x"
+    csv_path = os.path.join(work_dir, label + '.csv')
+    start = time.perf_counter()
+    data = synthetic_csv(spec['csv'], csv_path, scale, spec['name_column'], spec['date_column'])
+    print(f"{label}: {len(data):,} rows generated in {time.perf_counter() - start:.1f} s")
+
+    results = []
+
+    def record(operation, func, repeat=args.repeat, setup=None):
+        seconds = best_time(func, repeat, setup)
+        results.append({'dataset': spec['dataset'], 'scale': scale, 'rows': len(data),
+                        'operation': operation, 'seconds': seconds, 'repeat': repeat})
+        print(f"  {operation:<34} {seconds * 1000:>11.1f} ms")
+
+    cleaner = load_cleaner(spec['cleaner'])
+    if scale <= args.text_max_scale:
+        texts = page_texts(data, spec['header'])
+        record('process_text', lambda: cleaner.process_text(texts))
+        if scale <= args.pdf_max_scale:
+            pdf_path = os.path.join(work_dir, label + '.pdf')
+            write_pdf(pdf_path, texts)
+            out_path = os.path.join(work_dir, label + '_converted.csv')
+
+            def convert():
+                # The cleaner prints a line per page, which would drown the results
+                with contextlib.redirect_stdout(io.StringIO()):
+                    cleaner.convert_pdf_to_csv(pdf_path, out_path, workers=args.workers)
+            record('convert_pdf_to_csv', convert, repeat=1)
+            with open(out_path, 'rb') as converted, open(csv_path, 'rb') as expected:
+                assert converted.read() == expected.read(), f'{label}: PDF round trip changed the CSV'
+        del texts
+
+    module = spec['module']
+    (load, analyze, analyze_sum, sum_year, sum_month) = spec['functions']
+    # The undecorated loaders: the shared dataset cache would turn every run after the first into a lookup
+    load_data = inspect.unwrap(getattr(module, load))
+    record(load + ' (csv)', lambda: load_data(csv_path), setup=lambda: remove_artifact(csv_path))
+    record(load + ' (artifact)', lambda: load_data(csv_path))
+    df = load_data(csv_path)
+
+    # Derived results are cached per dataset version, so the cache is emptied before every run
+    # to time the computation rather than the lookup
+    for function in (analyze, analyze_sum, sum_year, sum_month):
+        record(function, lambda: getattr(module, function)(df), setup=derived_cache.clear)
+    for count, granularity in ((PLOTTED_NAMES, 'Month'), (MANY_PLOTTED_NAMES, 'Day')):
+        names = tuple(value(df, 'top_names', count))
+        record(f'plot data (top {count}, {granularity})',
+               lambda: plot_data(df, names, granularity), setup=derived_cache.clear)
+    derived_cache.clear()
+    return results
+
+
+def compare(results, baseline_path, threshold):
+    # Print how every timing changed against a previous result file
+    with open(baseline_path) as f:
+        baseline = {(r['dataset'], r['scale'], r['operation']): r['seconds'] for r in json.load(f)['results']}
+    print(f"\nCompared with {baseline_path}:")
+    for result in results:
+        before = baseline.get((result['dataset'], result['scale'], result['operation']))
+        if not before:
+            continue
+        ratio = result['seconds'] / before
+        flag = '  SLOWER' if ratio > 1 + threshold else ''
+        print(f"  {result['dataset']:<9} {result['scale']:>6g}x {result['operation']:<34} "
+              f"{before * 1000:>11.1f} -> {result['seconds'] * 1000:>11.1f} ms  ({ratio:.2f}x){flag}")
+
+
+def check_stable_fingerprints(work_dir):
+    # Fingerprint the same PDF in two processes. Its font encoding is an indirect object, whose
+    # repr differs between processes, so this fails if anything is hashed by identity.
+    pdf_path = os.path.join(work_dir, 'fingerprints.pdf')
+    write_pdf(pdf_path, page_texts(pd.read_csv(PURCHASER_CSV, nrows=100), DATASETS[0]['header']), encoding_object=True)
+    script = 'import json, sys; from pdf_extraction import page_fingerprints; print(json.dumps(page_fingerprints(sys.argv[1])))'
+    runs = [subprocess.run([sys.executable, '-c', script, pdf_path], cwd=ROOT_DIR, check=True,
+                           capture_output=True, text=True).stdout for _ in range(2)]
+    assert runs[0] == runs[1], 'page fingerprints differ between processes'
+    print(f"Page fingerprints: {len(json.loads(runs[0]))} pages, the same in two processes")
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Time the hot paths on synthetic data, from PDF conversion to chart data')
+    parser.add_argument('--scales', type=float, nargs='+', default=[1, 10, 100, 1000])
+    parser.add_argument('--datasets', nargs='+', default=[spec['dataset'] for spec in DATASETS],
+                        choices=[spec['dataset'] for spec in DATASETS])
+    parser.add_argument('--repeat', type=int, default=3)
+    parser.add_argument('--text-max-scale', type=float, default=100,
+                        help='Skip process_text (page texts are held in memory) above this scale')
+    parser.add_argument('--pdf-max-scale', type=float, default=10,
+                        help='Skip writing and converting synthetic PDFs above this scale')
+    parser.add_argument('--workers', type=int, default=None,
+                        help='Processes used by convert_pdf_to_csv (default: number of cores)')
+    parser.add_argument('--work-dir', default=None,
+                        help='Where the synthetic files are written (default: a temporary directory, removed afterwards)')
+    parser.add_argument('--output', default='benchmark_results.json')
+    parser.add_argument('--compare', default=None, metavar='RESULTS_JSON',
+                        help='Previous result file to compare the timings with')
+    parser.add_argument('--threshold', type=float, default=0.1,
+                        help='With --compare, flag timings more than this fraction slower')
+    args = parser.parse_args()
+
+    work_dir = args.work_dir or tempfile.mkdtemp(prefix='bench_suite_')
+    os.makedirs(work_dir, exist_ok=True)
+    results = []
+    try:
+        check_stable_fingerprints(work_dir)
+        for spec in DATASETS:
+            if spec['dataset'] in args.datasets:
+                for scale in args.scales:
+                    results.extend(bench_dataset(spec, scale, work_dir, args))
+    finally:
+        if args.work_dir is None:
+            shutil.rmtree(work_dir, ignore_errors=True)
+
+    report = {
+        'format': RESULT_FORMAT,
+        'created': time.strftime('%Y-%m-%dT%H:%M:%S%z'),
+        'commit': git_commit(),
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'cpu_count': os.cpu_count(),
+        'results': results,
+    }
+    with open(args.output, 'w') as f:
+        json.dump(report, f, indent=2)
+    print(f"\nResults written to {args.output}")
+
+    if args.compare:
+        compare(results, args.compare, args.threshold)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,87 @@
+# benchmarks/bench_tokenizer.py
+#
+# Throughput of the single-pass record tokenizer versus the original process_text.
+#
+#   python -m benchmarks.bench_tokenizer            # pages rebuilt from the CSVs
+#   python -m benchmarks.bench_tokenizer --pdf      # pages extracted from the real PDFs (slow)
+
+import argparse
+import re
+
+import pandas as pd
+
+from benchmarks.common import ENCASHER_CSV, PURCHASER_CSV, ROOT_DIR, best_time, load_cleaner
+from benchmarks.synthetic_data import page_texts
+
+
+def legacy_process_text(texts):
+    # The process_text implementation the cleaners used before record_tokenizer, kept as the baseline
+    all_rows = []
+    for text in texts:
+        date_starts = [match.start() for match in re.finditer(
+            r'\d{2}/[A-Za-z]{3}/20\d{2}', text)]
+        segments = [text[date_starts[i]:date_starts[i + 1]]
+                    for i in range(len(date_starts) - 1)]
+        if date_starts:
+            segments.append(text[date_starts[-1]:])
+
+        for segment in segments:
+            date_match = re.search(r'\d{2}/[A-Za-z]{3}/20\d{2}', segment)
+            denomination_match = re.search(
+                r'(1,000|10,000|1,00,000|10,00,000|1,00,00,000|10,00,00,000)', segment)
+            if date_match and denomination_match:
+                date_of_purchase = date_match.group()
+                denomination = denomination_match.group().replace(',', '')
+                purchaser_name = segment.replace(date_of_purchase, '').replace(
+                    denomination_match.group(), '').strip()
+                all_rows.append(
+                    [date_of_purchase, purchaser_name, int(denomination)])
+
+    return all_rows
+
+
+def pages_from_csv(csv_path, header):
+    # Lay the CSV rows out the way PyPDF2 returns a disclosure page
+    return page_texts(pd.read_csv(csv_path), header)
+
+
+def pages_from_pdf(pdf_path):
+    from pdf_extraction import extract_page_texts
+    return list(extract_page_texts(pdf_path))
+
+
+def run(name, texts, process_text, repeat):
+    legacy_rows = [tuple(row) for row in legacy_process_text(texts)]
+    rows = process_text(texts)
+    assert rows == legacy_rows, f'{name}: tokenizer output differs from legacy process_text'
+
+    legacy_seconds = best_time(lambda: legacy_process_text(texts), repeat)
+    seconds = best_time(lambda: process_text(texts), repeat)
+    print(f'{name}: {len(texts)} pages, {len(rows)} records')
+    print(f'  legacy process_text : {len(rows) / legacy_seconds:>12,.0f} records/sec')
+    print(f'  record_tokenizer    : {len(rows) / seconds:>12,.0f} records/sec'
+          f'  ({legacy_seconds / seconds:.1f}x)')
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Compare the throughput of the record tokenizer with the original process_text')
+    parser.add_argument('--pdf', action='store_true',
+                        help='Extract page text from the PDFs instead of rebuilding it from the CSVs')
+    parser.add_argument('--repeat', type=int, default=5)
+    args = parser.parse_args()
+
+    datasets = [
+        ('Purchaser', '01_clean_purchaser_data.py', PURCHASER_CSV,
+         ROOT_DIR + '/pdf_data/Purchaser_Details_Final.pdf',
+         'Date of Purchase Purchaser Name Denomination'),
+        ('Encasher', '02_clean_encasher_data.py', ENCASHER_CSV,
+         ROOT_DIR + '/pdf_data/Encashment_Details_Final.pdf',
+         'Date of \nEncashment Name of the Political Party Denomination'),
+    ]
+    for name, cleaner, csv_path, pdf_path, header in datasets:
+        texts = pages_from_pdf(pdf_path) if args.pdf else pages_from_csv(csv_path, header)
+        run(name, texts, load_cleaner(cleaner).process_text, args.repeat)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,68 @@
+# benchmarks/common.py
+
+import importlib.util
+import os
+import time
+
+import numpy as np
+import pandas as pd
+
+# Root of the repository, so benchmarks can be run from anywhere
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+PURCHASER_CSV = os.path.join(ROOT_DIR, '01_Purchaser_Details.csv')
+ENCASHER_CSV = os.path.join(ROOT_DIR, '02_Encasher_Details.csv')
+
+
+def load_cleaner(file_name):
+    # The cleaner scripts start with a digit, so they can't be imported with a plain import
+    path = os.path.join(ROOT_DIR, file_name)
+    spec = importlib.util.spec_from_file_location(
+        os.path.splitext(file_name)[0], path)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+def format_indian(amount):
+    # 10000000 -> '1,00,00,000', the grouping used in the disclosure PDFs
+    digits = str(amount)
+    if len(digits) <= 3:
+        return digits
+    head, tail = digits[:-3], digits[-3:]
+    groups = []
+    while len(head) > 2:
+        groups.insert(0, head[-2:])
+        head = head[:-2]
+    groups.insert(0, head)
+    return ','.join(groups) + ',' + tail
+
+
+def best_time(func, repeat=5, setup=None):
+    # Best wall time over a few runs, in seconds; setup() runs untimed before each run
+    timings = []
+    for _ in range(repeat):
+        if setup is not None:
+            setup()
+        start = time.perf_counter()
+        func()
+        timings.append(time.perf_counter() - start)
+    return min(timings)
+
+
+def synthetic_dataset(df, scale, name_column, date_column, seed=0):
+    # A dataset `scale` times the size of df: rows are resampled from df, and each copy of the
+    # names gets its own suffix, so the number of distinct names grows with the row count too
+    rng = np.random.default_rng(seed)
+    rows = int(len(df) * scale)
+    picks = rng.integers(0, len(df), rows)
+    copies = rng.integers(0, max(1, int(scale)), rows)
+    names = df[name_column].astype(str).to_numpy()[picks]
+    names = np.where(copies == 0, names, names + ' #' + copies.astype(str))
+    dates = df[date_column].to_numpy()[rng.integers(0, len(df), rows)]
+    return pd.DataFrame({
+        'Sr No.': np.arange(1, rows + 1),
+        date_column: dates,
+        name_column: names,
+        'Denomination': df['Denomination'].to_numpy()[picks],
+    })
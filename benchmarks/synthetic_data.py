@@ -0,0 +1,92 @@
+# benchmarks/synthetic_data.py
+#
+# Synthetic disclosure data at a multiple of the size of the published files: CSVs in the
+# cleaners' output format and PDFs with the same row layout, so that every stage from
+# convert_pdf_to_csv to the charts can be timed on more data than exists today.
+
+import pandas as pd
+
+from benchmarks.common import format_indian, synthetic_dataset
+
+ROWS_PER_PAGE = 45
+
+# A4 portrait, in points
+PAGE_WIDTH = 595
+PAGE_HEIGHT = 842
+FONT_SIZE = 7
+LINE_HEIGHT = 9
+MARGIN = 36
+
+
+def synthetic_csv(csv_path, out_path, scale, name_column, date_column, seed=0):
+    # Write a CSV `scale` times the size of csv_path, in the same format, and return it as read back
+    df = pd.read_csv(csv_path)
+    data = synthetic_dataset(df, scale, name_column, date_column, seed=seed)
+    data.to_csv(out_path, index=False)
+    return data
+
+
+def page_texts(df, header, rows_per_page=ROWS_PER_PAGE):
+    # Lay the rows out the way PyPDF2 returns a disclosure page: a header, then one
+    # 'date name amount' line per row
+    lines = [f'{date} {name} {format_indian(amount)}'
+             for date, name, amount in df.iloc[:, 1:4].itertuples(index=False)]
+    return [header + '\n' + '\n'.join(lines[i:i + rows_per_page])
+            for i in range(0, len(lines), rows_per_page)]
+
+
+def _pdf_string(text):
+    # Literal PDF string, with the characters that are special inside ( ) escaped
+    escaped = text.replace('\\', '\\\\').replace('(', '\\(').replace(')', '\\)')
+    return '(' + escaped + ')'
+
+
+def _content_stream(text):
+    lines = text.split('\n')
+    ops = [f'BT /F1 {FONT_SIZE} Tf {LINE_HEIGHT} TL {MARGIN} {PAGE_HEIGHT - MARGIN} Td']
+    ops.extend(f'{_pdf_string(line)} Tj T*' for line in lines)
+    ops.append('ET')
+    return '\n'.join(ops).encode('latin-1', errors='replace')
+
+
+def write_pdf(path, texts, encoding_object=False):
+    # Write a PDF with one page per text, one text line per PDF line, in Helvetica.
+    # Pages are written as they are generated, so this doesn't hold the whole file in memory.
+    # Object numbers: 1 catalog, 2 page tree, 3 font, then (page, content) pairs from 4, and with
+    # encoding_object the font's encoding as an object of its own after them, the way many
+    # generated PDFs refer to it.
+    offsets = {}
+    with open(path, 'wb') as out:
+        def write_object(number, body):
+            offsets[number] = out.tell()
+            out.write(f'{number} 0 obj\n'.encode() + body + b'\nendobj\n')
+
+        out.write(b'%PDF-1.4\n')
+        page_numbers = []
+        for i, text in enumerate(texts):
+            page_number, content_number = 4 + 2 * i, 5 + 2 * i
+            content = _content_stream(text)
+            write_object(page_number, (
+                f'<< /Type /Page /Parent 2 0 R /MediaBox [0 0 {PAGE_WIDTH} {PAGE_HEIGHT}] '
+                f'/Resources << /Font << /F1 3 0 R >> >> /Contents {content_number} 0 R >>').encode())
+            write_object(content_number, f'<< /Length {len(content)} >>\nstream\n'.encode()
+                         + content + b'\nendstream')
+            page_numbers.append(page_number)
+
+        font = b'<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica /Encoding /WinAnsiEncoding >>'
+        if encoding_object:
+            encoding_number = max(offsets, default=3) + 1
+            write_object(encoding_number, b'<< /Type /Encoding /BaseEncoding /WinAnsiEncoding >>')
+            font = font.replace(b'/WinAnsiEncoding', f'{encoding_number} 0 R'.encode())
+        write_object(3, font)
+
+        kids = ' '.join(f'{number} 0 R' for number in page_numbers)
+        write_object(2, f'<< /Type /Pages /Kids [{kids}] /Count {len(page_numbers)} >>'.encode())
+        write_object(1, b'<< /Type /Catalog /Pages 2 0 R >>')
+
+        xref_offset = out.tell()
+        count = max(offsets) + 1
+        out.write(f'xref\n0 {count}\n0000000000 65535 f \n'.encode())
+        for number in range(1, count):
+            out.write(f'{offsets[number]:010d} 00000 n \n'.encode())
+        out.write(f'trailer\n<< /Size {count} /Root 1 0 R >>\nstartxref\n{xref_offset}\n%%EOF\n'.encode())
@@ -0,0 +1,81 @@
+# chart_data.py
+
+import numpy as np
+import pandas as pd
+
+from time_buckets import PERIOD_COLUMNS, period_codes, period_labels, sums_per_code
+
+# Points kept per series: about the number of pixels across a chart, more can't be told apart
+MAX_POINTS_PER_SERIES = 800
+# Points kept per figure; with many series each one gets its share, but at least the minimum
+MAX_POINTS_PER_FIGURE = 20000
+MIN_POINTS_PER_SERIES = 100
+# Above this many points in a figure the traces are drawn with WebGL (plotly express uses the
+# same threshold for render_mode='auto'), and markers are left out
+WEBGL_THRESHOLD = 1000
+
+
+def period_series(df, index, date_column, names, granularity):
+    # Sum of denominations per (name, period) of the given names, columns [period column,
+    # name column, 'Denomination'], by name in the given order, then chronologically.
+    # Only the rows of the selected names are read, through the dataset's name index.
+    codes = index.codes_for(names)
+    slices = [index.row_order[index.row_starts[code]:index.row_starts[code + 1]] for code in codes]
+    rows = np.concatenate(slices) if slices else np.array([], dtype='int64')
+    series = np.repeat(np.arange(len(codes)), [len(s) for s in slices])
+
+    periods = period_codes(df[date_column].to_numpy()[rows], granularity)
+    # (name, period) pairs are numbered from the first period with data, not from 1970
+    first = periods.min() if len(periods) else 0
+    span = periods.max() - first + 1 if len(periods) else 1
+    keys = series * span + (periods - first)
+    unique_keys, inverse = np.unique(keys, return_inverse=True)
+    sums = sums_per_code(inverse, df['Denomination'].to_numpy()[rows], len(unique_keys))
+    return pd.DataFrame({
+        PERIOD_COLUMNS[granularity]: period_labels(unique_keys % span + first, granularity),
+        index.name_column: [index.names[codes[i]] for i in unique_keys // span],
+        'Denomination': sums.astype('int64'),
+    })
+
+
+def downsample(values, max_points=MAX_POINTS_PER_SERIES):
+    # Positions of the points to draw from a series: all of them when there are few enough,
+    # otherwise the minimum and the maximum of each of max_points / 2 consecutive buckets, so
+    # peaks and dips survive the reduction
+    if len(values) <= max_points:
+        return np.arange(len(values))
+    buckets = np.arange(len(values)) * (max_points // 2) // len(values)
+    order = np.lexsort((values, buckets))  # by bucket, then value
+    ends = np.flatnonzero(np.diff(buckets[order], append=buckets[-1] + 1))
+    starts = np.concatenate(([0], ends[:-1] + 1))
+    return np.unique(np.concatenate((order[starts], order[ends])))
+
+
+def line_figure(series, x, y='Denomination', color=None, title=None, max_points=MAX_POINTS_PER_SERIES):
+    # Line chart of `series`, one trace per value of `color`, each downsampled to at most
+    # max_points (fewer when there are many traces), drawn with WebGL when the figure still has more than WEBGL_THRESHOLD points
+    import plotly.graph_objects as go  # charts are only drawn by the app and the HTML report
+
+    groups = [(None, series)] if color is None else [
+        (name, group) for name, group in series.groupby(color, sort=False, observed=True)]
+    per_series = min(max_points, max(MIN_POINTS_PER_SERIES, MAX_POINTS_PER_FIGURE // max(len(groups), 1)))
+    traces = []
+    for name, group in groups:
+        keep = downsample(group[y].to_numpy(), per_series)
+        traces.append((name, group[x].to_numpy()[keep], group[y].to_numpy()[keep]))
+
+    points = sum(len(xs) for _, xs, _ in traces)
+    scatter = go.Scattergl if points > WEBGL_THRESHOLD else go.Scatter
+    mode = 'lines' if points > WEBGL_THRESHOLD else 'lines+markers'
+    fig = go.Figure([scatter(x=xs, y=ys, name=name, mode=mode, showlegend=color is not None)
+                     for name, xs, ys in traces])
+    fig.update_layout(title=title, xaxis_title=x, yaxis_title=y, legend_title=color)
+    return fig
+
+
+def top_entities(index, n):
+    # The n names with the largest total denomination, largest first, from a dataset's name index
+    totals = np.bincount(index.month_names, weights=index.month_sums, minlength=len(index.names))
+    order = np.argsort(-totals, kind='stable')[:n]
+    return [index.names[code] for code in order if totals[code] > 0]
+
@@ -0,0 +1,302 @@
+# chunked_analytics.py
+#
+# Out-of-core version of the per-dataset analysis, for CSVs too large to load at once. The CSV
+# is split into line-aligned byte ranges of about CHUNK_BYTES; each range is read on its own
+# (optionally in a process pool) into a small partial aggregate, and the partials are merged in
+# file order. Peak memory is a few chunks plus the per-name and per-period sums, whatever the
+# size of the file.
+#
+#   python chunked_analytics.py purchaser --check
+#   python chunked_analytics.py encasher --csv combined_encashments.csv --workers 4 --chunk-mb 64
+#
+# The results match the in-memory path (the summary node of dataset_graph, the sums of
+# rollup_by_entity and sum_by_period) exactly: sums are kept as int64 throughout, and the median
+# and quartiles come from the denomination histogram, which is exact. The per-name date lists of
+# rollup_by_entity grow with the data, so they're left out here. Names are merged with the
+# dataset's names file (see entity_resolution), like the loaders merge them.
+
+import argparse
+import io
+import os
+import sys
+import time
+from collections import deque, namedtuple
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import pandas as pd
+
+from dataset_artifact import build_dataset
+from dataset_graph import SCHEMAS, with_derived
+from entity_resolution import load_names
+from summary_stats import TABLE_QUANTILES, SummaryStats, quantile_from_counts
+from time_buckets import GRANULARITIES, PERIOD_COLUMNS, period_codes, period_labels
+
+# Size of the byte range each chunk is read from; a chunk takes a few times that in memory
+CHUNK_BYTES = 16 * 1024 * 1024
+# Chunks submitted to the pool ahead of the one being merged, per worker
+CHUNKS_IN_FLIGHT_PER_WORKER = 2
+
+# Mergeable state of a run of consecutive rows:
+# rows, total               number of rows with a denomination, and their sum
+# entities                  int64 Series, sum of denominations per name (every name seen, so the
+#                           number of distinct names is exact)
+# periods                   {granularity: int64 Series, sum per period code}
+# denominations             int64 Series, number of bonds per denomination
+# first_sr_no, last_sr_no   Sr No. of the first and last row, None when there are no rows
+# sr_no_increasing          whether Sr No. strictly increases over the rows, see table_quantiles
+PartialAggregate = namedtuple('PartialAggregate', [
+    'rows', 'total', 'entities', 'periods', 'denominations', 'first_sr_no', 'last_sr_no', 'sr_no_increasing'])
+
+# The analysis of a whole CSV, in the shapes the in-memory functions return
+ChunkedResult = namedtuple('ChunkedResult', ['summary', 'by_name', 'by_period'])
+
+
+def _empty_sums():
+    return pd.Series([], dtype='int64')
+
+
+def empty_partial(granularities=GRANULARITIES):
+    return PartialAggregate(0, 0, _empty_sums(), {granularity: _empty_sums() for granularity in granularities},
+                            _empty_sums(), None, None, True)
+
+
+def partial_from_frame(df, date_column, name_column, granularities=GRANULARITIES, names=None):
+    # Partial aggregate of one chunk, as read from the CSV (dates as strings). `names`
+    # ({variant: canonical}) merges the sums of a name's variants under its canonical name.
+    dates = pd.to_datetime(df[date_column], format='%d/%b/%Y')
+    denominations = df['Denomination'].astype('int64')
+    sr_no = df['Sr No.'].to_numpy()
+    # groupby leaves out missing names, like the categorical codes of the in-memory path
+    entities = denominations.groupby(df[name_column], sort=False).sum()
+    if names:
+        # Renamed once per distinct name of the chunk rather than per row
+        entities = entities.groupby(entities.index.map(lambda name: names.get(name, name)), sort=False).sum()
+    return PartialAggregate(
+        rows=len(df),
+        total=int(denominations.sum()),
+        entities=entities,
+        periods={granularity: denominations.groupby(period_codes(dates, granularity), sort=False).sum()
+                 for granularity in granularities},
+        denominations=denominations.value_counts(sort=False),
+        first_sr_no=int(sr_no[0]) if len(df) else None,
+        last_sr_no=int(sr_no[-1]) if len(df) else None,
+        sr_no_increasing=bool(np.all(np.diff(sr_no) > 0)),
+    )
+
+
+def _add_sums(a, b):
+    # Sum of two keyed Series. concat + groupby keeps int64, where Series.add(fill_value=0)
+    # would go through float64 and lose exactness above 2**53.
+    if a.empty:
+        return b
+    if b.empty:
+        return a
+    return pd.concat([a, b]).groupby(level=0, sort=False).sum()
+
+
+def merge_partials(a, b):
+    # Partial aggregate of the rows of `a` followed by the rows of `b`
+    if not b.rows:
+        return a
+    if not a.rows:
+        return b
+    return PartialAggregate(
+        rows=a.rows + b.rows,
+        total=a.total + b.total,
+        entities=_add_sums(a.entities, b.entities),
+        periods={granularity: _add_sums(a.periods[granularity], b.periods[granularity]) for granularity in a.periods},
+        denominations=_add_sums(a.denominations, b.denominations),
+        first_sr_no=a.first_sr_no,
+        last_sr_no=b.last_sr_no,
+        sr_no_increasing=a.sr_no_increasing and b.sr_no_increasing and a.last_sr_no < b.first_sr_no,
+    )
+
+
+def chunk_ranges(csv_path, chunk_bytes=CHUNK_BYTES):
+    # (header, [(start, end), ...]): the header line, and byte ranges of about chunk_bytes that
+    # cover the rows and start and end on line boundaries. The cleaners never write a newline
+    # inside a field, so every line is one row.
+    size = os.path.getsize(csv_path)
+    with open(csv_path, 'rb') as file:
+        header = file.readline()
+        ranges = []
+        start = file.tell()
+        while start < size:
+            file.seek(min(start + chunk_bytes, size))
+            file.readline()  # on to the start of the next line
+            end = min(file.tell(), size)
+            ranges.append((start, end))
+            start = end
+    return header, ranges
+
+
+def read_chunk(csv_path, header, start, end, name_column):
+    # The rows in one byte range, parsed like pd.read_csv parses the whole file
+    with open(csv_path, 'rb') as file:
+        file.seek(start)
+        data = file.read(end - start)
+    return pd.read_csv(io.BytesIO(header + data), dtype={name_column: str})
+
+
+def partial_from_range(csv_path, header, start, end, date_column, name_column, granularities=GRANULARITIES,
+                       names=None):
+    # Worker side of aggregate_csv
+    df = read_chunk(csv_path, header, start, end, name_column)
+    return partial_from_frame(df, date_column, name_column, granularities, names)
+
+
+def aggregate_csv(csv_path, date_column, name_column, granularities=GRANULARITIES, workers=1,
+                  chunk_bytes=CHUNK_BYTES, names=None):
+    # Partial aggregate of the whole CSV, read chunk by chunk.
+    # workers=1 reads serially in this process, None uses one process per core.
+    header, ranges = chunk_ranges(csv_path, chunk_bytes)
+    workers = min(len(ranges), workers or os.cpu_count() or 1)
+    args = [(csv_path, header, start, end, date_column, name_column, granularities, names)
+            for start, end in ranges]
+
+    result = empty_partial(granularities)
+    if workers <= 1:
+        for chunk_args in args:
+            result = merge_partials(result, partial_from_range(*chunk_args))
+        return result
+
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        # Merged in file order as they complete, with only a few chunks in flight, so neither the
+        # chunks nor their partials pile up
+        pending = deque()
+        for chunk_args in args:
+            if len(pending) >= workers * CHUNKS_IN_FLIGHT_PER_WORKER:
+                result = merge_partials(result, pending.popleft().result())
+            pending.append(executor.submit(partial_from_range, *chunk_args))
+        while pending:
+            result = merge_partials(result, pending.popleft().result())
+    return result
+
+
+def table_quantiles(csv_path, partial, date_column, name_column, chunk_rows=100000, names=None):
+    # The rows summary_stats.table_quantiles picks, with their derived columns (see dataset_graph),
+    # found with a second streaming pass. When Sr No. increases the sorted order is the file
+    # order, so they're the rows at the 'nearest' quantile positions. Otherwise the in-memory path
+    # sorts every row by every column, which can't be done in bounded memory, and None is returned.
+    if not partial.rows or not partial.sr_no_increasing:
+        return None
+    positions = np.quantile(np.arange(partial.rows), TABLE_QUANTILES, method='nearest')
+    picked = []
+    offset = 0
+    for chunk in pd.read_csv(csv_path, dtype={name_column: str}, chunksize=chunk_rows):
+        wanted = positions[(positions >= offset) & (positions < offset + len(chunk))]
+        picked.append(chunk.iloc[wanted - offset])
+        offset += len(chunk)
+        if offset > positions[-1]:
+            break
+    picked = pd.concat(picked, ignore_index=True)
+    if names:
+        picked[name_column] = picked[name_column].map(lambda name: names.get(name, name))
+    result = with_derived(build_dataset(picked, date_column, name_column))
+    result.index = pd.Index(TABLE_QUANTILES, dtype='float64')
+    return result
+
+
+def finish(partial, name_column, quantiles=None):
+    # Turn the merged partial aggregate into the results of the in-memory functions
+    denominations = partial.denominations.sort_index()
+    values, counts = denominations.index.to_numpy(dtype='int64'), denominations.to_numpy()
+    n = partial.rows
+    q1 = np.float64(quantile_from_counts(values, counts, 0.25)) if n else np.nan
+    q3 = np.float64(quantile_from_counts(values, counts, 0.75)) if n else np.nan
+    summary = SummaryStats(
+        unique_names=len(partial.entities),
+        total_denomination=np.int64(partial.total),
+        mean=np.float64(partial.total / n) if n else np.nan,
+        median=np.float64(quantile_from_counts(values, counts, 0.5)) if n else np.nan,
+        q1=q1,
+        q3=q3,
+        iqr=q3 - q1,
+        quantiles=quantiles,
+    )
+
+    # By name in sorted order, the order of the categories the in-memory frame has
+    entities = partial.entities.sort_index()
+    by_name = pd.DataFrame({name_column: entities.index.to_numpy(dtype=object),
+                            'Denomination': entities.to_numpy(dtype='int64')})
+    by_period = {}
+    for granularity, sums in partial.periods.items():
+        sums = sums.sort_index()
+        by_period[granularity] = pd.DataFrame({
+            PERIOD_COLUMNS[granularity]: period_labels(sums.index.to_numpy(dtype='int64'), granularity),
+            'Denomination': sums.to_numpy(dtype='int64'),
+        })
+    return ChunkedResult(summary, by_name, by_period)
+
+
+def analyze_csv(csv_path, date_column, name_column, granularities=GRANULARITIES, workers=1,
+                chunk_bytes=CHUNK_BYTES, names=None):
+    # Summary statistics, sum per name and sums per period of a cleaned CSV, in bounded memory
+    partial = aggregate_csv(csv_path, date_column, name_column, granularities, workers, chunk_bytes, names)
+    quantiles = table_quantiles(csv_path, partial, date_column, name_column, names=names)
+    return finish(partial, name_column, quantiles)
+
+
+def compare_with_in_memory(result, csv_path, date_column, name_column, names=None):
+    # Differences between a chunked result and the in-memory path on the same CSV (which has to
+    # fit in memory for this) and the same names; an empty list when they match
+    from dataset_artifact import load_dataset
+    from dataset_graph import value
+    from entity_rollup import rollup_by_entity
+    from time_buckets import sum_by_period
+
+    df = load_dataset(csv_path, date_column, name_column, names=names)
+    expected = value(df, 'summary')
+    differences = []
+    for field in SummaryStats._fields:
+        if field == 'quantiles':
+            continue
+        got, wanted = getattr(result.summary, field), getattr(expected, field)
+        if not (got == wanted or (pd.isna(got) and pd.isna(wanted))):
+            differences.append(f'{field}: chunked {got}, in memory {wanted}')
+    if result.summary.quantiles is not None and not result.summary.quantiles.astype(object).equals(
+            expected.quantiles.astype(object)):
+        differences.append('quantile rows differ')
+
+    by_name = rollup_by_entity(df, name_column, date_column)
+    if not (by_name[name_column].astype(object).tolist() == result.by_name[name_column].tolist()
+            and by_name['Denomination'].tolist() == result.by_name['Denomination'].tolist()):
+        differences.append('sum per name differs')
+    for granularity, by_period in result.by_period.items():
+        if not by_period.equals(sum_by_period(df, date_column, granularity)):
+            differences.append(f'sum per {granularity} differs')
+    return differences
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Analyze a cleaned CSV chunk by chunk, in bounded memory')
+    parser.add_argument('dataset', choices=SCHEMAS)
+    parser.add_argument('--csv', default=None, help='CSV to analyze (default: the dataset\'s CSV)')
+    parser.add_argument('--workers', type=int, default=1,
+                        help='Number of processes reading chunks (default: 1, serial; 0 = one per core)')
+    parser.add_argument('--chunk-mb', type=float, default=CHUNK_BYTES / 1024 / 1024,
+                        help='Size of the part of the CSV read at once')
+    parser.add_argument('--check', action='store_true',
+                        help='Also run the in-memory analysis and report any difference')
+    args = parser.parse_args()
+
+    schema = SCHEMAS[args.dataset]
+    csv_path = args.csv or schema.csv_file
+    date_column, name_column = schema.date_column, schema.name_column
+    names = load_names(csv_path)
+    start = time.perf_counter()
+    result = analyze_csv(csv_path, date_column, name_column, workers=args.workers,
+                         chunk_bytes=int(args.chunk_mb * 1024 * 1024), names=names)
+    print(f"Analyzed {csv_path} in {time.perf_counter() - start:.2f} s")
+    for field in SummaryStats._fields[:-1]:
+        print(f"{field}: {getattr(result.summary, field)}")
+    print(f"{len(result.by_name)} names, " + ', '.join(
+        f"{len(frame)} {granularity.lower()}s" for granularity, frame in result.by_period.items()))
+
+    if args.check:
+        differences = compare_with_in_memory(result, csv_path, date_column, name_column, names)
+        for difference in differences:
+            print(difference)
+        print("Matches the in-memory analysis" if not differences else f"{len(differences)} differences found")
+        sys.exit(1 if differences else 0)
@@ -0,0 +1,82 @@
+# csv_pipeline.py
+
+import csv
+import json
+import os
+
+from dataset_artifact import file_digest
+from pdf_extraction import extract_pages
+
+# Size of the write buffer in front of the CSV file
+WRITE_BUFFER_BYTES = 1024 * 1024
+
+
+def checkpoint_path(csv_path):
+    return csv_path + '.progress'
+
+
+def read_checkpoint(csv_path, pdf_digest):
+    # Return the checkpoint of an interrupted run of the same PDF, or None
+    try:
+        with open(checkpoint_path(csv_path)) as file:
+            checkpoint = json.load(file)
+    except (OSError, ValueError):
+        return None
+    if checkpoint.get('pdf') != pdf_digest or not os.path.exists(csv_path):
+        return None
+    if os.path.getsize(csv_path) < checkpoint['bytes']:
+        return None
+    return checkpoint
+
+
+def write_checkpoint(csv_path, checkpoint):
+    # Write to a temporary file and rename it, so the checkpoint is never half written
+    temp_path = checkpoint_path(csv_path) + '.tmp'
+    with open(temp_path, 'w') as file:
+        json.dump(checkpoint, file)
+    os.replace(temp_path, checkpoint_path(csv_path))
+
+
+def stream_pdf_to_csv(pdf_path, csv_path, columns, workers=None, cache=None, resume=False):
+    # Stream records page by page from the PDF into the CSV, without holding the whole
+    # document in memory. `columns` is the header; 'Sr No.' is numbered here, in page order.
+    # Yields (page_number, PageTokens) once each page's rows have been written to disk.
+    # After every page a checkpoint is saved next to the CSV, and with resume=True an
+    # interrupted run picks up again after the last completed page.
+    pdf_digest = file_digest(pdf_path)
+    checkpoint = read_checkpoint(csv_path, pdf_digest) if resume else None
+
+    if checkpoint is None:
+        checkpoint = {'pdf': pdf_digest, 'pages': 0, 'rows': 0, 'bytes': 0}
+        file = open(csv_path, 'w', newline='', encoding='utf-8', buffering=WRITE_BUFFER_BYTES)
+    else:
+        # Drop anything written after the last checkpoint, it belongs to an unfinished page
+        file = open(csv_path, 'r+', newline='', encoding='utf-8', buffering=WRITE_BUFFER_BYTES)
+        file.truncate(checkpoint['bytes'])
+        file.seek(0, os.SEEK_END)
+
+    with file:
+        # Same dialect as DataFrame.to_csv, so the output is byte-identical to the old cleaners
+        writer = csv.writer(file, lineterminator='\n')
+        if checkpoint['bytes'] == 0:
+            writer.writerow(columns)
+            file.flush()
+            checkpoint['bytes'] = os.fstat(file.fileno()).st_size
+            write_checkpoint(csv_path, checkpoint)
+
+        sr_no = checkpoint['rows']
+        for page_number, (_, page) in enumerate(
+                extract_pages(pdf_path, workers=workers, cache=cache, start=checkpoint['pages']),
+                checkpoint['pages']):
+            for date, name, denomination in page.records:
+                sr_no += 1
+                writer.writerow((sr_no, date, name, denomination))
+
+            file.flush()
+            checkpoint.update(pages=page_number + 1, rows=sr_no,
+                              bytes=os.fstat(file.fileno()).st_size)
+            write_checkpoint(csv_path, checkpoint)
+            yield page_number, page
+
+    # The CSV is complete, nothing left to resume
+    os.remove(checkpoint_path(csv_path))
@@ -0,0 +1,157 @@
+# dataset_artifact.py
+
+import hashlib
+import json
+import os
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+
+from derived_cache import tag_dataset
+
+# Bump when the layout of the artifact changes, so older files are treated as stale
+# (2: Year and Month-Year are no longer stored, dataset_graph derives them when asked for)
+ARTIFACT_FORMAT = '2'
+
+# The only denominations electoral bonds were issued in; the artifact stores an int8 index into this
+DENOMINATIONS = np.array([1000, 10000, 100000, 1000000, 10000000, 100000000], dtype='int64')
+
+
+def artifact_path(csv_path):
+    # 01_Purchaser_Details.csv -> 01_Purchaser_Details.arrow
+    return os.path.splitext(csv_path)[0] + '.arrow'
+
+
+def file_digest(path):
+    # SHA-256 of a file, read in blocks so large PDFs and CSVs aren't loaded into memory
+    digest = hashlib.sha256()
+    with open(path, 'rb') as file:
+        for block in iter(lambda: file.read(1024 * 1024), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def names_version(names):
+    # Short digest of a name mapping, added to the dataset version so results derived before
+    # the names were merged aren't reused after
+    return hashlib.sha256(json.dumps(sorted(names.items())).encode()).hexdigest()[:16]
+
+
+def rename_dictionary(column, names):
+    # The dictionary-encoded name column with every name mapped through `names` (variant ->
+    # canonical, see entity_resolution). Only the dictionary is renamed and the indices remapped,
+    # and the dictionary is kept sorted like the categories of a freshly read CSV.
+    chunks = []
+    for chunk in column.chunks:
+        renamed = [names.get(name, name) for name in chunk.dictionary.to_pylist()]
+        dictionary = sorted(set(renamed))
+        position = {name: i for i, name in enumerate(dictionary)}
+        remap = pa.array([position[name] for name in renamed], type=chunk.indices.type)
+        chunks.append(pa.DictionaryArray.from_arrays(remap.take(chunk.indices), dictionary))
+    return pa.chunked_array(chunks, type=pa.dictionary(column.type.index_type, pa.string()))
+
+
+def build_dataset(data, date_column, name_column):
+    # Turn the raw CSV frame into the typed frame the analysis works on: parsed dates and
+    # dictionary-encoded names. Columns derived from these are computed on demand (see dataset_graph).
+    return pd.DataFrame({
+        'Sr No.': data['Sr No.'],
+        date_column: pd.to_datetime(data[date_column], format='%d/%b/%Y'),
+        name_column: data[name_column].astype('category'),
+        'Denomination': data['Denomination'],
+    })
+
+
+def write_artifact(csv_path, date_column, name_column, df=None):
+    # Write the typed columnar (Arrow IPC) version of a cleaned CSV next to it
+    if df is None:
+        df = build_dataset(pd.read_csv(csv_path), date_column, name_column)
+
+    denomination_codes = np.searchsorted(DENOMINATIONS, df['Denomination'].to_numpy())
+    denomination_codes = np.minimum(denomination_codes, len(DENOMINATIONS) - 1)
+    if not np.array_equal(DENOMINATIONS[denomination_codes], df['Denomination'].to_numpy()):
+        raise ValueError(f"{csv_path} has denominations outside {DENOMINATIONS.tolist()}")
+
+    columns = df.drop(columns='Denomination')
+    columns.insert(3, 'Denomination Code', denomination_codes.astype('int8'))
+    table = pa.Table.from_pandas(columns, preserve_index=False)
+    table = table.replace_schema_metadata({
+        'format': ARTIFACT_FORMAT,
+        'source_sha256': file_digest(csv_path),
+        'date_column': date_column,
+        'name_column': name_column,
+    })
+
+    # Write to a temporary file and rename it, so readers never see a half written artifact
+    path = artifact_path(csv_path)
+    with pa.OSFile(path + '.tmp', 'wb') as sink:
+        with pa.ipc.new_file(sink, table.schema) as writer:
+            writer.write_table(table)
+    os.replace(path + '.tmp', path)
+    return path
+
+
+def read_artifact(csv_path, date_column, name_column, names=None):
+    # Memory-map the artifact of a CSV and return it as the typed frame, or None when the
+    # artifact is missing, was written by an older format, or the CSV changed since.
+    # With `names`, spelling variants are merged under their canonical name.
+    path = artifact_path(csv_path)
+    if not os.path.exists(path):
+        return None
+
+    reader = pa.ipc.open_file(pa.memory_map(path, 'r'))
+    metadata = reader.schema.metadata or {}
+    version = file_digest(csv_path)
+    expected = {
+        b'format': ARTIFACT_FORMAT.encode(),
+        b'source_sha256': version.encode(),
+        b'date_column': date_column.encode(),
+        b'name_column': name_column.encode(),
+    }
+    if any(metadata.get(key) != value for key, value in expected.items()):
+        return None
+
+    # Fixed-width columns are handed to pandas without copying out of the mapped file, which makes
+    # their values read-only. The denominations are decoded in Arrow so that column's are too. The
+    # frame itself can still be changed (a column assigned or dropped, attrs edited), and it's shared
+    # between sessions, so callers must work on a copy rather than change it.
+    table = reader.read_all()
+    position = table.schema.get_field_index('Denomination Code')
+    table = table.set_column(position, 'Denomination', pa.array(DENOMINATIONS).take(table.column(position)))
+    if names:
+        position = table.schema.get_field_index(name_column)
+        table = table.set_column(position, name_column, rename_dictionary(table.column(position), names))
+        version = version + '+' + names_version(names)
+    return tag_dataset(table.to_pandas(split_blocks=True), version)
+
+
+def load_dataset(csv_path, date_column, name_column, names=None):
+    # Load a cleaned dataset from its artifact, falling back to the CSV (and refreshing the
+    # artifact) when the artifact is missing or stale. The artifact always has the names as
+    # extracted; `names` ({variant: canonical}) is applied when it's read.
+    # df.attrs['version'] is the SHA-256 of the CSV (plus a digest of `names`), derived results
+    # are cached against it (see derived_cache.tag_dataset).
+    df = read_artifact(csv_path, date_column, name_column, names)
+    if df is not None:
+        return df
+
+    df = build_dataset(pd.read_csv(csv_path), date_column, name_column)
+    try:
+        write_artifact(csv_path, date_column, name_column, df)
+    except (OSError, ValueError):
+        # A read-only checkout or unexpected data just means no artifact for the next load
+        return _renamed(df, name_column, file_digest(csv_path), names)
+    # Return the mapped artifact rather than the frame built here, so every load's values are
+    # read-only. Artifacts are replaced by renaming, so a mapped one stays valid after it's
+    # rewritten.
+    mapped = read_artifact(csv_path, date_column, name_column, names)
+    return mapped if mapped is not None else _renamed(df, name_column, file_digest(csv_path), names)
+
+
+def _renamed(df, name_column, version, names):
+    # A frame built from the CSV, with `names` applied and tagged like read_artifact tags its own
+    if names:
+        df[name_column] = df[name_column].astype(object).map(lambda name: names.get(name, name)).astype('category')
+        version = version + '+' + names_version(names)
+    return tag_dataset(df, version)
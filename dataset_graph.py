@@ -0,0 +1,316 @@
+# dataset_graph.py
+#
+# Everything derived from a loaded dataset, as one graph of lazily computed nodes shared by the
+# purchaser and the encasher pages. Each dataset declares its CSV and which of its columns hold the
+# date, the name and the amount (SCHEMAS), and the nodes are written against those roles, not
+# against column names. The command-line tools look their datasets up there too. A node is computed on first demand, pulling the nodes it's computed from, and
+# kept per dataset version in derived_cache, so it's computed once per version whichever view
+# asks first. Nodes with parameters (a granularity, a list of names) are kept per parameter.
+#
+# Every node evaluation is also recorded: which nodes it pulled, how often it was computed and
+# reused, and how long it took. dump() returns these, the Performance page shows them, and each
+# rerun's profile lists a section per node asked for, with a cache miss when it was recomputed.
+#
+#   python dataset_graph.py purchaser               # evaluate a page's nodes twice, print the dump
+#   python dataset_graph.py encasher --reruns 3
+
+import argparse
+import threading
+import time
+from collections import namedtuple
+
+import numpy as np
+import pandas as pd
+
+from chart_data import line_figure, period_series, top_entities
+from derived_cache import cached_for_dataset, dataset_version
+from entity_rollup import rollup_by_entity
+from name_index import NameIndex
+from profiling import section
+from summary_stats import compute_summary
+from time_buckets import PERIOD_COLUMNS, month_year_labels, period_codes, sum_by_codes
+
+Schema = namedtuple('Schema', ['dataset', 'date_column', 'name_column', 'amount_column', 'csv_file'])
+
+SCHEMAS = {
+    'purchaser': Schema('purchaser', 'Date of Purchase', 'Purchaser Name', 'Denomination',
+                        '01_Purchaser_Details.csv'),
+    'encasher': Schema('encasher', 'Date of Encashment', 'Name of the Political Party', 'Denomination',
+                       '02_Encasher_Details.csv'),
+}
+
+# Columns derived from the stored ones, added after them wherever rows are shown (history tables,
+# quantile rows), the way the loaders used to return them
+DERIVED_COLUMNS = ('Year', 'Month-Year')
+
+# Node name -> compute(graph, *params), see node()
+NODES = {}
+
+# Evaluation records by (dataset, node); guarded by _lock, sessions evaluate nodes in threads
+_stats = {}
+_lock = threading.Lock()
+# The nodes being computed in this thread, innermost last
+_local = threading.local()
+
+
+def node(name):
+    # Register the decorated function as the node `name`. It's called as compute(graph, *params)
+    # and asks the graph for the nodes it needs.
+    def decorator(compute):
+        NODES[name] = compute
+        return compute
+    return decorator
+
+
+def schema_of(df):
+    # The schema whose date and name columns the frame has
+    for schema in SCHEMAS.values():
+        if schema.date_column in df.columns and schema.name_column in df.columns:
+            return schema
+    raise ValueError(f"No dataset schema matches the columns {list(df.columns)}")
+
+
+class DatasetGraph:
+    # The nodes of one frame. Frames returned by the loaders carry a version and their nodes are
+    # memoized; anything else (a few picked rows, a filtered copy, a frame built by hand) is
+    # computed every time.
+
+    def __init__(self, df, memoize=True):
+        self.df = df
+        self.schema = schema_of(df)
+        self.memoize = memoize and dataset_version(df) is not None
+
+    def get(self, name, *params):
+        if name not in NODES:
+            raise ValueError(f"Unknown node {name!r}, expected one of {sorted(NODES)}")
+        stack = getattr(_local, 'stack', None)
+        if stack is None:
+            stack = _local.stack = []
+        key = (self.schema.dataset, name)
+        if stack:
+            _record(stack[-1]['key'], depends_on=name)
+        if not self.memoize:
+            # Nothing is kept, so nothing is counted; the time is part of the node that asked
+            stack.append({'key': key, 'children_ms': 0.0})
+            try:
+                return NODES[name](self, *params)
+            finally:
+                stack.pop()
+
+        computed = []
+
+        def compute():
+            frame = {'key': key, 'children_ms': 0.0}
+            stack.append(frame)
+            start = time.perf_counter()
+            try:
+                return NODES[name](self, *params)
+            finally:
+                stack.pop()
+                elapsed = (time.perf_counter() - start) * 1000
+                if stack:
+                    stack[-1]['children_ms'] += elapsed
+                computed.append((elapsed, elapsed - frame['children_ms']))
+
+        label = name if not params else f"{name}({', '.join(map(_label, params))})"
+        start = time.perf_counter()
+        # cached_for_dataset reports the hit or miss to this section
+        with section(label):
+            result = cached_for_dataset(self.df, ('graph', name) + params, compute)
+        if computed:
+            _record(key, computed=computed[0])
+        else:
+            _record(key, reused=(time.perf_counter() - start) * 1000)
+            # Time spent waiting for a node computed by another session isn't the parent's own
+            if stack:
+                stack[-1]['children_ms'] += (time.perf_counter() - start) * 1000
+        return result
+
+    def column(self, role):
+        # The stored column with a role of the schema: 'date', 'name' or 'amount'
+        return self.df[getattr(self.schema, role + '_column')]
+
+
+def _label(param):
+    # Lists of names are shown by their length in section names
+    return f'{len(param)} names' if isinstance(param, tuple) else str(param)
+
+
+def _record(key, depends_on=None, computed=None, reused=None):
+    with _lock:
+        stats = _stats.setdefault(key, {'depends_on': set(), 'computed': 0, 'reused': 0,
+                                        'total_ms': 0.0, 'own_ms': 0.0, 'last_ms': 0.0})
+        if depends_on is not None:
+            stats['depends_on'].add(depends_on)
+        if computed is not None:
+            stats['computed'] += 1
+            stats['total_ms'] += computed[0]
+            stats['own_ms'] += computed[1]
+            stats['last_ms'] = computed[0]
+        if reused is not None:
+            stats['reused'] += 1
+
+
+def value(df, name, *params):
+    # The node `name` of a loaded dataset, with its parameters (hashable: tuples, not lists)
+    return DatasetGraph(df).get(name, *params)
+
+
+def with_derived(df, rows=None):
+    # The rows at positions `rows` of a loaded dataset with the derived columns added, taken
+    # from the memoized columns. Without rows, df is itself a few picked rows (the quantile rows)
+    # and their derived columns are computed for them alone.
+    if rows is None:
+        graph = DatasetGraph(df, memoize=False)
+        return df.assign(**{column: graph.get(column) for column in DERIVED_COLUMNS})
+    return df.iloc[rows].assign(**{column: value(df, column).iloc[rows] for column in DERIVED_COLUMNS})
+
+
+def dump():
+    # What has been evaluated so far in this process, one dict per (dataset, node): the nodes it
+    # pulled, how often it was computed and reused, and its time (total, and own, without the
+    # nodes it pulled)
+    with _lock:
+        return [dict(stats, dataset=dataset, node=name, depends_on=sorted(stats['depends_on']))
+                for (dataset, name), stats in sorted(_stats.items())]
+
+
+def dump_table():
+    rows = dump()
+    return pd.DataFrame({
+        'Dataset': [row['dataset'] for row in rows],
+        'Node': [row['node'] for row in rows],
+        'Depends on': [', '.join(row['depends_on']) for row in rows],
+        'Computed': [row['computed'] for row in rows],
+        'Reused': [row['reused'] for row in rows],
+        'Total (ms)': [round(row['total_ms'], 1) for row in rows],
+        'Own (ms)': [round(row['own_ms'], 1) for row in rows],
+        'Last (ms)': [round(row['last_ms'], 1) for row in rows],
+    })
+
+
+def reset_stats():
+    with _lock:
+        _stats.clear()
+
+
+# Computed columns, aligned with the dataset's rows
+
+@node('period_codes')
+def _period_codes(graph, granularity):
+    # Integer code of each row's period (see time_buckets.period_codes)
+    return period_codes(graph.column('date'), granularity)
+
+
+@node('Year')
+def _year(graph):
+    codes = graph.get('period_codes', 'Year')
+    return pd.Series((codes + 1970).astype('int16'), index=graph.df.index, name='Year')
+
+
+@node('Month-Year')
+def _month_year(graph):
+    # '%b %Y', categorical in chronological order
+    return pd.Series(month_year_labels(graph.get('period_codes', 'Month')), index=graph.df.index,
+                     name='Month-Year')
+
+
+@node('sort_order')
+def _sort_order(graph, column):
+    # (order, ranks) of the rows sorted by a stored column, ties in dataset order
+    values = graph.df[column]
+    if isinstance(values.dtype, pd.CategoricalDtype):
+        keys = values.cat.codes.to_numpy()  # categories are sorted, so codes sort like names
+    else:
+        keys = values.to_numpy()
+    order = np.argsort(keys, kind='stable')
+    ranks = np.empty(len(order), dtype='int64')
+    ranks[order] = np.arange(len(order))
+    return order, ranks
+
+
+# Aggregates
+
+@node('summary')
+def _summary(graph):
+    # Summary statistics (see summary_stats), the quantile rows with their derived columns
+    summary = compute_summary(graph.df, graph.schema.name_column)
+    return summary._replace(quantiles=with_derived(summary.quantiles))
+
+
+@node('period_sums')
+def _period_sums(graph, granularity):
+    # Sum of the amounts per period, in chronological order
+    return sum_by_codes(graph.get('period_codes', granularity), graph.column('amount').to_numpy(),
+                        granularity, graph.schema.amount_column)
+
+
+@node('rollup')
+def _rollup(graph):
+    # Sum per name, with that name's dates (see entity_rollup)
+    return rollup_by_entity(graph.df, graph.schema.name_column, graph.schema.date_column)
+
+
+@node('name_index')
+def _name_index(graph):
+    return NameIndex(graph.df, graph.schema.name_column, graph.schema.date_column)
+
+
+@node('top_names')
+def _top_names(graph, n):
+    # The n names with the largest total, largest first
+    return top_entities(graph.get('name_index'), n)
+
+
+@node('history')
+def _history(graph, names):
+    # Rows of the given names, in dataset order, with the derived columns
+    return with_derived(graph.df, graph.get('name_index').rows(names))
+
+
+@node('entity_chart')
+def _entity_chart(graph, names, granularity, title):
+    # Figure comparing the given names over time. Streamlit serializes the figure on every rerun,
+    # so what's memoized is the figure and what keeps the payload small is the downsampling.
+    series = period_series(graph.df, graph.get('name_index'), graph.schema.date_column, names, granularity)
+    return line_figure(series, x=PERIOD_COLUMNS[granularity], color=graph.schema.name_column, title=title)
+
+
+def evaluate_page(df, charts=True):
+    # The nodes an analysis page asks for on a rerun with its default inputs
+    graph = DatasetGraph(df)
+    graph.get('summary')
+    graph.get('rollup')
+    for granularity in ('Year', 'Month', 'Week'):
+        graph.get('period_sums', granularity)
+    names = tuple(graph.get('top_names', 5))
+    graph.get('history', names)
+    if charts:
+        graph.get('entity_chart', names, 'Month', None)
+
+
+if __name__ == "__main__":
+    # Run as a script, this file is __main__ while the analysis modules use the imported
+    # dataset_graph, so that's the one evaluated and dumped
+    import dataset_graph
+    import encasher_details_analysis
+    import purchaser_details_analysis
+
+    LOADERS = {
+        'purchaser': purchaser_details_analysis.load_data_purchaser,
+        'encasher': encasher_details_analysis.load_data_encasher,
+    }
+    parser = argparse.ArgumentParser(description='Evaluate the nodes of a dataset and print what was computed')
+    parser.add_argument('dataset', choices=SCHEMAS)
+    parser.add_argument('--csv', default=None, help='CSV to load (default: the dataset\'s CSV)')
+    parser.add_argument('--reruns', type=int, default=2, help='How many times to evaluate the page\'s nodes')
+    parser.add_argument('--no-charts', action='store_true', help='Leave out the chart node (and plotly)')
+    args = parser.parse_args()
+
+    df = LOADERS[args.dataset](args.csv or SCHEMAS[args.dataset].csv_file)
+    for rerun in range(args.reruns):
+        start = time.perf_counter()
+        dataset_graph.evaluate_page(df, charts=not args.no_charts)
+        print(f"Rerun {rerun + 1}: {(time.perf_counter() - start) * 1000:.1f} ms")
+    with pd.option_context('display.width', 200, 'display.max_columns', None):
+        print(dataset_graph.dump_table().to_string(index=False))
@@ -0,0 +1,87 @@
+# derived_cache.py
+
+import threading
+from collections import OrderedDict
+
+from profiling import cache_event
+
+# Results derived from loaded datasets (statistics, indexes, sort orders, ...), keyed by the
+# dataset version plus whatever else the result depends on. Least recently used entries are
+# dropped beyond MAX_ENTRIES. The cache is shared by every session of the app, which run in
+# threads, so it's only touched under the lock. Each page keeps a few dozen nodes of dataset_graph
+# per dataset version, so both pages and their parameters fit.
+MAX_ENTRIES = 256
+_cache = OrderedDict()
+_lock = threading.Lock()
+# Locks of the results being computed, by key
+_computing = {}
+
+
+def tag_dataset(df, version):
+    # Mark df as a loaded dataset of the given version. The frame's identity is kept along, since
+    # pandas copies attrs onto every frame derived from it (filtered, re-sorted, ...), and those
+    # must not be taken for the dataset.
+    df.attrs['version'] = version
+    df.attrs['frame_id'] = id(df)
+    return df
+
+
+def dataset_version(df):
+    # The version of a frame tagged by tag_dataset, None for anything else, copies of it included
+    if df.attrs.get('frame_id') != id(df):
+        return None
+    return df.attrs.get('version')
+
+
+def cached_for_dataset(df, key, compute):
+    # Return compute() for this dataset, computing it once per dataset version.
+    # Frames returned by load_data_* are tagged with their version (tag_dataset). Anything else,
+    # including a filtered or re-sorted copy of a loaded frame, is computed every time.
+    version = dataset_version(df)
+    if version is None:
+        return compute()
+
+    full_key = (version, len(df)) + tuple(key)
+    with _lock:
+        if full_key in _cache:
+            _cache.move_to_end(full_key)
+            cache_event(hit=True)
+            return _cache[full_key]
+        key_lock = _computing.setdefault(full_key, threading.Lock())
+
+    # Only one session computes a missing result; others asking for it meanwhile wait for it
+    # rather than computing their own copy. The global lock isn't held while computing, so
+    # lookups of other results go on.
+    with key_lock:
+        try:
+            with _lock:
+                if full_key in _cache:
+                    _cache.move_to_end(full_key)
+                    cache_event(hit=True)
+                    return _cache[full_key]
+            cache_event(hit=False)
+            result = compute()
+            with _lock:
+                _cache[full_key] = result
+                while len(_cache) > MAX_ENTRIES:
+                    _cache.popitem(last=False)
+        finally:
+            # Whether it was computed, found or failed, so failed keys don't leave a lock behind.
+            # Only our own lock: after a failure, a session that came later may have put in a new
+            # one, which sessions are waiting on.
+            with _lock:
+                if _computing.get(full_key) is key_lock:
+                    del _computing[full_key]
+    return result
+
+
+def drop_version(version):
+    # Forget everything derived from a dataset version that has been replaced
+    with _lock:
+        for key in [key for key in _cache if key[0] == version]:
+            del _cache[key]
+
+
+def clear():
+    with _lock:
+        _cache.clear()
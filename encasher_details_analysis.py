@@ -1,8 +1,11 @@
 # encasher_details_analysis.py
 
-import pandas as pd
-import streamlit as st
-import plotly.express as px
+from app_cache import shared_dataset
+from dataset_artifact import load_dataset
+from dataset_graph import SCHEMAS, value
+from entity_resolution import load_names
+from profiling import cache_event, profiled
+from time_buckets import PERIOD_COLUMNS
 
 """
 Sr No.,Date of Encashment,Name of the Political Party,Denomination
@@ -12,76 +15,71 @@ Sr No.,Date of Encashment,Name of the Political Party,Denomination
 """
 
 
-@st.cache_data
+@profiled(cached=True)
+@shared_dataset
 def load_data_encasher(file_name):
-    data = pd.read_csv(file_name)
-    data['Date of Encashment'] = pd.to_datetime(
-        data['Date of Encashment'], format='%d/%b/%Y')
-    data['Year'] = data['Date of Encashment'].dt.year
-    data['Year'] = data['Year'].apply(lambda x: int(str(x).replace(',', '')))
-    data['Month-Year'] = data['Date of Encashment'].dt.strftime('%b %Y')
-    return data
+    # Typed columnar artifact written by the cleaner (re-built from the CSV if missing or stale),
+    # with spelling variants of a name merged as listed in the dataset's names file (see
+    # entity_resolution). Year, Month-Year and every result below are nodes of dataset_graph,
+    # computed when first asked for.
+    cache_event(hit=False)  # only runs when the shared copy is missing or out of date
+    schema = SCHEMAS['encasher']
+    return load_dataset(file_name, schema.date_column, schema.name_column, names=load_names(file_name))
 
 
+@profiled()
 def analyze_encashers(df):
-    # number of unique encashers
-    unique_encashers = df['Name of the Political Party'].nunique()
-    # sum of denomination
-    total_denomination = df['Denomination'].sum()
-    # Mean, Median, Mode
-    mean = df['Denomination'].mean()
-    median = df['Denomination'].median()
-
-    # Quantiles
-    q1 = df['Denomination'].quantile(0.25)
-    q3 = df['Denomination'].quantile(0.75)
-    iqr = q3 - q1
-
-    # Quantiles over all data
-    qd = df.quantile([.25, 0.50, 0.75], method="table",
-                     interpolation="nearest", numeric_only=False)
-    # Return results
-    return unique_encashers, total_denomination, mean, median, q1, q3, iqr, qd
+    # number of unique encashers, sum of denominations, mean, median, 1st/3rd quantiles, IQR and the
+    # quantiles over all data, computed together in one pass and cached per dataset version
+    return value(df, 'summary')
 
 
+@profiled(payload=True)
 def analyze_encasher_sum(df):
-    # Convert epoch time to normal date
-    df['Date of Encashment'] = pd.to_datetime(
-        df['Date of Encashment'], unit='ms')
-
     # return sum of encashments (denomination) grouped by encasher name, along with the dates of encashment in dd/mm/yyyy as a list in the same row, sorted by latest date first
-    result = df.groupby('Name of the Political Party').agg(
-        {'Denomination': 'sum', 'Date of Encashment': lambda x: x.sort_values(ascending=False).dt.strftime('%d/%m/%Y').tolist()}).reset_index()
-    return result
+    # (vectorized: one sort by name and date, dates formatted once, and the lists sliced out per name;
+    # cached per dataset version)
+    return value(df, 'rollup')
+
+
+@profiled()
+def sum_denomination_period_encasher(df, granularity):
+    # sum of encashments (denomination) per day / week / month / quarter / year, in chronological order,
+    # cached per dataset version and granularity
+    return value(df, 'period_sums', granularity)
 
 
 def sum_denomination_year_encasher(df):
-    return df.groupby('Year')['Denomination'].sum().reset_index()
+    return sum_denomination_period_encasher(df, 'Year')
 
 
 def sum_denomination_month_encasher(df):
-    monthly_sum = df.groupby('Month-Year')['Denomination'].sum().reset_index()
-    monthly_sum['Month-Year'] = pd.to_datetime(
-        monthly_sum['Month-Year'], format='%b %Y')
-    monthly_sum.sort_values('Month-Year', inplace=True)
-    return monthly_sum
+    return sum_denomination_period_encasher(df, 'Month')
 
 
-def plot_graph_of_encashers(encashers_list):
-    # take a list of encashers, and plot a graph of their encashments over time
-    df = load_data_encasher(file_name='./02_Encasher_Details.csv')
-    st.write(encashers_list)
-    df = df[df['Name of the Political Party'].isin(encashers_list)]
-    st.dataframe(df, hide_index=True)
+@profiled()
+def encasher_name_index(df):
+    # index over the encasher names of the loaded dataset, cached per dataset version
+    return value(df, 'name_index')
 
-    # plot by month-year, sorted in descending order
-    encasher_name = df.groupby(['Month-Year', 'Name of the Political Party'])[
-        'Denomination'].sum().reset_index()
 
-    encasher_name['Month-Year'] = pd.to_datetime(
-        encasher_name['Month-Year'], format='%b %Y')
-    encasher_name.sort_values('Month-Year', inplace=True)
+@profiled(payload=True)
+def encasher_history(df, encashers_list):
+    # rows of the given encashers, in dataset order, with their Year and Month-Year
+    return value(df, 'history', tuple(encashers_list))
 
-    fig = px.line(encasher_name, x='Month-Year', y='Denomination',
-                  color='Name of the Political Party', title='Sum of Encashments (Denomination) by Month-Year', markers=True)
-    return fig
+
+@profiled()
+def top_encashers(df, n):
+    # the n encashers with the largest total denomination, largest first
+    return value(df, 'top_names', n)
+
+
+@profiled(payload=True)
+def plot_graph_of_encashers(encashers_list, granularity='Month'):
+    # take a list of encashers, and plot a graph of their encashments over time
+    df = load_data_encasher(file_name='./02_Encasher_Details.csv')
+    # sums per period of the selected encashers, downsampled to the chart's resolution (WebGL when
+    # there are many points) and cached per names, granularity and dataset version
+    return value(df, 'entity_chart', tuple(encashers_list), granularity,
+                 f'Sum of Encashments (Denomination) by {PERIOD_COLUMNS[granularity]}')
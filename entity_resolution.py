@@ -0,0 +1,301 @@
+# entity_resolution.py
+#
+# Merges the spelling variants of a purchaser or party name that PDF extraction produces (lost or
+# extra spaces, punctuation, PVT LTD / PRIVATE LIMITED, names cut off at the column width, small
+# typos) under one canonical name. The mapping is written next to the CSV, where it can be
+# reviewed and corrected, and the loaders apply it.
+#
+#   python entity_resolution.py purchaser            # writes 01_Purchaser_Details.names.json
+#   python entity_resolution.py encasher --show      # also print every merged group
+#
+# Names are compared in three stages, none of them all-pairs:
+#   1. equal keys: the name without case, punctuation, spaces or legal-suffix spelling differences
+#   2. similar keys: candidates are the names sharing a band of a MinHash signature of their
+#      character trigrams (locality-sensitive hashing), verified with a similarity ratio
+#   3. truncated names: a long key that is the start of keys of exactly one other group
+#
+# <csv stem>.names.json:
+#   mapping   variant -> canonical name, for every name that isn't its own canonical name
+#   reasons   variant -> how it was matched ('same key', 'similar 0.95', 'truncated')
+#   manual    variant -> canonical name, edited by hand; kept when the file is regenerated and
+#             applied over `mapping` (map a name to itself to undo an automatic merge)
+
+import argparse
+import difflib
+import json
+import os
+import re
+import time
+import zlib
+from collections import Counter, namedtuple
+
+import numpy as np
+import pandas as pd
+
+NAMES_FORMAT = 1
+
+# Abbreviations written out, token by token, before the spaces are dropped
+TOKEN_SPELLINGS = {'PVT': 'PRIVATE', 'LTD': 'LIMITED', 'CORP': 'CORPORATION', '&': 'AND'}
+# Glued abbreviations, wherever they are in the key ('SYNERGYDEALCOMPVTLTD-SELF A/C'); a glued
+# LTD is only written out at the end of the key
+GLUED_SPELLINGS = (('PRIVATELTD', 'PRIVATELIMITED'), ('PVTLIMITED', 'PRIVATELIMITED'),
+                   ('PVTLTD', 'PRIVATELIMITED'))
+# Legal forms at the end of a key; names of different forms are never merged by similarity
+LEGAL_FORMS = ('PRIVATELIMITED', 'LIMITED', 'LLP')
+# Honorifics in front of a person's name (and M/S, messrs, in front of a firm's), left out of the
+# key, also when no space follows their full stop ('MR.DEEPAKKHEMKA')
+HONORIFICS = re.compile(r'^(?:(?:MRS|MR|MS|SHRI|SMT)(?:\.\s*|\s+)|M/S\.?\s*)+')
+
+# Stage 2: the signature has SIGNATURE_BANDS bands of ROWS_PER_BAND hashes. Names whose trigram
+# sets have a Jaccard similarity of 0.8 share a band with probability 1 - (1 - 0.8 ** 3) ** 10,
+# over 99.9%; at 0.6 it's still about 91%, while names at 0.3 rarely (about 24%) become a pair.
+ROWS_PER_BAND = 3
+SIGNATURE_BANDS = 10
+SIGNATURE_SEED = 2019
+HASH_PRIME = (1 << 31) - 1
+# Buckets larger than this are skipped rather than compared all-pairs (very short or generic names)
+MAX_BUCKET_SIZE = 64
+# Candidates are merged at this difflib ratio of their keys (without the legal form), if both
+# are at least MIN_SIMILAR_LENGTH characters long and start with the same character and have the
+# same digits. Without a legal form the name is usually a person's or a short firm name, where one
+# letter is more often a different name (SANDEEP / SUNDEEP, SRI / SR DEVELOPERS) than a typo.
+MIN_SIMILARITY = 0.92
+MIN_SIMILARITY_WITHOUT_FORM = 0.97
+MIN_SIMILAR_LENGTH = 10
+# Stage 3: shorter keys are too likely to be the start of an unrelated name
+MIN_TRUNCATED_LENGTH = 20
+
+# The thresholds above, per dataset
+Thresholds = namedtuple('Thresholds', ['similarity', 'similarity_without_form', 'truncated_length'])
+DEFAULT_THRESHOLDS = Thresholds(MIN_SIMILARITY, MIN_SIMILARITY_WITHOUT_FORM, MIN_TRUNCATED_LENGTH)
+# Party names are a short list of registered parties, none with a legal form, so a close spelling
+# (RASTRIYA / RASHTRIYA JANTA DAL, 0.97) or a short name that starts a longer one (SHIVSENA /
+# SHIVSENA (POLITICAL PARTY)) is the same party, where among purchasers it's often another firm.
+THRESHOLDS = {
+    'purchaser': DEFAULT_THRESHOLDS,
+    'encasher': Thresholds(MIN_SIMILARITY, 0.96, 8),
+}
+
+
+def names_path(csv_path):
+    # 01_Purchaser_Details.csv -> 01_Purchaser_Details.names.json
+    return os.path.splitext(csv_path)[0] + '.names.json'
+
+
+def name_key(name):
+    # 'Megha Engineering & Infrastructures Li mited' -> 'MEGHAENGINEERINGANDINFRASTRUCTURESLIMITED'
+    text = str(name).upper()
+    text = HONORIFICS.sub('', text) or text
+    tokens = re.sub(r'[^A-Z0-9&]+', ' ', text.replace('&', ' & ')).split()
+    if len(tokens) >= 2 and tokens[-2] == 'P' and tokens[-1] in ('LTD', 'LIMITED'):
+        tokens[-2:] = ['PRIVATE', 'LIMITED']  # 'P LTD'
+    key = ''.join(TOKEN_SPELLINGS.get(token, token) for token in tokens)
+    for glued, spelling in GLUED_SPELLINGS:
+        key = key.replace(glued, spelling)
+    if key.endswith('LTD'):
+        key = key[:-len('LTD')] + 'LIMITED'
+    return key
+
+
+def split_legal_form(key):
+    # ('MEGHAENGINEERINGANDINFRASTRUCTURES', 'LIMITED')
+    for form in LEGAL_FORMS:
+        if key.endswith(form) and len(key) > len(form):
+            return key[:-len(form)], form
+    return key, ''
+
+
+def signatures(keys):
+    # MinHash signature of each key's set of character trigrams, one row per key. The trigrams
+    # of all keys are hashed once into one array, and each hash function is a single pass with
+    # np.minimum.reduceat over the keys' slices of it.
+    grams = [[key[i:i + 3] for i in range(len(key) - 2)] or [key] for key in keys]
+    lengths = np.array([len(g) for g in grams], dtype='int64')
+    hashes = np.fromiter((zlib.crc32(gram.encode()) for g in grams for gram in g),
+                         dtype='uint64', count=int(lengths.sum()))
+    starts = np.concatenate(([0], np.cumsum(lengths)[:-1]))
+
+    rng = np.random.default_rng(SIGNATURE_SEED)
+    count = ROWS_PER_BAND * SIGNATURE_BANDS
+    a = rng.integers(1, HASH_PRIME, count, dtype='uint64')
+    b = rng.integers(0, HASH_PRIME, count, dtype='uint64')
+    result = np.empty((len(keys), count), dtype='uint64')
+    for i in range(count):
+        result[:, i] = np.minimum.reduceat((a[i] * hashes + b[i]) % HASH_PRIME, starts)
+    return result
+
+
+def candidate_pairs(keys):
+    # Pairs (i, j), i < j, of keys that share at least one band of their signatures. Signatures
+    # are of the keys without their legal form, whose trigrams would otherwise make every
+    # PRIVATE LIMITED company look alike.
+    if len(keys) < 2:
+        return set()
+    rows = signatures([split_legal_form(key)[0] for key in keys])
+    pairs = set()
+    for band in range(SIGNATURE_BANDS):
+        hashes = rows[:, band * ROWS_PER_BAND:(band + 1) * ROWS_PER_BAND]
+        bucket_ids = np.unique(hashes, axis=0, return_inverse=True)[1].ravel()
+        order = np.argsort(bucket_ids, kind='stable')
+        bounds = np.flatnonzero(np.diff(bucket_ids[order], prepend=-1, append=-1))
+        for start, end in zip(bounds[:-1], bounds[1:]):
+            if 2 <= end - start <= MAX_BUCKET_SIZE:
+                members = order[start:end].tolist()
+                pairs.update((i, j) for n, i in enumerate(members) for j in members[n + 1:])
+    return pairs
+
+
+def _ratio(a, b, minimum=MIN_SIMILARITY):
+    matcher = difflib.SequenceMatcher(None, a, b, autojunk=False)
+    # The quick ratios are upper bounds of the ratio, most candidates stop there
+    if matcher.real_quick_ratio() < minimum or matcher.quick_ratio() < minimum:
+        return 0.0
+    return matcher.ratio()
+
+
+def similar(key_a, key_b, minimum=MIN_SIMILARITY):
+    # Similarity ratio of two keys, or 0 when they shouldn't be merged whatever their spelling.
+    # When the legal forms agree or one is missing, the keys also count as similar if they are
+    # without their forms. Whole keys of different forms only when they're about as long, which
+    # lets a misspelt form (LIIMTED) through but not LIMITED against PRIVATE LIMITED. Ratios
+    # below `minimum` may come out as 0.
+    core_a, form_a = split_legal_form(key_a)
+    core_b, form_b = split_legal_form(key_b)
+    if min(len(core_a), len(core_b)) < MIN_SIMILAR_LENGTH or key_a[0] != key_b[0]:
+        return 0.0
+    if re.sub(r'\D', '', key_a) != re.sub(r'\D', '', key_b):
+        return 0.0
+    if form_a and form_b and form_a != form_b:
+        return _ratio(key_a, key_b, minimum) if abs(len(key_a) - len(key_b)) <= 2 else 0.0
+    return max(_ratio(core_a, core_b, minimum), _ratio(key_a, key_b, minimum))
+
+
+def similarity_threshold(key_a, key_b, thresholds=DEFAULT_THRESHOLDS):
+    if split_legal_form(key_a)[1] or split_legal_form(key_b)[1]:
+        return thresholds.similarity
+    return thresholds.similarity_without_form
+
+
+def resolve(counts, thresholds=DEFAULT_THRESHOLDS):
+    # Canonical name of every name in `counts` (name -> number of rows), with how each variant
+    # was matched: ({variant: canonical}, {variant: reason}) for the names that get merged.
+    # The canonical name of a group is its most frequent spelling, then the longest, then the
+    # first alphabetically.
+    names = sorted(counts)
+    keys = [name_key(name) for name in names]
+    distinct = sorted(set(keys))
+    position = {key: i for i, key in enumerate(distinct)}
+
+    # Union-find over the distinct keys; stage 1 is the keys themselves
+    parent = list(range(len(distinct)))
+    reason = {}
+
+    def find(i):
+        while parent[i] != i:
+            parent[i] = parent[parent[i]]
+            i = parent[i]
+        return i
+
+    def union(i, j, why):
+        root_i, root_j = find(i), find(j)
+        if root_i != root_j:
+            parent[max(root_i, root_j)] = min(root_i, root_j)
+            # How each of the two keys was first linked to its group, for the reasons column
+            reason.setdefault(i, why)
+            reason.setdefault(j, why)
+
+    # Stage 2: similar keys, among the candidates of the signature buckets
+    minimum = min(thresholds.similarity, thresholds.similarity_without_form)
+    for i, j in candidate_pairs(distinct):
+        ratio = similar(distinct[i], distinct[j], minimum)
+        if ratio >= similarity_threshold(distinct[i], distinct[j], thresholds):
+            union(i, j, f'similar {ratio:.2f}')
+
+    # Stage 3: a key that's the start of other keys, all of them in one group. The keys are
+    # sorted, so the keys starting with a key follow it directly.
+    for i, key in enumerate(distinct):
+        if len(key) < thresholds.truncated_length:
+            continue
+        extensions = set()
+        j = i + 1
+        while j < len(distinct) and distinct[j].startswith(key):
+            extensions.add(find(j))
+            j += 1
+        if len(extensions) == 1:
+            union(i, extensions.pop(), 'truncated')
+
+    groups = {}
+    for name, key in zip(names, keys):
+        groups.setdefault(find(position[key]), []).append(name)
+    mapping, reasons = {}, {}
+    for members in groups.values():
+        canonical = min(members, key=lambda name: (-counts[name], -len(name), name))
+        for name in members:
+            if name != canonical:
+                mapping[name] = canonical
+                key = name_key(name)
+                reasons[name] = 'same key' if key == name_key(canonical) else reason[position[key]]
+    return mapping, reasons
+
+
+def load_names(csv_path):
+    # The name mapping applied to a dataset ({variant: canonical}, manual entries included), or
+    # None when the dataset has no names file
+    try:
+        with open(names_path(csv_path)) as file:
+            data = json.load(file)
+    except (OSError, ValueError):
+        return None
+    if data.get('format') != NAMES_FORMAT:
+        return None
+    mapping = dict(data.get('mapping', {}))
+    mapping.update(data.get('manual', {}))
+    return {name: canonical for name, canonical in mapping.items() if name != canonical}
+
+
+def write_names(csv_path, name_column, thresholds=DEFAULT_THRESHOLDS):
+    # Resolve the names of a cleaned CSV and write its names file, keeping the manual entries
+    counts = pd.read_csv(csv_path, usecols=[name_column], dtype=str)[name_column].value_counts()
+    mapping, reasons = resolve(Counter(counts.to_dict()), thresholds)
+    path = names_path(csv_path)
+    try:
+        with open(path) as file:
+            manual = json.load(file).get('manual', {})
+    except (OSError, ValueError):
+        manual = {}
+    data = {'format': NAMES_FORMAT, 'name_column': name_column, 'names': len(counts),
+            'mapping': mapping, 'reasons': reasons, 'manual': manual}
+    with open(path + '.tmp', 'w') as file:
+        json.dump(data, file, indent=1, sort_keys=True, ensure_ascii=False)
+    os.replace(path + '.tmp', path)
+    return path, data
+
+
+if __name__ == "__main__":
+    from dataset_graph import SCHEMAS  # only the command line needs the datasets' files and columns
+
+    parser = argparse.ArgumentParser(description='Merge spelling variants of the names in a cleaned CSV')
+    parser.add_argument('dataset', choices=SCHEMAS)
+    parser.add_argument('--csv', default=None, help='CSV to resolve (default: the dataset\'s CSV)')
+    parser.add_argument('--show', action='store_true', help='Print every merged group')
+    args = parser.parse_args()
+
+    schema = SCHEMAS[args.dataset]
+    csv_path = args.csv or schema.csv_file
+    name_column = schema.name_column
+    start = time.perf_counter()
+    path, data = write_names(csv_path, name_column, THRESHOLDS[args.dataset])
+    # Counted the way the loaders apply it, manual entries included
+    mapping = load_names(csv_path)
+    canonical_names = set(mapping.values())
+    print(f"{data['names']} names, {len(mapping)} merged into {len(canonical_names)} others, "
+          f"{data['names'] - len(mapping)} left ({len(data['manual'])} manual entries), "
+          f"in {time.perf_counter() - start:.2f} s")
+    if args.show:
+        for canonical in sorted(canonical_names):
+            print(canonical)
+            for name, target in sorted(mapping.items()):
+                if target == canonical:
+                    reason = 'manual' if name in data['manual'] else data['reasons'][name]
+                    print(f"    {name}  ({reason})")
+    print(f"Written {path}")
@@ -0,0 +1,59 @@
+# entity_rollup.py
+
+import numpy as np
+import pandas as pd
+
+
+def format_dates(dates, date_format):
+    # Format each distinct date once and map the labels back to the rows.
+    # Returns (labels per row, rank of each row's date in ascending order).
+    values = dates.to_numpy(dtype='datetime64[ns]')
+    unique_dates, ranks = np.unique(values, return_inverse=True)
+    unique_labels = pd.DatetimeIndex(unique_dates).strftime(date_format).to_numpy(dtype=object)
+    return unique_labels[ranks], ranks
+
+
+def rollup_by_entity(df, name_column, date_column, date_format='%d/%m/%Y'):
+    # Sum of denominations per name, along with that name's dates (formatted with date_format)
+    # as a list sorted latest first. Same result as
+    #   df.groupby(name_column, observed=True).agg({'Denomination': 'sum', date_column:
+    #       lambda x: x.sort_values(ascending=False).dt.strftime(date_format).tolist()}).reset_index()
+    # but with one global sort instead of a Python call per group.
+    dates = df[date_column]
+    if not pd.api.types.is_datetime64_any_dtype(dates):
+        # Dates that went through a JSON round trip come back as epoch milliseconds
+        dates = pd.to_datetime(dates, unit='ms')
+
+    names = df[name_column]
+    if isinstance(names.dtype, pd.CategoricalDtype):
+        codes = names.cat.codes.to_numpy()
+    else:
+        codes, uniques = pd.factorize(names, sort=True)
+    keep = codes >= 0  # groupby drops missing names
+    codes = codes[keep].astype('int64')
+
+    labels, ranks = format_dates(dates[keep], date_format)
+    # Missing dates sort last, like Series.sort_values
+    date_key = np.where(pd.isna(dates[keep]).to_numpy(), len(ranks) + 1, -ranks)
+    order = np.lexsort((date_key, codes))  # by name, then latest date first
+
+    # Each name's rows are now one contiguous slice, starting where the code changes
+    sorted_codes = codes[order]
+    starts = np.flatnonzero(np.diff(sorted_codes, prepend=-1))
+    group_codes = sorted_codes[starts]
+
+    denominations = df['Denomination'].to_numpy()[keep][order]
+    sums = np.add.reduceat(denominations, starts) if len(starts) else denominations[:0]
+    date_lists = [chunk.tolist() for chunk in np.split(labels[order], starts[1:])] if len(starts) else []
+
+    if isinstance(names.dtype, pd.CategoricalDtype):
+        group_names = pd.Categorical.from_codes(group_codes, dtype=names.dtype)
+    else:
+        group_names = uniques[group_codes]
+
+    return pd.DataFrame({
+        name_column: group_names,
+        'Denomination': sums,
+        date_column: date_lists,
+    })
+
@@ -1,10 +1,19 @@
 import streamlit as st
 import plotly.express as px
-import pandas as pd
 from purchaser_details_analysis import (load_data_purchaser, analyze_purchasers, analyze_purchaser_sum,
-                                        sum_denomination_year_purchaser, sum_denomination_month_purchaser, plot_graph_of_purchasers)
+                                        sum_denomination_year_purchaser, sum_denomination_month_purchaser, plot_graph_of_purchasers,
+                                        purchaser_name_index, sum_denomination_period_purchaser, purchaser_history,
+                                        top_purchasers)
 from encasher_details_analysis import (load_data_encasher, analyze_encashers, analyze_encasher_sum,
-                                       sum_denomination_year_encasher, sum_denomination_month_encasher, plot_graph_of_encashers)
+                                       sum_denomination_year_encasher, sum_denomination_month_encasher, plot_graph_of_encashers,
+                                       encasher_name_index, sum_denomination_period_encasher, encasher_history,
+                                       top_encashers)
+from chart_data import line_figure
+from paginated_table import paginated_table
+from performance_panel import display_performance, record_run
+from profiling import finish_run, record_payload, section, start_run
+from reconciliation import REDEMPTION_WINDOW_DAYS, reconcile_datasets
+from time_buckets import GRANULARITIES, PERIOD_COLUMNS
 
 
 def display_purchaser_details():
@@ -15,25 +24,27 @@ def display_purchaser_details():
     st.write("### CSV Dataset")
     st.write(
         "The dataset used for this analysis is the `01_Purchaser_Details.csv` file.")
-    pd_df = pd.read_csv('./01_Purchaser_Details.csv')
-    st.dataframe(pd_df, hide_index=True)
-    st.write("---")
     df = load_data_purchaser(
         file_name='./01_Purchaser_Details.csv')  # Load data
+    # Filtered, sorted and paged on the server, only the visible rows are sent to the browser
+    paginated_table(df, key='purchaser_table', columns=['Sr No.', 'Date of Purchase', 'Purchaser Name', 'Denomination'],
+                    name_column='Purchaser Name', date_column='Date of Purchase')
+    st.write("---")
+    stats = analyze_purchasers(df)  # All summary statistics, computed once
     st.write(
-        f"#### Number of Unique Purchasers: :blue[{analyze_purchasers(df)[0]}]")
+        f"#### Number of Unique Purchasers: :blue[{stats.unique_names}]")
     st.write(
-        f"#### Total Denomination: :red[₹ {analyze_purchasers(df)[1]}] :green[(twelve thousand one hundred fifty-five crores and fifty-one lakhs thirty-two thousand)]")
-    st.write(f"#### Mean Denomination: :orange[₹ {analyze_purchasers(df)[2]}]")
-    st.write(f"#### Median Denomination: ₹ {analyze_purchasers(df)[3]}")
+        f"#### Total Denomination: :red[₹ {stats.total_denomination}] :green[(twelve thousand one hundred fifty-five crores and fifty-one lakhs thirty-two thousand)]")
+    st.write(f"#### Mean Denomination: :orange[₹ {stats.mean}]")
+    st.write(f"#### Median Denomination: ₹ {stats.median}")
     st.write(
-        f"#### 1st Quantile of Denomination: ₹ {analyze_purchasers(df)[4]}")
+        f"#### 1st Quantile of Denomination: ₹ {stats.q1}")
     st.write(
-        f"#### 3rd Quantile of Denomination: ₹ {analyze_purchasers(df)[5]}")
+        f"#### 3rd Quantile of Denomination: ₹ {stats.q3}")
     st.write(
-        f"#### Interquantile Range of Denomination: ₹ {analyze_purchasers(df)[6]}")
+        f"#### Interquantile Range of Denomination: ₹ {stats.iqr}")
     st.write(f"#### Quantiles over all data:")
-    st.table(analyze_purchasers(df)[7])
+    st.table(stats.quantiles)
     st.write(
         f"Read more about Quartiles [here](https://stats.stackexchange.com/questions/156778/percentile-vs-quantile-vs-quartile)")
     st.write(
@@ -45,24 +56,63 @@ def display_purchaser_details():
     st.write(analyze_purchaser_sum(df))
     st.write("---")
     st.subheader('Sum of Purchases (Denomination) by Year')
-    yearly_sum = sum_denomination_year_purchaser(df)
-    fig_yearly = px.line(yearly_sum, x='Year', y='Denomination',
-                         title='Sum of Denomination per Year', markers=True)
+    with section('yearly chart'):
+        yearly_sum = sum_denomination_year_purchaser(df)
+        fig_yearly = record_payload(px.line(
+            yearly_sum, x='Year', y='Denomination',
+            title='Sum of Denomination per Year', markers=True))
     st.plotly_chart(fig_yearly)
     st.write("---")
 
     st.subheader('Sum of Purchases (Denomination) by Month-Year')
-    monthly_sum = sum_denomination_month_purchaser(df)
-    fig_monthly = px.line(monthly_sum, x='Month-Year', y='Denomination',
-                          title='Sum of Denomination per Month', markers=True)
+    with section('monthly chart'):
+        monthly_sum = sum_denomination_month_purchaser(df)
+        fig_monthly = record_payload(px.line(
+            monthly_sum, x='Month-Year', y='Denomination',
+            title='Sum of Denomination per Month', markers=True))
     st.plotly_chart(fig_monthly)
     st.write("---")
+
+    st.subheader('Sum of Purchases (Denomination) over time')
+    granularity = st.select_slider(
+        "Granularity", options=GRANULARITIES, value='Week', key='purchaser_granularity')
+    with section('period chart'):
+        period_sum = sum_denomination_period_purchaser(df, granularity)
+        # downsampled, and drawn with WebGL at fine granularities
+        fig_period = record_payload(line_figure(
+            period_sum, x=PERIOD_COLUMNS[granularity], title=f'Sum of Denomination per {granularity}'))
+    st.plotly_chart(fig_period)
+    st.write("---")
+    purchaser_index = purchaser_name_index(df)
+    purchaser_search = st.text_input(
+        "Search purchasers by the start or any part of their name", key='purchaser_search')
+    if purchaser_search:
+        suggestions = purchaser_index.complete(purchaser_search)
+        if suggestions:
+            st.code(" | ".join(suggestions), language=None)
+        else:
+            st.write("No matching purchasers found.")
     purchaser_names = st.text_input(
         "Enter names of purchasers, pipe separated (|), to view their history", "FUTURE GAMING AND HOTEL SERVICES PR | QWIKSUPPLYCHAINPRIVATELIMITED", placeholder="FUTURE GAMING AND HOTEL SERVICES PR | QWIKSUPPLYCHAINPRIVATELIMITED",
         key='purchaser_name',)
     if purchaser_names:
         purchaser_names = [x.strip() for x in purchaser_names.split('|')]
-        st.plotly_chart(plot_graph_of_purchasers(purchaser_names))
+        for name in purchaser_names:
+            if not purchaser_index.codes_for([name]):
+                suggestions = purchaser_index.complete(name, limit=3)
+                st.warning(f"No purchaser named '{name}'" +
+                           (f", did you mean: {' | '.join(suggestions)}?" if suggestions else "."))
+        st.write(purchaser_names)
+        st.dataframe(purchaser_history(df, purchaser_names), hide_index=True)
+    purchaser_top_n = st.number_input(
+        "Or compare the top N purchasers by total denomination (0 to compare the names above)",
+        min_value=0, max_value=len(purchaser_index.names), value=0, key='purchaser_top_n')
+    if purchaser_top_n:
+        purchaser_names = top_purchasers(df, purchaser_top_n)
+    if purchaser_names:
+        purchaser_granularity = st.select_slider(
+            "Granularity", options=GRANULARITIES, value='Month', key='purchaser_history_granularity')
+        st.plotly_chart(plot_graph_of_purchasers(purchaser_names, purchaser_granularity))
 
 
 def display_encasher_details():
@@ -74,24 +124,26 @@ def display_encasher_details():
     st.write("### CSV Dataset")
     st.write(
         "The dataset used for this analysis is the `02_Encasher_Details.csv` file.")
-    pd_df = pd.read_csv('./02_Encasher_Details.csv')
-    st.dataframe(pd_df, hide_index=True)
-    st.write("---")
     df = load_data_encasher(file_name='./02_Encasher_Details.csv')  # Load data
+    # Filtered, sorted and paged on the server, only the visible rows are sent to the browser
+    paginated_table(df, key='encasher_table', columns=['Sr No.', 'Date of Encashment', 'Name of the Political Party', 'Denomination'],
+                    name_column='Name of the Political Party', date_column='Date of Encashment')
+    st.write("---")
+    stats = analyze_encashers(df)  # All summary statistics, computed once
     st.write(
-        f"#### Number of Unique Encashers: :blue[{analyze_encashers(df)[0]}]")
+        f"#### Number of Unique Encashers: :blue[{stats.unique_names}]")
     st.write(
-        f"#### Total Denomination: :red[₹ {analyze_encashers(df)[1]}] :green[(twelve thousand seven hundred sixty-nine crores and eight lakhs ninety-three thousand)]")
-    st.write(f"#### Mean Denomination: :orange[₹ {analyze_encashers(df)[2]}]")
-    st.write(f"#### Median Denomination: ₹ {analyze_encashers(df)[3]}")
+        f"#### Total Denomination: :red[₹ {stats.total_denomination}] :green[(twelve thousand seven hundred sixty-nine crores and eight lakhs ninety-three thousand)]")
+    st.write(f"#### Mean Denomination: :orange[₹ {stats.mean}]")
+    st.write(f"#### Median Denomination: ₹ {stats.median}")
     st.write(
-        f"#### 1st Quantile of Denomination: ₹ {analyze_encashers(df)[4]}")
+        f"#### 1st Quantile of Denomination: ₹ {stats.q1}")
     st.write(
-        f"#### 3rd Quantile of Denomination: ₹ {analyze_encashers(df)[5]}")
+        f"#### 3rd Quantile of Denomination: ₹ {stats.q3}")
     st.write(
-        f"#### Interquantile Range of Denomination: ₹ {analyze_encashers(df)[6]}")
+        f"#### Interquantile Range of Denomination: ₹ {stats.iqr}")
     st.write(f"#### Quantiles over all data:")
-    st.table(analyze_encashers(df)[7])
+    st.table(stats.quantiles)
     st.write(
         f"Read more about Quartiles [here](https://stats.stackexchange.com/questions/156778/percentile-vs-quantile-vs-quartile)")
     st.write(
@@ -102,24 +154,103 @@ def display_encasher_details():
     st.write(analyze_encasher_sum(df))
     st.write("---")
     st.subheader('Sum of Encashments (Denomination) by Year')
-    yearly_sum = sum_denomination_year_encasher(df)
-    fig_yearly = px.line(yearly_sum, x='Year', y='Denomination',
-                         title='Sum of Denomination per Year', markers=True)
+    with section('yearly chart'):
+        yearly_sum = sum_denomination_year_encasher(df)
+        fig_yearly = record_payload(px.line(
+            yearly_sum, x='Year', y='Denomination',
+            title='Sum of Denomination per Year', markers=True))
     st.plotly_chart(fig_yearly)
     st.write("---")
 
     st.subheader('Sum of Encashments (Denomination) by Month-Year')
-    monthly_sum = sum_denomination_month_encasher(df)
-    fig_monthly = px.line(monthly_sum, x='Month-Year', y='Denomination',
-                          title='Sum of Denomination per Month', markers=True)
+    with section('monthly chart'):
+        monthly_sum = sum_denomination_month_encasher(df)
+        fig_monthly = record_payload(px.line(
+            monthly_sum, x='Month-Year', y='Denomination',
+            title='Sum of Denomination per Month', markers=True))
     st.plotly_chart(fig_monthly)
     st.write("---")
+
+    st.subheader('Sum of Encashments (Denomination) over time')
+    granularity = st.select_slider(
+        "Granularity", options=GRANULARITIES, value='Week', key='encasher_granularity')
+    with section('period chart'):
+        period_sum = sum_denomination_period_encasher(df, granularity)
+        # downsampled, and drawn with WebGL at fine granularities
+        fig_period = record_payload(line_figure(
+            period_sum, x=PERIOD_COLUMNS[granularity], title=f'Sum of Denomination per {granularity}'))
+    st.plotly_chart(fig_period)
+    st.write("---")
+    encasher_index = encasher_name_index(df)
+    encasher_search = st.text_input(
+        "Search encashers by the start or any part of their name", key='encasher_search')
+    if encasher_search:
+        suggestions = encasher_index.complete(encasher_search)
+        if suggestions:
+            st.code(" | ".join(suggestions), language=None)
+        else:
+            st.write("No matching encashers found.")
     encasher_names = st.text_input(
         "Enter names of encashers, pipe separated(|), to view their history", "JAMMU AND KASHMIR NATIONAL CONFERENCE | JHARKHAND MUKTI MORCHA", placeholder="BHARTIYA JANTA PARTY | PRESIDENT, ALL INDIA CONGRESS COMMITTEE",
         key='encasher_name',)
     if encasher_names:
         encasher_names = [x.strip() for x in encasher_names.split('|')]
-        st.plotly_chart(plot_graph_of_encashers(encasher_names))
+        for name in encasher_names:
+            if not encasher_index.codes_for([name]):
+                suggestions = encasher_index.complete(name, limit=3)
+                st.warning(f"No encasher named '{name}'" +
+                           (f", did you mean: {' | '.join(suggestions)}?" if suggestions else "."))
+        st.write(encasher_names)
+        st.dataframe(encasher_history(df, encasher_names), hide_index=True)
+    encasher_top_n = st.number_input(
+        "Or compare the top N encashers by total denomination (0 to compare the names above)",
+        min_value=0, max_value=len(encasher_index.names), value=0, key='encasher_top_n')
+    if encasher_top_n:
+        encasher_names = top_encashers(df, encasher_top_n)
+    if encasher_names:
+        encasher_granularity = st.select_slider(
+            "Granularity", options=GRANULARITIES, value='Month', key='encasher_history_granularity')
+        st.plotly_chart(plot_graph_of_encashers(encasher_names, encasher_granularity))
+
+
+def display_reconciliation():
+    st.write("## Purchase to Encashment Reconciliation")
+    st.write(
+        "This section matches purchased bonds to encashed bonds of the same denomination, encashed within the redemption window of their purchase.")
+    st.write(
+        "The data has no bond numbers, so this is one consistent matching (the oldest redeemable bond is encashed first), not the actual trail of each bond. "
+        ":orange[Mean candidates] is the number of bonds on the other side that could have been matched with each bond, on average, and "
+        ":orange[Unambiguous] is the matched amount that had exactly one possible counterpart.")
+    st.write("---")
+    purchases = load_data_purchaser(file_name='./01_Purchaser_Details.csv')
+    encashments = load_data_encasher(file_name='./02_Encasher_Details.csv')
+    window = st.slider("Redemption window (days)", min_value=1, max_value=30,
+                       value=REDEMPTION_WINDOW_DAYS, key='reconciliation_window')
+    with section('reconciliation'):
+        result = reconcile_datasets(purchases, encashments, window)  # cached per dataset version
+    totals = result.totals.iloc[0]
+    st.write(f"#### Matched Denomination: :green[₹ {totals['Matched']}] ({totals['Matched bonds']} bonds)")
+    st.write(f"#### Encashed but not matched to a purchase: :red[₹ {totals['Unmatched encashments']}]")
+    st.write(f"#### Purchased but not matched to an encashment: :orange[₹ {totals['Unmatched purchases']}]")
+    st.write("---")
+
+    st.subheader('Matched and unmatched encashments by party')
+    with section('reconciliation chart'):
+        top_parties = result.by_party.head(15).melt(
+            id_vars='Name of the Political Party', value_vars=['Matched', 'Unmatched'],
+            var_name='Status', value_name='Denomination')
+        fig_parties = record_payload(px.bar(
+            top_parties, x='Denomination', y='Name of the Political Party', color='Status',
+            orientation='h', title='Encashed Denomination per Party (largest 15)'))
+        fig_parties.update_yaxes(autorange='reversed')
+    st.plotly_chart(fig_parties)
+    st.dataframe(result.by_party, hide_index=True)
+    st.write("---")
+    st.subheader('Matched and unmatched purchases by purchaser')
+    st.dataframe(result.by_purchaser, hide_index=True)
+    st.write("---")
+    st.subheader('Largest matched flows from purchasers to parties')
+    st.dataframe(result.flows.head(100), hide_index=True)
 
 
 def display_about():
@@ -165,19 +296,35 @@ def main():
     st.set_page_config(page_title="Electoral Bonds Analysis",
                        page_icon=":bar_chart:", layout="wide")
 
+    # Opt-in profiling: times every rerun of the other pages and adds the Performance page
+    profiling = st.sidebar.toggle("Performance profiling", key='profiling')
+    track_memory = profiling and st.sidebar.toggle(
+        "Track memory allocations (slower)", key='profiling_track_memory')
+
     # Sidebar for analysis selection
     analysis_option = st.sidebar.radio(
         'Navigation',
-        ('About', 'Purchaser Details Analysis', 'Encasher Details Analysis')
+        ('About', 'Purchaser Details Analysis', 'Encasher Details Analysis', 'Reconciliation') +
+        (('Performance',) if profiling else ())
     )
+    if analysis_option == 'Performance':
+        display_performance()
+        return
 
-    # Conditional display based on sidebar selection
-    if analysis_option == 'About':
-        display_about()
-    elif analysis_option == 'Purchaser Details Analysis':
-        display_purchaser_details()
-    elif analysis_option == 'Encasher Details Analysis':
-        display_encasher_details()
+    run = start_run(analysis_option, track_memory=track_memory) if profiling else None
+    try:
+        # Conditional display based on sidebar selection
+        if analysis_option == 'About':
+            display_about()
+        elif analysis_option == 'Purchaser Details Analysis':
+            display_purchaser_details()
+        elif analysis_option == 'Encasher Details Analysis':
+            display_encasher_details()
+        elif analysis_option == 'Reconciliation':
+            display_reconciliation()
+    finally:
+        if run is not None:
+            record_run(finish_run(run))
 
 
 if __name__ == "__main__":
@@ -0,0 +1,142 @@
+# name_index.py
+
+import bisect
+from collections import defaultdict
+
+import numpy as np
+import pandas as pd
+
+from time_buckets import period_codes, period_labels
+
+
+def normalize_name(name):
+    # Case and spacing don't distinguish two names: ' Future  gaming ' -> 'FUTURE GAMING'
+    return ' '.join(str(name).upper().split())
+
+
+def trigrams(text):
+    return {text[i:i + 3] for i in range(len(text) - 2)}
+
+
+class NameIndex:
+    # Lookup structure over one dataset's name column, built once per dataset version (the
+    # 'name_index' node of dataset_graph):
+    #   - the rows of every name, as one array sorted by name plus per-name offsets into it
+    #   - every name's monthly denomination sums, laid out the same way
+    #   - sorted normalized names (prefix search) and trigram postings (substring search)
+
+    def __init__(self, df, name_column, date_column):
+        self.name_column = name_column
+
+        names = df[name_column]
+        if isinstance(names.dtype, pd.CategoricalDtype):
+            codes = names.cat.codes.to_numpy().astype('int64')
+            self.names = list(names.cat.categories)
+        else:
+            codes, uniques = pd.factorize(names, sort=True)
+            self.names = list(uniques)
+        num_names = len(self.names)
+
+        # Row offsets grouped by name: rows of name i are row_order[row_starts[i]:row_starts[i + 1]]
+        valid = codes >= 0
+        self.row_order = np.flatnonzero(valid)[np.argsort(codes[valid], kind='stable')]
+        self.row_starts = np.concatenate(
+            ([0], np.cumsum(np.bincount(codes[valid], minlength=num_names))))
+
+        # Monthly sums grouped by name, as (month code, sum) pairs in chronological order
+        month_codes = period_codes(df[date_column].to_numpy()[self.row_order], 'Month')
+        sorted_codes = codes[self.row_order]
+        order = np.lexsort((month_codes, sorted_codes))
+        keys = np.stack((sorted_codes[order], month_codes[order]))
+        starts = np.flatnonzero(np.any(np.diff(keys, axis=1, prepend=-1), axis=0)) if len(order) else order
+        denominations = df['Denomination'].to_numpy()[self.row_order][order]
+        self.month_names = keys[0, starts]
+        self.month_codes = keys[1, starts]
+        self.month_sums = np.add.reduceat(denominations, starts) if len(starts) else denominations[:0]
+        self.month_starts = np.searchsorted(self.month_names, np.arange(num_names + 1))
+
+        # Normalized name -> codes of the names that normalize to it
+        self.by_normalized = defaultdict(list)
+        for code, name in enumerate(self.names):
+            self.by_normalized[normalize_name(name)].append(code)
+        self.sorted_normalized = sorted(self.by_normalized)
+
+        # Trigram -> positions in sorted_normalized of the names containing it
+        self.trigram_postings = defaultdict(list)
+        for position, name in enumerate(self.sorted_normalized):
+            for gram in trigrams(name):
+                self.trigram_postings[gram].append(position)
+
+    def codes_for(self, names):
+        # Codes of the given names, matched after normalization, without duplicates
+        codes = []
+        for name in names:
+            for code in self.by_normalized.get(normalize_name(name), ()):
+                if code not in codes:
+                    codes.append(code)
+        return codes
+
+    def rows(self, names):
+        # Row positions of the given names, in dataset order
+        return self.rows_for_codes(self.codes_for(names))
+
+    def rows_for_codes(self, codes):
+        slices = [self.row_order[self.row_starts[code]:self.row_starts[code + 1]] for code in codes]
+        return np.sort(np.concatenate(slices)) if slices else np.array([], dtype='int64')
+
+    def monthly(self, names):
+        # Monthly denomination sums of the given names, columns ['Month-Year', name_column,
+        # 'Denomination'], with Month-Year as the first day of the month, in chronological order
+        codes = sorted(self.codes_for(names))
+        slices = [slice(self.month_starts[code], self.month_starts[code + 1]) for code in codes]
+        month_codes = np.concatenate([self.month_codes[s] for s in slices] or [np.array([], dtype='int64')])
+        name_codes = np.concatenate([self.month_names[s] for s in slices] or [np.array([], dtype='int64')])
+        sums = np.concatenate([self.month_sums[s] for s in slices] or [np.array([], dtype='int64')])
+
+        order = np.argsort(month_codes, kind='stable')
+        month_codes = month_codes[order]
+        return pd.DataFrame({
+            'Month-Year': period_labels(month_codes, 'Month'),
+            self.name_column: [self.names[code] for code in name_codes[order]],
+            'Denomination': sums[order],
+        })
+
+    def _substring_candidates(self, query):
+        # Normalized names that may contain `query`, in sorted order
+        if len(query) < 3:
+            return self.sorted_normalized
+        # Only names holding every trigram of the query can contain it
+        postings = sorted((self.trigram_postings.get(gram, []) for gram in trigrams(query)), key=len)
+        candidates = set(postings[0]).intersection(*postings[1:])
+        return [self.sorted_normalized[position] for position in sorted(candidates)]
+
+    def codes_containing(self, text):
+        # Codes of every name that contains `text`, after normalization
+        query = normalize_name(text)
+        return [code for name in self._substring_candidates(query) if query in name
+                for code in self.by_normalized[name]]
+
+    def complete(self, text, limit=10):
+        # Names starting with `text`, followed by names containing it, normalized and without repeats
+        query = normalize_name(text)
+        if not query:
+            return []
+
+        matches = []
+        # Names sharing the prefix sit next to each other in sorted order
+        position = bisect.bisect_left(self.sorted_normalized, query)
+        while (position < len(self.sorted_normalized) and len(matches) < limit
+               and self.sorted_normalized[position].startswith(query)):
+            matches.append(self.sorted_normalized[position])
+            position += 1
+
+        if len(matches) < limit:
+            for name in self._substring_candidates(query):
+                if query in name and not name.startswith(query):
+                    matches.append(name)
+                    if len(matches) >= limit:
+                        break
+
+        # Return the names as they appear in the dataset
+        return [self.names[self.by_normalized[name][0]] for name in matches]
+
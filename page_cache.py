@@ -0,0 +1,189 @@
+# page_cache.py
+
+import hashlib
+import io
+import json
+import os
+import sqlite3
+import time
+
+import PyPDF2
+from PyPDF2.generic import ArrayObject, DictionaryObject, IndirectObject, StreamObject
+
+from record_tokenizer import PageTokens
+
+# Bump when extraction, tokenization or the fingerprint changes, so entries written by older code
+# are ignored
+CACHE_FORMAT = 2
+
+DEFAULT_CACHE_DIR = '.page_cache'
+DEFAULT_MAX_BYTES = 100 * 1024 * 1024  # 100 MB
+
+
+def page_fingerprint(page):
+    # Hash of what the extracted text depends on: the page's content stream(s), the encodings and
+    # ToUnicode maps of its fonts (the same glyph codes can map to different text per font), and
+    # the form XObjects it draws, which extract_text reads like content streams. Only content is
+    # hashed, never object identities, so a page has the same fingerprint in every process.
+    digest = hashlib.sha256(
+        f'{CACHE_FORMAT}:{PyPDF2.__version__}'.encode())
+
+    contents = page.get('/Contents')
+    if contents is not None:
+        contents = contents.get_object()
+        streams = contents if isinstance(contents, ArrayObject) else [contents]
+        for stream in streams:
+            digest.update(stream.get_object().get_data())
+
+    _digest_resources(digest, page.get('/Resources'), set())
+    return digest.hexdigest()
+
+
+def _write_canonical(out, obj, path=()):
+    # Write a PDF object to `out` with its indirect references replaced by what they point to, so
+    # the bytes depend on the content alone. str() won't do: an IndirectObject's repr includes the
+    # id() of its reader, which differs between processes. `path` holds the references being
+    # written, so a reference back to one of them is written as the reference.
+    if isinstance(obj, IndirectObject):
+        key = (obj.idnum, obj.generation)
+        if key in path:
+            out.write(f'{key[0]} {key[1]} R '.encode())
+            return
+        path += (key,)
+        obj = obj.get_object()
+    if isinstance(obj, DictionaryObject):
+        out.write(b'<< ')
+        for key in sorted(obj):
+            key.write_to_stream(out, None)
+            out.write(b' ')
+            _write_canonical(out, obj[key], path)
+        out.write(b'>> ')
+        if isinstance(obj, StreamObject):
+            data = obj.get_data()
+            out.write(f'stream {len(data)} '.encode() + data)
+    elif isinstance(obj, ArrayObject):
+        out.write(b'[ ')
+        for item in obj:
+            _write_canonical(out, item, path)
+        out.write(b'] ')
+    elif obj is not None:
+        obj.write_to_stream(out, None)
+        out.write(b' ')
+
+
+def _canonical(obj):
+    out = io.BytesIO()
+    _write_canonical(out, obj)
+    return out.getvalue()
+
+
+def _resource_dict(resources, key):
+    # A sub-dictionary of a /Resources dictionary (fonts, XObjects), empty when it has none
+    value = resources.get(key, {})
+    return value.get_object() if hasattr(value, 'get_object') else value
+
+
+def _digest_resources(digest, resources, seen):
+    # Add the fonts and the form XObjects of a /Resources dictionary to the digest. Forms have
+    # resources of their own, including more forms; `seen` holds the ones already added, so a
+    # form drawn twice (or drawing itself) is hashed once.
+    if resources is None:
+        return
+    resources = resources.get_object()
+
+    fonts = _resource_dict(resources, '/Font')
+    for name in sorted(fonts):
+        font = fonts[name].get_object()
+        digest.update(name.encode())
+        digest.update(_canonical(font.get('/Encoding')))
+        to_unicode = font.get('/ToUnicode')
+        if to_unicode is not None:
+            digest.update(to_unicode.get_object().get_data())
+
+    xobjects = _resource_dict(resources, '/XObject')
+    for name in sorted(xobjects):
+        reference = xobjects[name]
+        xobject = reference.get_object()
+        # Images have no text, only forms are read by extract_text
+        if xobject.get('/Subtype') != '/Form':
+            continue
+        key = getattr(reference, 'idnum', None) or id(xobject)
+        digest.update(name.encode())
+        if key in seen:
+            continue
+        seen.add(key)
+        digest.update(xobject.get_data())
+        _digest_resources(digest, xobject.get('/Resources'), seen)
+
+
+class PageCache:
+    # On-disk cache of extracted page text and parsed records, keyed by page_fingerprint.
+    # Least recently used entries are evicted once the stored size goes over max_bytes.
+
+    def __init__(self, cache_dir=DEFAULT_CACHE_DIR, max_bytes=DEFAULT_MAX_BYTES):
+        os.makedirs(cache_dir, exist_ok=True)
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._db = sqlite3.connect(os.path.join(cache_dir, 'pages.sqlite'))
+        self._db.execute(
+            'CREATE TABLE IF NOT EXISTS pages ('
+            'key TEXT PRIMARY KEY, text TEXT, tokens TEXT, size INTEGER, last_used REAL)')
+        self._size = self._db.execute(
+            'SELECT COALESCE(SUM(size), 0) FROM pages').fetchone()[0]
+
+    def __contains__(self, key):
+        # Presence check that doesn't count towards the hit/miss stats
+        return self._db.execute(
+            'SELECT 1 FROM pages WHERE key = ?', (key,)).fetchone() is not None
+
+    def get(self, key):
+        # Return (text, PageTokens) for a fingerprint, or None on a miss
+        row = self._db.execute(
+            'SELECT text, tokens FROM pages WHERE key = ?', (key,)).fetchone()
+        if row is None:
+            self.misses += 1
+            return None
+        self.hits += 1
+        self._db.execute(
+            'UPDATE pages SET last_used = ? WHERE key = ?', (time.time(), key))
+        records, date_count, denomination_count = json.loads(row[1])
+        return row[0], PageTokens([tuple(record) for record in records], date_count, denomination_count)
+
+    def put(self, key, text, tokens):
+        encoded = json.dumps([tokens.records, tokens.date_count, tokens.denomination_count])
+        size = len(text.encode()) + len(encoded.encode())
+        old = self._db.execute('SELECT size FROM pages WHERE key = ?', (key,)).fetchone()
+        self._size += size - (old[0] if old else 0)
+        self._db.execute('INSERT OR REPLACE INTO pages VALUES (?, ?, ?, ?, ?)',
+                         (key, text, encoded, size, time.time()))
+        self._evict()
+        # Commit per page so an interrupted run keeps what it already extracted
+        self._db.commit()
+
+    def _evict(self):
+        if self._size <= self.max_bytes:
+            return
+        # Drop the least recently used pages until the cache fits again
+        for key, size in self._db.execute(
+                'SELECT key, size FROM pages ORDER BY last_used').fetchall():
+            self._db.execute('DELETE FROM pages WHERE key = ?', (key,))
+            self.evictions += 1
+            self._size -= size
+            if self._size <= self.max_bytes:
+                break
+
+    def size_bytes(self):
+        return self._size
+
+    def __len__(self):
+        return self._db.execute('SELECT COUNT(*) FROM pages').fetchone()[0]
+
+    def stats(self):
+        return {'hits': self.hits, 'misses': self.misses, 'evictions': self.evictions,
+                'entries': len(self), 'size_bytes': self.size_bytes()}
+
+    def close(self):
+        self._db.commit()
+        self._db.close()
@@ -0,0 +1,61 @@
+# paginated_table.py
+
+import math
+
+import numpy as np
+import streamlit as st
+
+from dataset_graph import value
+from profiling import profiled, record_payload
+
+PAGE_SIZES = (25, 50, 100, 250)
+
+
+def filter_rows(df, name_filter):
+    # Positions of the rows whose name contains name_filter (None when there is no filter),
+    # looked up in the dataset's name index instead of scanning the frame
+    if not name_filter.strip():
+        return None
+    index = value(df, 'name_index')
+    return index.rows_for_codes(index.codes_containing(name_filter))
+
+
+def select_page(df, rows, sort_column, descending=False, page=1, page_size=50):
+    # One page of the (optionally filtered) rows in sorted order. With no filter this only
+    # slices the sort order, computed once per dataset version and column, so the cost doesn't
+    # grow with the dataset.
+    order, ranks = value(df, 'sort_order', sort_column)
+    if rows is None:
+        rows = order
+    else:
+        rows = rows[np.argsort(ranks[rows])]
+    if descending:
+        rows = rows[::-1]
+    start = (page - 1) * page_size
+    return df.iloc[rows[start:start + page_size]]
+
+
+@profiled()
+def paginated_table(df, key, columns, name_column, date_column, date_format='%d/%b/%Y'):
+    # Table of the loaded dataset in which filtering, sorting and paging happen on the server,
+    # so only the visible page is sent to the browser on each rerun
+    filter_col, sort_col, order_col, size_col = st.columns([3, 2, 1, 1])
+    name_filter = filter_col.text_input(
+        f"Filter by {name_column}", key=f'{key}_filter', placeholder="Any part of the name")
+    sort_column = sort_col.selectbox("Sort by", columns, key=f'{key}_sort')
+    descending = order_col.toggle("Descending", key=f'{key}_descending')
+    page_size = size_col.selectbox("Rows per page", PAGE_SIZES, index=1, key=f'{key}_page_size')
+
+    rows = filter_rows(df, name_filter)
+    total = len(df) if rows is None else len(rows)
+    num_pages = max(1, math.ceil(total / page_size))
+    page = st.number_input(f"Page (of {num_pages})", min_value=1, max_value=num_pages,
+                           value=1, step=1, key=f'{key}_page')
+    page = min(page, num_pages)
+
+    page_rows = select_page(df, rows, sort_column, descending, page, page_size)[columns].copy()
+    # Show dates the way the CSV has them; only the rows on this page are formatted
+    page_rows[date_column] = page_rows[date_column].dt.strftime(date_format)
+    st.dataframe(record_payload(page_rows), hide_index=True, use_container_width=True)
+    first = (page - 1) * page_size
+    st.caption(f"Rows {min(first + 1, total)}–{min(first + page_size, total)} of {total}")
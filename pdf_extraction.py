@@ -0,0 +1,164 @@
+# pdf_extraction.py
+
+import os
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+
+import PyPDF2
+
+from page_cache import page_fingerprint
+from record_tokenizer import tokenize_page
+
+# Number of page batches handed to each worker; more batches than workers keeps
+# the pool busy when some pages take longer to extract than others
+RANGES_PER_WORKER = 4
+# Upper bound on the pages in one batch, so very large PDFs are split into more batches
+# instead of bigger ones
+MAX_PAGES_PER_BATCH = 64
+# Batches submitted to the pool ahead of the one being consumed, per worker. Extraction can
+# only run this far ahead of the caller, which keeps memory bounded for large PDFs.
+BATCHES_IN_FLIGHT_PER_WORKER = 2
+
+
+def count_pages(pdf_path):
+    with open(pdf_path, 'rb') as file:
+        return len(PyPDF2.PdfReader(file).pages)
+
+
+def extract_page_range(pdf_path, start, stop):
+    # Each worker opens its own reader, PdfReader objects can't be shared across processes
+    with open(pdf_path, 'rb') as file:
+        reader = PyPDF2.PdfReader(file)
+        return [reader.pages[i].extract_text() for i in range(start, stop)]
+
+
+def iter_extract_and_tokenize(pdf_path, page_numbers):
+    # Yield (text, PageTokens) for each of the given pages, one page at a time
+    with open(pdf_path, 'rb') as file:
+        reader = PyPDF2.PdfReader(file)
+        for i in page_numbers:
+            text = reader.pages[i].extract_text()
+            yield text, tokenize_page(text)
+
+
+def extract_and_tokenize_pages(pdf_path, page_numbers):
+    # Worker side of extract_pages: (text, PageTokens) for each of the given pages
+    return list(iter_extract_and_tokenize(pdf_path, page_numbers))
+
+
+def split_page_ranges(num_pages, workers):
+    # Split [0, num_pages) into contiguous (start, stop) ranges, in page order
+    num_ranges = max(workers * RANGES_PER_WORKER, -(-num_pages // MAX_PAGES_PER_BATCH))
+    num_ranges = max(1, min(num_pages, num_ranges))
+    size, extra = divmod(num_pages, num_ranges)
+    ranges = []
+    start = 0
+    for i in range(num_ranges):
+        stop = start + size + (1 if i < extra else 0)
+        ranges.append((start, stop))
+        start = stop
+    return ranges
+
+
+def resolve_workers(workers):
+    # None means one worker per core
+    if workers is None:
+        workers = os.cpu_count() or 1
+    return workers
+
+
+def _map_in_order(executor, func, workers, *iterables):
+    # Like executor.map, but only keeps a few batches in flight instead of submitting them all
+    pending = deque()
+    for args in zip(*iterables):
+        if len(pending) >= workers * BATCHES_IN_FLIGHT_PER_WORKER:
+            yield pending.popleft().result()
+        pending.append(executor.submit(func, *args))
+    while pending:
+        yield pending.popleft().result()
+
+
+def extract_page_texts(pdf_path, workers=None):
+    # Yield the text of every page in page order.
+    # workers=None uses all cores, workers=1 extracts serially in this process.
+    workers = resolve_workers(workers)
+
+    if workers <= 1:
+        with open(pdf_path, 'rb') as file:
+            reader = PyPDF2.PdfReader(file)
+            for page in reader.pages:
+                yield page.extract_text()
+        return
+
+    ranges = split_page_ranges(count_pages(pdf_path), workers)
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        # Results are returned in submission order, so pages come back in order
+        results = _map_in_order(executor, extract_page_range, workers,
+                                [pdf_path] * len(ranges),
+                                [start for start, _ in ranges],
+                                [stop for _, stop in ranges])
+        for texts in results:
+            yield from texts
+
+
+def _extract_missing(pdf_path, page_numbers, workers):
+    # Yield (text, PageTokens) for the given pages, in the order given
+    if workers <= 1 or len(page_numbers) <= 1:
+        yield from iter_extract_and_tokenize(pdf_path, page_numbers)
+        return
+
+    batches = [page_numbers[start:stop]
+               for start, stop in split_page_ranges(len(page_numbers), workers)]
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        for results in _map_in_order(executor, extract_and_tokenize_pages, workers,
+                                     [pdf_path] * len(batches), batches):
+            yield from results
+
+
+def extract_selected_pages(pdf_path, page_numbers, workers=None):
+    # Yield (text, PageTokens) for the given pages only, in the order given, extracted in
+    # parallel like the other functions here
+    yield from _extract_missing(pdf_path, list(page_numbers), resolve_workers(workers))
+
+
+def page_fingerprints(pdf_path):
+    # page_fingerprint of every page, in page order, without extracting any text
+    with open(pdf_path, 'rb') as file:
+        return [page_fingerprint(page) for page in PyPDF2.PdfReader(file).pages]
+
+
+def extract_pages(pdf_path, workers=None, cache=None, start=0):
+    # Yield (text, PageTokens) for every page from `start` onwards, in page order.
+    # With a PageCache, pages whose content hasn't changed since an earlier run are read from
+    # the cache and only the remaining pages are extracted (in parallel, like extract_page_texts).
+    workers = resolve_workers(workers)
+
+    if cache is None:
+        yield from _extract_missing(pdf_path, list(range(start, count_pages(pdf_path))), workers)
+        return
+
+    keys = page_fingerprints(pdf_path)[start:]
+
+    # Extract each page that isn't cached yet, once per distinct fingerprint
+    missing = []
+    scheduled = set()
+    for i, key in enumerate(keys, start):
+        if key not in scheduled and key not in cache:
+            missing.append(i)
+            scheduled.add(key)
+
+    extracted = _extract_missing(pdf_path, missing, workers)
+    for i, key in enumerate(keys, start):
+        if key in scheduled:
+            # Pages are extracted in page order, so the next result belongs to this page
+            scheduled.discard(key)
+            cache.misses += 1
+            entry = next(extracted)
+            cache.put(key, *entry)
+        else:
+            entry = cache.get(key)
+            if entry is None:
+                # Evicted since the scan above (tiny size cap), extract it here instead
+                entry = extract_and_tokenize_pages(pdf_path, [i])[0]
+                cache.put(key, *entry)
+        yield entry
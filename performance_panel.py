@@ -0,0 +1,87 @@
+# performance_panel.py
+
+import json
+from collections import deque
+
+import pandas as pd
+import plotly.express as px
+import streamlit as st
+
+from dataset_graph import dump_table
+from profiling import MAX_RUNS
+
+RUNS_KEY = 'performance_runs'
+
+
+def record_run(run):
+    # Keep the profile of a finished rerun, the last MAX_RUNS per session
+    if RUNS_KEY not in st.session_state:
+        st.session_state[RUNS_KEY] = deque(maxlen=MAX_RUNS)
+    st.session_state[RUNS_KEY].append(run)
+
+
+def runs_table(runs):
+    return pd.DataFrame({
+        'Started': [run['started'] for run in runs],
+        'Page': [run['page'] for run in runs],
+        'Wall time (ms)': [round(run['wall_ms'], 1) for run in runs],
+        'Cache hits': [run['cache_hits'] for run in runs],
+        'Cache misses': [run['cache_misses'] for run in runs],
+        'Payload (KB)': [round(run['payload_bytes'] / 1024, 1) for run in runs],
+    })
+
+
+def sections_table(run):
+    sections = run['sections']
+    table = pd.DataFrame({
+        # Nested sections are indented (em spaces) under the section that called them
+        'Section': ['\u2003' * s['depth'] + s['name'] for s in sections],
+        'Wall time (ms)': [round(s['wall_ms'], 1) for s in sections],
+        'Cache hits': [s['cache_hits'] for s in sections],
+        'Cache misses': [s['cache_misses'] for s in sections],
+        'Payload (KB)': [round(s['payload_bytes'] / 1024, 1) for s in sections],
+    })
+    if run['track_memory']:
+        table['Peak allocated (KB)'] = [round((s['peak_alloc_bytes'] or 0) / 1024, 1) for s in sections]
+    return table
+
+
+def display_performance():
+    st.write("## Performance")
+    st.write(
+        "Timings of the loaders, analysis functions and chart builders for the last reruns of the analysis "
+        "pages in this session. Payload is the approximate size of the tables and charts sent to the browser.")
+    runs = list(st.session_state.get(RUNS_KEY, ()))
+    if not runs:
+        st.info("Open one of the analysis pages to record a rerun.")
+        return
+
+    st.write("### Reruns")
+    st.dataframe(runs_table(runs), hide_index=True, use_container_width=True)
+
+    st.write("### Sections")
+    labels = [f"{i + 1}. {run['started']} {run['page']} ({run['wall_ms']:.0f} ms)" for i, run in enumerate(runs)]
+    selected = st.selectbox("Rerun", range(len(runs)), index=len(runs) - 1,
+                            format_func=lambda i: labels[i], key='performance_rerun')
+    run = runs[selected]
+    st.dataframe(sections_table(run), hide_index=True, use_container_width=True)
+
+    top_level = [s for s in run['sections'] if s['depth'] == 0]
+    if top_level:
+        fig = px.bar(pd.DataFrame({'Section': [s['name'] for s in top_level],
+                                   'Wall time (ms)': [s['wall_ms'] for s in top_level]}),
+                     x='Wall time (ms)', y='Section', orientation='h', title='Wall time per section')
+        fig.update_yaxes(autorange='reversed')
+        st.plotly_chart(fig)
+
+    st.write("### Dataset graph")
+    st.write(
+        "Every column and result derived from the datasets, with the nodes it was computed from, since the app "
+        "started (all sessions). A node is computed once per dataset version, and reused by every rerun after that.")
+    st.dataframe(dump_table(), hide_index=True, use_container_width=True)
+
+    st.write("### Export")
+    count = st.number_input("Reruns to export", min_value=1, max_value=len(runs), value=len(runs),
+                            key='performance_export_count')
+    st.download_button("Download JSON", json.dumps(runs[-count:], indent=2),
+                       file_name='performance_runs.json', mime='application/json')
@@ -0,0 +1,152 @@
+# profiling.py
+
+import functools
+import threading
+import time
+import tracemalloc
+from contextlib import contextmanager
+
+import pyarrow as pa
+
+# Per-rerun timings of the app's loaders, analysis functions and chart builders. Nothing is
+# recorded unless a run is started with start_run(), so the instrumentation costs one
+# attribute lookup per call when profiling is off.
+#
+# A run is a list of sections. Each section has its wall time, its nesting depth, the cache hits
+# and misses reported while it was the innermost section, the size of the payload it produced
+# for the browser, and, when memory tracking is on, the peak memory it allocated.
+
+MAX_RUNS = 20
+
+# Streamlit runs every session's script in its own thread
+_local = threading.local()
+
+
+def _active():
+    return getattr(_local, 'run', None)
+
+
+def start_run(page, track_memory=False):
+    run = {
+        'page': page,
+        'started': time.strftime('%Y-%m-%dT%H:%M:%S'),
+        'track_memory': track_memory,
+        'sections': [],
+        '_start': time.perf_counter(),
+        '_stack': [],
+        '_started_tracing': False,
+    }
+    if track_memory and not tracemalloc.is_tracing():
+        tracemalloc.start()
+        run['_started_tracing'] = True
+    _local.run = run
+    return run
+
+
+def finish_run(run):
+    # Stop recording and return the run without its bookkeeping fields
+    _local.run = None
+    if run['_started_tracing']:
+        tracemalloc.stop()
+    sections = run['sections']
+    return {
+        'page': run['page'],
+        'started': run['started'],
+        'track_memory': run['track_memory'],
+        'wall_ms': (time.perf_counter() - run['_start']) * 1000,
+        'cache_hits': sum(s['cache_hits'] for s in sections),
+        'cache_misses': sum(s['cache_misses'] for s in sections),
+        'payload_bytes': sum(s['payload_bytes'] for s in sections),
+        'sections': sections,
+    }
+
+
+@contextmanager
+def section(name, cached=False):
+    # Time the enclosed block as one section of the current run. With cached=True the block is a
+    # call into a cache: it counts as a hit unless a miss is reported inside it.
+    run = _active()
+    if run is None:
+        yield
+        return
+
+    stack = run['_stack']
+    record = {'name': name, 'depth': len(stack), 'wall_ms': 0.0, 'cache_hits': 0,
+              'cache_misses': 0, 'payload_bytes': 0, 'peak_alloc_bytes': None}
+    run['sections'].append(record)
+    entry = {'record': record, 'peak': 0, 'allocated': 0}
+    if run['track_memory']:
+        # Peaks are measured between resets, so the parent's peak so far is saved before resetting
+        current, peak = tracemalloc.get_traced_memory()
+        if stack:
+            stack[-1]['peak'] = max(stack[-1]['peak'], peak)
+        entry['allocated'] = current
+        tracemalloc.reset_peak()
+    stack.append(entry)
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        record['wall_ms'] = (time.perf_counter() - start) * 1000
+        stack.pop()
+        if cached and record['cache_misses'] == 0:
+            record['cache_hits'] += 1
+        if run['track_memory']:
+            peak = max(entry['peak'], tracemalloc.get_traced_memory()[1])
+            record['peak_alloc_bytes'] = max(0, peak - entry['allocated'])
+            if stack:
+                stack[-1]['peak'] = max(stack[-1]['peak'], peak)
+            tracemalloc.reset_peak()
+
+
+def profiled(name=None, cached=False, payload=False):
+    # Decorator form of section(), named after the function by default. With payload=True the
+    # return value is what gets displayed, and its size is recorded as the section's payload.
+    def decorator(func):
+        section_name = name or func.__name__
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            if _active() is None:
+                return func(*args, **kwargs)
+            with section(section_name, cached=cached):
+                result = func(*args, **kwargs)
+                if payload:
+                    record_payload(result)
+                return result
+        return wrapper
+    return decorator
+
+
+def _innermost():
+    run = _active()
+    if run is None or not run['_stack']:
+        return None
+    return run['_stack'][-1]['record']
+
+
+def cache_event(hit):
+    # Report a cache lookup to the innermost section, if any
+    record = _innermost()
+    if record is not None:
+        record['cache_hits' if hit else 'cache_misses'] += 1
+
+
+def payload_size(obj):
+    # Approximate number of bytes Streamlit sends for obj: Arrow data for frames, JSON for figures
+    if hasattr(obj, 'to_plotly_json'):
+        return len(obj.to_json())
+    if hasattr(obj, 'memory_usage'):
+        try:
+            return pa.Table.from_pandas(obj, preserve_index=False).nbytes
+        except (TypeError, ValueError):
+            return int(obj.memory_usage(deep=True).sum())
+    return len(str(obj))
+
+
+def record_payload(obj):
+    # Add the size of obj, about to be sent to the browser, to the innermost section; returns obj
+    record = _innermost()
+    if record is not None:
+        record['payload_bytes'] += payload_size(obj)
+    return obj
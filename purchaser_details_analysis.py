@@ -1,79 +1,77 @@
 # purchaser_details_analysis.py
 
-import pandas as pd
-import streamlit as st
-import plotly.express as px
+from app_cache import shared_dataset
+from dataset_artifact import load_dataset
+from dataset_graph import SCHEMAS, value
+from entity_resolution import load_names
+from profiling import cache_event, profiled
 
 
-@st.cache_data
+@profiled(cached=True)
+@shared_dataset
 def load_data_purchaser(file_name):
-    data = pd.read_csv(file_name)
-    data['Date of Purchase'] = pd.to_datetime(
-        data['Date of Purchase'], format='%d/%b/%Y')
-    data['Year'] = data['Date of Purchase'].dt.year
-    data['Year'] = data['Year'].apply(lambda x: int(str(x).replace(',', '')))
-    data['Month-Year'] = data['Date of Purchase'].dt.strftime('%b %Y')
-    return data
+    # Typed columnar artifact written by the cleaner (re-built from the CSV if missing or stale),
+    # with spelling variants of a name merged as listed in the dataset's names file (see
+    # entity_resolution). Year, Month-Year and every result below are nodes of dataset_graph,
+    # computed when first asked for.
+    cache_event(hit=False)  # only runs when the shared copy is missing or out of date
+    schema = SCHEMAS['purchaser']
+    return load_dataset(file_name, schema.date_column, schema.name_column, names=load_names(file_name))
 
 
+@profiled()
 def analyze_purchasers(df):
-    # number of unique purchasers
-    unique_purchasers = df['Purchaser Name'].nunique()
-    # sum of denominations
-    sum_denomination = df['Denomination'].sum()
-    # Mean, Median, Mode
-    mean = df['Denomination'].mean()
-    median = df['Denomination'].median()
-
-    # Quantiles
-    q1 = df['Denomination'].quantile(0.25)
-    q3 = df['Denomination'].quantile(0.75)
-    iqr = q3 - q1
-
-    # Quantiles over all data
-    qd = df.quantile([.25, 0.50, 0.75], method="table",
-                     interpolation="nearest", numeric_only=False)
-    # Return results
-    return unique_purchasers, sum_denomination, mean, median, q1, q3, iqr, qd
+    # number of unique purchasers, sum of denominations, mean, median, 1st/3rd quantiles, IQR and the
+    # quantiles over all data, computed together in one pass and cached per dataset version
+    return value(df, 'summary')
 
 
+@profiled(payload=True)
 def analyze_purchaser_sum(df):
-    # Convert epoch time to normal date
-    df['Date of Purchase'] = pd.to_datetime(df['Date of Purchase'], unit='ms')
-
     # return sum of purchases (denomination) grouped by purchaser name, along with the dates of purchase in dd/mm/yyyy as a list in the same row, sorted by latest date first
-    result = df.groupby('Purchaser Name').agg(
-        {'Denomination': 'sum', 'Date of Purchase': lambda x: x.sort_values(ascending=False).dt.strftime('%d/%m/%Y').tolist()}).reset_index()
-    return result
+    # (vectorized: one sort by name and date, dates formatted once, and the lists sliced out per name;
+    # cached per dataset version)
+    return value(df, 'rollup')
+
+
+@profiled()
+def sum_denomination_period_purchaser(df, granularity):
+    # sum of purchases (denomination) per day / week / month / quarter / year, in chronological order,
+    # cached per dataset version and granularity
+    return value(df, 'period_sums', granularity)
 
 
 def sum_denomination_year_purchaser(df):
-    return df.groupby('Year')['Denomination'].sum().reset_index()
+    return sum_denomination_period_purchaser(df, 'Year')
 
 
 def sum_denomination_month_purchaser(df):
-    monthly_sum = df.groupby('Month-Year')['Denomination'].sum().reset_index()
-    monthly_sum['Month-Year'] = pd.to_datetime(
-        monthly_sum['Month-Year'], format='%b %Y')
-    monthly_sum.sort_values('Month-Year', inplace=True)
-    return monthly_sum
+    return sum_denomination_period_purchaser(df, 'Month')
 
 
-def plot_graph_of_purchasers(purchasers_list):
-    # take a list of purchasers, and plot a graph of their purchases over time
-    df = load_data_purchaser(file_name='./01_Purchaser_Details.csv')
-    st.write(purchasers_list)
-    df = df[df['Purchaser Name'].isin(purchasers_list)]
-    st.dataframe(df, hide_index=True)
+@profiled()
+def purchaser_name_index(df):
+    # index over the purchaser names of the loaded dataset, cached per dataset version
+    return value(df, 'name_index')
 
-    purchaser_name = df.groupby(['Month-Year', 'Purchaser Name'])[
-        'Denomination'].sum().reset_index()
 
-    purchaser_name['Month-Year'] = pd.to_datetime(
-        purchaser_name['Month-Year'], format='%b %Y')
-    purchaser_name.sort_values('Month-Year', inplace=True)
+@profiled(payload=True)
+def purchaser_history(df, purchasers_list):
+    # rows of the given purchasers, in dataset order, with their Year and Month-Year
+    return value(df, 'history', tuple(purchasers_list))
 
-    # write name of month on x-axis
-    fig = px.line(purchaser_name, x='Month-Year', y='Denomination',
-                  color='Purchaser Name', title='Purchaser Name vs Denomination', markers=True)
-    return fig
+
+@profiled()
+def top_purchasers(df, n):
+    # the n purchasers with the largest total denomination, largest first
+    return value(df, 'top_names', n)
+
+
+@profiled(payload=True)
+def plot_graph_of_purchasers(purchasers_list, granularity='Month'):
+    # take a list of purchasers, and plot a graph of their purchases over time
+    df = load_data_purchaser(file_name='./01_Purchaser_Details.csv')
+    # sums per period of the selected purchasers, downsampled to the chart's resolution (WebGL when
+    # there are many points) and cached per names, granularity and dataset version
+    return value(df, 'entity_chart', tuple(purchasers_list), granularity,
+                 'Purchaser Name vs Denomination')
@@ -0,0 +1,185 @@
+# reconciliation.py
+
+from collections import deque, namedtuple
+
+import numpy as np
+import pandas as pd
+
+from derived_cache import cached_for_dataset, dataset_version
+from time_buckets import sums_per_code
+
+# A bond has to be encashed within 15 days of its purchase, the day of purchase included: a bond
+# bought on day p can be encashed on days p .. p + 14
+REDEMPTION_WINDOW_DAYS = 15
+
+# totals: one-row frame of overall amounts; by_party / by_purchaser: matched and unmatched amounts
+# and ambiguity per name; flows: matched amount per (purchaser, party) pair, largest first
+Reconciliation = namedtuple('Reconciliation', ['totals', 'by_party', 'by_purchaser', 'flows'])
+
+
+def _name_codes(names):
+    # Integer code per row and the names they stand for
+    if isinstance(names.dtype, pd.CategoricalDtype):
+        return names.cat.codes.to_numpy().astype('int64'), np.asarray(names.cat.categories, dtype=object)
+    codes, uniques = pd.factorize(names, sort=True)
+    return codes.astype('int64'), np.asarray(uniques, dtype=object)
+
+
+def match_day_counts(purchases, encashments, window):
+    # First purchased, first encashed matching of one denomination, on per-day counts.
+    # purchases[d] / encashments[d] are the number of bonds bought / encashed on day d; a bond
+    # bought on day p can be encashed on days p .. p + window - 1. Encashments take the oldest bonds
+    # still redeemable, which matches as many bonds as possible since every bond has the same
+    # window. The loop is over days, so its cost doesn't grow with the number of rows.
+    # Returns the number of matched bonds per day, for purchases and for encashments.
+    matched_purchases = np.zeros(len(purchases), dtype='int64')
+    matched_encashments = np.zeros(len(encashments), dtype='int64')
+    queue = deque()  # [purchase day, bonds not matched yet], oldest first
+    for day in np.flatnonzero((purchases > 0) | (encashments > 0)):
+        if purchases[day]:
+            queue.append([day, int(purchases[day])])
+        while queue and queue[0][0] <= day - window:
+            queue.popleft()  # expired, never encashed
+        needed = int(encashments[day])
+        while needed and queue:
+            head = queue[0]
+            taken = min(needed, head[1])
+            matched_purchases[head[0]] += taken
+            matched_encashments[day] += taken
+            needed -= taken
+            head[1] -= taken
+            if not head[1]:
+                queue.popleft()
+    return matched_purchases, matched_encashments
+
+
+def _matched_rows(buckets, matched_counts):
+    # Rows sorted by bucket (denomination, day), then dataset order, and which of them are matched:
+    # within a bucket the first matched_counts[bucket] rows are
+    order = np.argsort(buckets, kind='stable')
+    sorted_buckets = buckets[order]
+    bucket_starts = np.searchsorted(sorted_buckets, sorted_buckets)
+    rank = np.arange(len(order)) - bucket_starts
+    return order, rank < matched_counts[sorted_buckets]
+
+
+def _name_table(codes, names, amounts, matched, candidates, name_column, total_column):
+    # Matched / unmatched amounts and ambiguity per name
+    count = len(names)
+    bonds = np.bincount(codes, minlength=count)
+    total = sums_per_code(codes, amounts, count)
+    matched_total = sums_per_code(codes[matched], amounts[matched], count)
+    unambiguous = sums_per_code(codes[matched & (candidates == 1)], amounts[matched & (candidates == 1)], count)
+    table = pd.DataFrame({
+        name_column: names,
+        'Bonds': bonds,
+        total_column: total,
+        'Matched': matched_total,
+        'Unmatched': total - matched_total,
+        'Matched %': np.round(100 * matched_total / np.maximum(total, 1), 2),
+        # Bonds of the other side that could pair with each bond, on average
+        'Mean candidates': np.round(np.bincount(codes, weights=candidates, minlength=count) / np.maximum(bonds, 1), 2),
+        # Matched amount with exactly one possible counterpart
+        'Unambiguous': unambiguous,
+    })
+    return table[bonds > 0].sort_values(total_column, ascending=False, kind='stable').reset_index(drop=True)
+
+
+def reconcile(purchases, encashments, purchaser_column='Purchaser Name',
+              party_column='Name of the Political Party', purchase_date_column='Date of Purchase',
+              encashment_date_column='Date of Encashment', window=REDEMPTION_WINDOW_DAYS):
+    # Match purchased bonds to encashed bonds of the same denomination within the redemption
+    # window. Dates and denominations don't identify a bond, so this is one consistent
+    # assignment (first purchased, first encashed), not the actual bond trail; the candidate
+    # counts say how many other assignments were possible.
+    purchase_days = np.asarray(purchases[purchase_date_column], dtype='datetime64[D]').astype('int64')
+    encashment_days = np.asarray(encashments[encashment_date_column], dtype='datetime64[D]').astype('int64')
+    purchase_amounts = purchases['Denomination'].to_numpy().astype('int64')
+    encashment_amounts = encashments['Denomination'].to_numpy().astype('int64')
+
+    # One partition per denomination, each with a day axis covering both datasets
+    denominations, denomination_codes = np.unique(
+        np.concatenate((purchase_amounts, encashment_amounts)), return_inverse=True)
+    first_day = min(purchase_days.min(initial=0), encashment_days.min(initial=0))
+    num_days = max(purchase_days.max(initial=0), encashment_days.max(initial=0)) - first_day + 1
+    size = len(denominations) * num_days
+    purchase_buckets = denomination_codes[:len(purchases)] * num_days + (purchase_days - first_day)
+    encashment_buckets = denomination_codes[len(purchases):] * num_days + (encashment_days - first_day)
+    purchase_counts = np.bincount(purchase_buckets, minlength=size).reshape(len(denominations), num_days)
+    encashment_counts = np.bincount(encashment_buckets, minlength=size).reshape(len(denominations), num_days)
+
+    matched_purchase_counts = np.zeros_like(purchase_counts)
+    matched_encashment_counts = np.zeros_like(encashment_counts)
+    for d in range(len(denominations)):
+        matched_purchase_counts[d], matched_encashment_counts[d] = match_day_counts(
+            purchase_counts[d], encashment_counts[d], window)
+
+    # Within a (denomination, day) bucket the earliest rows are the matched ones. Matching is
+    # first in first out, so the i-th matched purchase pairs with the i-th matched encashment
+    # when both are listed by denomination, then date, then dataset order.
+    purchase_order, purchase_matched = _matched_rows(purchase_buckets, matched_purchase_counts.ravel())
+    encashment_order, encashment_matched = _matched_rows(encashment_buckets, matched_encashment_counts.ravel())
+    paired_purchases = purchase_order[purchase_matched]
+    paired_encashments = encashment_order[encashment_matched]
+    is_matched_purchase = np.zeros(len(purchases), dtype=bool)
+    is_matched_purchase[paired_purchases] = True
+    is_matched_encashment = np.zeros(len(encashments), dtype=bool)
+    is_matched_encashment[paired_encashments] = True
+
+    # Candidates: bonds of the same denomination on the other side within the window (days
+    # p .. p + window - 1, as in the matching), from prefix sums over each denomination's day
+    # axis (index 0 is an empty prefix)
+    zeros = np.zeros((len(denominations), 1), dtype='int64')
+    purchase_prefix = np.hstack((zeros, np.cumsum(purchase_counts, axis=1))).ravel()
+    encashment_prefix = np.hstack((zeros, np.cumsum(encashment_counts, axis=1))).ravel()
+    row_length = num_days + 1
+
+    def window_count(prefix, codes, low, high):
+        # Bonds on days low..high (clipped to the axis) of each row's denomination
+        base = codes * row_length
+        return prefix[base + np.clip(high + 1, 0, num_days)] - prefix[base + np.clip(low, 0, num_days)]
+
+    purchase_offsets = purchase_days - first_day
+    encashment_offsets = encashment_days - first_day
+    purchase_candidates = window_count(encashment_prefix, denomination_codes[:len(purchases)],
+                                       purchase_offsets, purchase_offsets + window - 1)
+    encashment_candidates = window_count(purchase_prefix, denomination_codes[len(purchases):],
+                                         encashment_offsets - window + 1, encashment_offsets)
+
+    purchaser_codes, purchaser_names = _name_codes(purchases[purchaser_column])
+    party_codes, party_names = _name_codes(encashments[party_column])
+    by_purchaser = _name_table(purchaser_codes, purchaser_names, purchase_amounts, is_matched_purchase,
+                               purchase_candidates, purchaser_column, 'Purchased')
+    by_party = _name_table(party_codes, party_names, encashment_amounts, is_matched_encashment,
+                           encashment_candidates, party_column, 'Encashed')
+
+    # Matched amount per (purchaser, party) pair
+    pair_keys = purchaser_codes[paired_purchases] * len(party_names) + party_codes[paired_encashments]
+    pairs, pair_index = np.unique(pair_keys, return_inverse=True)
+    flows = pd.DataFrame({
+        purchaser_column: purchaser_names[pairs // len(party_names)],
+        party_column: party_names[pairs % len(party_names)],
+        'Bonds': np.bincount(pair_index, minlength=len(pairs)),
+        'Matched': sums_per_code(pair_index, purchase_amounts[paired_purchases], len(pairs)),
+    }).sort_values('Matched', ascending=False, kind='stable').reset_index(drop=True)
+
+    matched_amount = int(purchase_amounts[paired_purchases].sum())
+    totals = pd.DataFrame({
+        'Purchased': [int(purchase_amounts.sum())],
+        'Encashed': [int(encashment_amounts.sum())],
+        'Matched': [matched_amount],
+        'Unmatched purchases': [int(purchase_amounts.sum()) - matched_amount],
+        'Unmatched encashments': [int(encashment_amounts.sum()) - matched_amount],
+        'Matched bonds': [len(paired_purchases)],
+    })
+    return Reconciliation(totals, by_party, by_purchaser, flows)
+
+
+def reconcile_datasets(purchases, encashments, window=REDEMPTION_WINDOW_DAYS):
+    # reconcile() of the loaded datasets, computed once per pair of dataset versions
+    encashment_version = dataset_version(encashments)
+    if encashment_version is None or dataset_version(purchases) is None:
+        return reconcile(purchases, encashments, window=window)
+    return cached_for_dataset(
+        purchases, ('reconciliation', encashment_version, len(encashments), window),
+        lambda: reconcile(purchases, encashments, window=window))
@@ -0,0 +1,78 @@
+# record_tokenizer.py
+
+import re
+from collections import namedtuple
+
+# One compiled pattern for both kinds of token on a page. Each new date marks the start of a
+# new record, the first denomination after it is that record's denomination.
+# The denomination group matches exactly 1,000 / 10,000 / 1,00,000 / 10,00,000 / 1,00,00,000 /
+# 10,00,00,000, and the leading lookahead lets the scanner skip non-digits quickly.
+TOKEN_PATTERN = re.compile(
+    r'(?=\d)(?:(?P<date>\d\d/[A-Za-z]{3}/20\d\d)'
+    r'|(?P<denomination>10?,(?:00,){0,2}000))')
+DATE_GROUP = TOKEN_PATTERN.groupindex['date']
+
+# Only six denominations exist, so look the value up instead of stripping commas and parsing
+DENOMINATION_VALUES = {
+    '1,000': 1000,
+    '10,000': 10000,
+    '1,00,000': 100000,
+    '10,00,000': 1000000,
+    '1,00,00,000': 10000000,
+    '10,00,00,000': 100000000,
+}
+
+# records: list of (date, name, denomination) tuples found on the page
+# date_count / denomination_count: number of each token on the page, used for the mismatch check
+PageTokens = namedtuple('PageTokens', ['records', 'date_count', 'denomination_count'])
+
+
+def _make_record(text, date_match, denomination_match, denomination_count, end):
+    date = date_match.group()
+    denomination = denomination_match.group()
+    if denomination_count == 1:
+        # Common case: the name is whatever sits around the single denomination
+        name = (text[date_match.end():denomination_match.start()] +
+                text[denomination_match.end():end]).strip()
+    else:
+        # Several denominations in one record: drop every occurrence of the first one,
+        # exactly like the original str.replace based cleaner did
+        name = text[date_match.start():end].replace(
+            date, '').replace(denomination, '').strip()
+    return (date, name, DENOMINATION_VALUES[denomination])
+
+
+def tokenize_page(text):
+    records = []
+    date_count = 0
+    denomination_count = 0
+
+    # State of the record currently being read
+    date_match = None
+    denomination_match = None
+    record_denominations = 0
+
+    # Walk the page once, token by token
+    for match in TOKEN_PATTERN.finditer(text):
+        if match.lastindex == DATE_GROUP:
+            date_count += 1
+            # A new date closes the previous record
+            if date_match is not None and denomination_match is not None:
+                records.append(_make_record(text, date_match, denomination_match,
+                                            record_denominations, match.start()))
+            date_match = match
+            denomination_match = None
+            record_denominations = 0
+        else:
+            denomination_count += 1
+            if date_match is not None:
+                record_denominations += 1
+                if denomination_match is None:
+                    denomination_match = match
+
+    # The last record runs to the end of the page
+    if date_match is not None and denomination_match is not None:
+        records.append(_make_record(text, date_match, denomination_match,
+                                    record_denominations, len(text)))
+
+    return PageTokens(records, date_count, denomination_count)
@@ -0,0 +1,80 @@
+# summary_stats.py
+
+import math
+from collections import namedtuple
+
+import numpy as np
+import pandas as pd
+
+from dataset_artifact import DENOMINATIONS
+
+# Everything the Purchaser / Encasher pages show in their statistics section. Still a tuple,
+# so code written against the old analyze_* return value keeps working.
+SummaryStats = namedtuple('SummaryStats', [
+    'unique_names', 'total_denomination', 'mean', 'median', 'q1', 'q3', 'iqr', 'quantiles'])
+
+TABLE_QUANTILES = [.25, 0.50, 0.75]
+
+
+def denomination_counts(values):
+    # Count how often each distinct denomination occurs. Bonds only come in six denominations,
+    # so this is a binary search into DENOMINATIONS per row instead of a sort.
+    codes = np.minimum(np.searchsorted(DENOMINATIONS, values), len(DENOMINATIONS) - 1)
+    if np.array_equal(DENOMINATIONS[codes], values):
+        return DENOMINATIONS, np.bincount(codes, minlength=len(DENOMINATIONS))
+    return np.unique(values, return_counts=True)
+
+
+def quantile_from_counts(values, counts, q):
+    # Exact linear-interpolation quantile (pandas' default) of the data described by
+    # sorted distinct `values` and their `counts`
+    position = (counts.sum() - 1) * q
+    below = math.floor(position)
+    gamma = position - below
+    cumulative = np.cumsum(counts)
+    a = float(values[np.searchsorted(cumulative, below, side='right')])
+    b = float(values[np.searchsorted(cumulative, math.ceil(position), side='right')])
+    # Same formula as numpy's quantile, so results match pandas to the last bit
+    if gamma >= 0.5:
+        return b - (b - a) * (1 - gamma)
+    return a + (b - a) * gamma
+
+
+def count_unique(names):
+    if isinstance(names.dtype, pd.CategoricalDtype):
+        # Categories that occur at least once, straight from the integer codes
+        codes = names.cat.codes.to_numpy()
+        return int(np.count_nonzero(np.bincount(codes[codes >= 0], minlength=1)))
+    return names.nunique()
+
+
+def table_quantiles(df):
+    # df.quantile([.25, .5, .75], method='table', interpolation='nearest', numeric_only=False)
+    # sorts all rows by every column and picks whole rows. When the first column is already
+    # strictly increasing (Sr No.), the sorted order is the current order and no sort is needed.
+    first = df.iloc[:, 0]
+    if len(df) and first.is_monotonic_increasing and first.is_unique:
+        positions = np.quantile(np.arange(len(df)), TABLE_QUANTILES, method='nearest')
+        result = df.iloc[positions]
+        result.index = pd.Index(TABLE_QUANTILES, dtype='float64')
+        return result
+    return df.quantile(TABLE_QUANTILES, method='table', interpolation='nearest', numeric_only=False)
+
+
+def compute_summary(df, name_column):
+    values, counts = denomination_counts(df['Denomination'].to_numpy())
+    n = int(counts.sum())
+    total = int((values * counts).sum())
+    q1 = np.float64(quantile_from_counts(values, counts, 0.25)) if n else np.nan
+    q3 = np.float64(quantile_from_counts(values, counts, 0.75)) if n else np.nan
+    return SummaryStats(
+        unique_names=count_unique(df[name_column]),
+        total_denomination=np.int64(total),
+        mean=np.float64(total / n) if n else np.nan,
+        median=np.float64(quantile_from_counts(values, counts, 0.5)) if n else np.nan,
+        q1=q1,
+        q3=q3,
+        iqr=q3 - q1,
+        quantiles=table_quantiles(df),
+    )
+
@@ -0,0 +1,97 @@
+# time_buckets.py
+
+import numpy as np
+import pandas as pd
+
+GRANULARITIES = ('Day', 'Week', 'Month', 'Quarter', 'Year')
+
+# Name of the period column in the aggregated frame, per granularity
+PERIOD_COLUMNS = {
+    'Day': 'Date',
+    'Week': 'Week',
+    'Month': 'Month-Year',
+    'Quarter': 'Quarter',
+    'Year': 'Year',
+}
+
+# 1970-01-01 was a Thursday; shifting by 3 days makes weeks start on Monday
+WEEK_OFFSET_DAYS = 3
+
+
+def period_codes(dates, granularity):
+    # Integer code of the period each date falls in, increasing with time:
+    # days / weeks / months / quarters / years since the start of 1970
+    values = np.asarray(dates, dtype='datetime64[ns]')
+    if granularity == 'Day':
+        return values.astype('datetime64[D]').astype('int64')
+    if granularity == 'Week':
+        return (values.astype('datetime64[D]').astype('int64') + WEEK_OFFSET_DAYS) // 7
+    if granularity == 'Month':
+        return values.astype('datetime64[M]').astype('int64')
+    if granularity == 'Quarter':
+        return values.astype('datetime64[M]').astype('int64') // 3
+    if granularity == 'Year':
+        return values.astype('datetime64[Y]').astype('int64')
+    raise ValueError(f"Unknown granularity {granularity!r}, expected one of {GRANULARITIES}")
+
+
+def period_labels(codes, granularity):
+    # Inverse of period_codes: the first day of each period (the calendar year for 'Year')
+    codes = np.asarray(codes, dtype='int64')
+    if granularity == 'Day':
+        starts = codes.astype('datetime64[D]')
+    elif granularity == 'Week':
+        starts = (codes * 7 - WEEK_OFFSET_DAYS).astype('datetime64[D]')
+    elif granularity == 'Month':
+        starts = codes.astype('datetime64[M]')
+    elif granularity == 'Quarter':
+        starts = (codes * 3).astype('datetime64[M]')
+    elif granularity == 'Year':
+        return codes + 1970
+    else:
+        raise ValueError(f"Unknown granularity {granularity!r}, expected one of {GRANULARITIES}")
+    return starts.astype('datetime64[ns]')
+
+
+def month_year_labels(month_codes):
+    # 'Month-Year' ('%b %Y') of every row, from its 'Month' period code, as a categorical in
+    # chronological order. Each distinct month is formatted once instead of every row.
+    unique_codes, codes = np.unique(month_codes, return_inverse=True)
+    labels = pd.DatetimeIndex(period_labels(unique_codes, 'Month')).strftime('%b %Y')
+    return pd.Categorical.from_codes(codes.astype('int32'), categories=labels)
+
+
+def sums_per_code(codes, values, length):
+    # Sum of values per code (0 .. length - 1), in the values' dtype. float64 holds integers below
+    # 2**53 exactly, so integers are summed with a weighted bincount while their total stays
+    # below that, and with np.add.at otherwise.
+    if np.issubdtype(values.dtype, np.integer) and np.abs(values).sum() < 2 ** 53:
+        return np.bincount(codes, weights=values, minlength=length).astype(values.dtype)
+    sums = np.zeros(length, dtype=values.dtype)
+    np.add.at(sums, codes, values)
+    return sums
+
+
+def sum_by_period(df, date_column, granularity='Month', value_column='Denomination'):
+    # Sum of value_column per period, for the periods that have data, in chronological order
+    return sum_by_codes(period_codes(df[date_column], granularity), df[value_column].to_numpy(),
+                        granularity, value_column)
+
+
+def sum_by_codes(codes, values, granularity, value_column='Denomination'):
+    # sum_by_period of rows whose period codes are already known.
+    # Dates are bucketed as integer codes and summed with one bincount, no string formatting.
+    if len(codes) == 0:
+        return pd.DataFrame({PERIOD_COLUMNS[granularity]: period_labels(codes, granularity),
+                             value_column: values[:0]})
+
+    first = codes.min()
+    offsets = codes - first
+    counts = np.bincount(offsets)
+    sums = sums_per_code(offsets, values, len(counts))
+
+    present = np.flatnonzero(counts)
+    return pd.DataFrame({
+        PERIOD_COLUMNS[granularity]: period_labels(present + first, granularity),
+        value_column: sums[present],
+    })
@@ -0,0 +1,348 @@
+# tranche_ingest.py
+#
+# Append-only ingestion of a new disclosure tranche (a PDF with the newly published pages) into
+# an existing cleaned CSV, with materialized aggregates kept up to date instead of recomputed.
+#
+#   python tranche_ingest.py append purchaser new_tranche.pdf
+#   python tranche_ingest.py append encasher republished_full.pdf --cumulative
+#   python tranche_ingest.py verify purchaser
+#   python tranche_ingest.py rebuild purchaser --pdf ./pdf_data/Purchaser_Details_Final.pdf
+#
+# Next to the CSV it keeps:
+#   <csv>.aggregates.json  sums per entity, month and year, and denomination counts, updated by
+#                          adding each tranche's records; tied to the CSV by its SHA-256, and to
+#                          the names file its entities are merged with (see entity_resolution)
+#   <csv>.ingest.json      the tranches appended so far, the fingerprints of the pages they came
+#                          from and the records of the last one, so a re-published cumulative PDF
+#                          only has its new pages read and its last partial page isn't counted twice
+
+import argparse
+import csv
+import json
+import os
+import sys
+import time
+from collections import Counter, deque
+
+import pandas as pd
+
+from dataset_artifact import file_digest, load_dataset, names_version, write_artifact
+from dataset_graph import SCHEMAS
+from entity_resolution import load_names
+from pdf_extraction import extract_selected_pages, page_fingerprints
+
+AGGREGATES_FORMAT = 1
+
+# Leading records of a tranche looked for in the CSV before appending it, about a page's worth. A
+# bond buyer often has many identical rows in a row, so a few rows alike prove nothing, but a
+# page of them in the same order means the tranche repeats rows that were already appended.
+REPEATED_RUN_ROWS = 50
+
+def aggregates_path(csv_path):
+    return csv_path + '.aggregates.json'
+
+
+def manifest_path(csv_path):
+    return csv_path + '.ingest.json'
+
+
+def _read_json(path):
+    try:
+        with open(path) as file:
+            return json.load(file)
+    except (OSError, ValueError):
+        return None
+
+
+def _write_json(path, data):
+    # Write to a temporary file and rename it, so the file is never half written
+    with open(path + '.tmp', 'w') as file:
+        json.dump(data, file, indent=1, sort_keys=True)
+    os.replace(path + '.tmp', path)
+
+
+def empty_aggregates():
+    return {
+        'format': AGGREGATES_FORMAT,
+        'csv_sha256': None,
+        'rows': 0,
+        'max_sr_no': 0,
+        'total': 0,
+        'by_entity': {},            # name -> [bonds, sum]
+        'by_month': {},             # 'YYYY-MM' -> sum
+        'by_year': {},              # 'YYYY' -> sum
+        'denomination_counts': {},  # denomination -> bonds
+    }
+
+
+def add_records(aggregates, frame, date_column, name_column):
+    # Add the rows of `frame` (parsed dates, names, integer denominations, Sr No.) to the
+    # aggregates in place. Each group is summed once per call, so a tranche costs one groupby.
+    if frame.empty:
+        return aggregates
+    amounts = frame['Denomination'].astype('int64')
+    names = frame[name_column].astype(str)
+    dates = frame[date_column]
+
+    by_entity = amounts.groupby(names, sort=False).agg(['size', 'sum'])
+    for name, (bonds, total) in zip(by_entity.index, by_entity.itertuples(index=False)):
+        current = aggregates['by_entity'].setdefault(name, [0, 0])
+        current[0] += int(bonds)
+        current[1] += int(total)
+    for key, total in amounts.groupby(dates.dt.strftime('%Y-%m'), sort=False).sum().items():
+        aggregates['by_month'][key] = aggregates['by_month'].get(key, 0) + int(total)
+    for key, total in amounts.groupby(dates.dt.year.astype(str), sort=False).sum().items():
+        aggregates['by_year'][key] = aggregates['by_year'].get(key, 0) + int(total)
+    for key, bonds in amounts.value_counts(sort=False).items():
+        aggregates['denomination_counts'][str(key)] = aggregates['denomination_counts'].get(str(key), 0) + int(bonds)
+
+    aggregates['rows'] += len(frame)
+    aggregates['total'] += int(amounts.sum())
+    aggregates['max_sr_no'] = max(aggregates['max_sr_no'], int(frame['Sr No.'].max()))
+    return aggregates
+
+
+def compute_aggregates(csv_path, date_column, name_column):
+    # Aggregates of the whole CSV, from scratch, with names merged like the loaders merge them
+    names = load_names(csv_path)
+    aggregates = add_records(empty_aggregates(), load_dataset(csv_path, date_column, name_column, names=names),
+                             date_column, name_column)
+    aggregates['csv_sha256'] = file_digest(csv_path)
+    aggregates['names_version'] = names_version(names) if names else None
+    return aggregates
+
+
+def load_aggregates(csv_path, date_column, name_column, names=None):
+    # Stored aggregates of the CSV, recomputed when missing or when the CSV was rewritten since
+    # (a full re-run of the cleaner, or an append interrupted between the CSV and the aggregates),
+    # or when the names they were merged with (`names`, the CSV's names file) changed
+    aggregates = _read_json(aggregates_path(csv_path))
+    if (aggregates is None or aggregates.get('format') != AGGREGATES_FORMAT
+            or aggregates.get('csv_sha256') != file_digest(csv_path)
+            or aggregates.get('names_version') != (names_version(names) if names else None)):
+        print("Aggregates missing or out of date, recomputing them from the CSV")
+        aggregates = compute_aggregates(csv_path, date_column, name_column)
+        _write_json(aggregates_path(csv_path), aggregates)
+    return aggregates
+
+
+def load_manifest(csv_path):
+    return _read_json(manifest_path(csv_path)) or {'tranches': [], 'page_fingerprints': {}, 'last_page_records': []}
+
+
+def new_pages(fingerprints, known):
+    # Page numbers of a cumulative PDF that weren't ingested before. Identical pages do occur, so
+    # fingerprints are counted: a page is known only while earlier copies are left to match.
+    remaining = Counter(known)
+    pages = []
+    for i, key in enumerate(fingerprints):
+        if remaining[key]:
+            remaining[key] -= 1
+        else:
+            pages.append(i)
+    return pages
+
+
+def repeated_run(csv_path, records, run_rows=REPEATED_RUN_ROWS):
+    # Sr No. of the CSV row where the first run_rows records (all of them, if fewer) start, when
+    # they're already in the CSV in the same order; None otherwise. The CSV is streamed, keeping
+    # the last run_rows rows only.
+    wanted = [[str(field) for field in record] for record in records[:run_rows]]
+    if not wanted:
+        return None
+    recent = deque(maxlen=len(wanted))
+    with open(csv_path, newline='', encoding='utf-8') as file:
+        reader = csv.reader(file)
+        next(reader, None)
+        for row in reader:
+            recent.append(row)
+            if row[1:] == wanted[-1] and len(recent) == len(wanted) \
+                    and all(have[1:] == want for have, want in zip(recent, wanted)):
+                return int(recent[0][0])
+    return None
+
+
+def undo_interrupted_append(csv_path, manifest):
+    # An append that didn't get to record its tranche left an in-progress entry with the CSV's
+    # size before it: drop whatever part of the rows it wrote, so the tranche can be appended again
+    pending = manifest.get('in_progress')
+    if pending is None:
+        return
+    if os.path.getsize(csv_path) > pending['csv_size']:
+        print(f"Undoing an interrupted append to {csv_path}, truncating it to {pending['csv_size']} bytes")
+        with open(csv_path, 'r+b') as file:
+            file.truncate(pending['csv_size'])
+    del manifest['in_progress']
+    _write_json(manifest_path(csv_path), manifest)
+
+
+def append_tranche(dataset, pdf_path, csv_path=None, workers=None, cumulative=False, force=False):
+    # Extract the records of a tranche, append them to the dataset's CSV with Sr No. continuing
+    # from the current maximum, and add them to the stored aggregates. Returns the rows appended.
+    # Raises ValueError, appending nothing, when the tranche starts with rows the CSV already has
+    # (pages not recognised as ingested, say), unless `force`.
+    schema = SCHEMAS[dataset]
+    csv_path = csv_path or schema.csv_file
+    date_column, name_column = schema.date_column, schema.name_column
+    manifest = load_manifest(csv_path)
+    undo_interrupted_append(csv_path, manifest)
+    names = load_names(csv_path)
+    aggregates = load_aggregates(csv_path, date_column, name_column, names)
+
+    pdf_digest = file_digest(pdf_path)
+    if any(tranche['sha256'] == pdf_digest for tranche in manifest['tranches']):
+        print(f"{pdf_path} was already appended to {csv_path}, nothing to do")
+        return 0
+
+    fingerprints = page_fingerprints(pdf_path)
+    pages = new_pages(fingerprints, Counter(manifest['page_fingerprints'])) if cumulative \
+        else list(range(len(fingerprints)))
+    print(f"{len(pages)} of {len(fingerprints)} pages to extract")
+
+    records = []
+    last_page_records = manifest.get('last_page_records', [])
+    for i, (_, page) in zip(pages, extract_selected_pages(pdf_path, pages, workers=workers)):
+        records.extend(page.records)
+        last_page_records = [list(record) for record in page.records]
+        if page.date_count != page.denomination_count:
+            print(f"Mismatch found on Page {i + 1}: Date Length = {page.date_count}, "
+                  f"Denomination Length = {page.denomination_count}")
+
+    # The last page ingested before was probably only partly filled, and is re-published with more
+    # rows (so with a new fingerprint). Its records were appended already, leave them out.
+    known = manifest.get('last_page_records', [])
+    if cumulative and known and [list(record) for record in records[:len(known)]] == known:
+        print(f"Skipping {len(known)} records already appended from the previous last page")
+        records = records[len(known):]
+
+    repeated = None if force else repeated_run(csv_path, records)
+    if repeated is not None:
+        raise ValueError(
+            f"The first {min(len(records), REPEATED_RUN_ROWS)} records of {pdf_path} are already in {csv_path} "
+            f"from Sr No. {repeated}, nothing appended. If the PDF re-publishes pages already ingested, "
+            f"append it with --cumulative (after 'rebuild --pdf' if the pages aren't known); "
+            f"--force appends it anyway.")
+
+    first_sr_no = aggregates['max_sr_no'] + 1
+    frame = pd.DataFrame(records, columns=[date_column, name_column, 'Denomination'])
+    frame.insert(0, 'Sr No.', range(first_sr_no, first_sr_no + len(frame)))
+
+    # Recorded before the CSV is touched: if the append is interrupted, the next run finds this
+    # entry and cuts the CSV back to its size before, instead of appending the rows a second time
+    manifest['in_progress'] = {'sha256': pdf_digest, 'csv_size': os.path.getsize(csv_path)}
+    _write_json(manifest_path(csv_path), manifest)
+
+    # Append to the CSV in the cleaners' dialect, so the result is what a full run would write
+    with open(csv_path, 'a', newline='', encoding='utf-8') as file:
+        csv.writer(file, lineterminator='\n').writerows(frame.itertuples(index=False))
+
+    # Recorded in the same write that clears the entry above, so the CSV and the manifest agree
+    # whichever side of it a run stops
+    del manifest['in_progress']
+    manifest['tranches'].append({
+        'pdf': os.path.basename(pdf_path), 'sha256': pdf_digest, 'pages': len(pages),
+        'rows': len(frame), 'first_sr_no': first_sr_no, 'last_sr_no': first_sr_no + len(frame) - 1,
+        'appended': time.strftime('%Y-%m-%dT%H:%M:%S'),
+    })
+    for i in pages:
+        key = fingerprints[i]
+        manifest['page_fingerprints'][key] = manifest['page_fingerprints'].get(key, 0) + 1
+    manifest['last_page_records'] = last_page_records
+    _write_json(manifest_path(csv_path), manifest)
+
+    # The CSV keeps the names as extracted, the aggregates have them merged
+    frame[date_column] = pd.to_datetime(frame[date_column], format='%d/%b/%Y')
+    if names:
+        frame[name_column] = frame[name_column].map(lambda name: names.get(name, name))
+    add_records(aggregates, frame, date_column, name_column)
+    aggregates['csv_sha256'] = file_digest(csv_path)
+    _write_json(aggregates_path(csv_path), aggregates)
+
+    # The typed artifact is one Arrow file, so it's rewritten rather than appended to
+    write_artifact(csv_path, date_column, name_column)
+    return len(frame)
+
+
+def rebuild(dataset, csv_path=None, pdf_path=None):
+    # Recompute the aggregates from the CSV. With the PDF the CSV was converted from, also record
+    # its page fingerprints and last page, so later cumulative tranches skip those pages.
+    schema = SCHEMAS[dataset]
+    csv_path = csv_path or schema.csv_file
+    date_column, name_column = schema.date_column, schema.name_column
+    _write_json(aggregates_path(csv_path), compute_aggregates(csv_path, date_column, name_column))
+    if pdf_path is not None:
+        manifest = load_manifest(csv_path)
+        fingerprints = page_fingerprints(pdf_path)
+        manifest['page_fingerprints'] = dict(Counter(fingerprints))
+        manifest['last_page_records'] = [
+            list(record) for _, page in extract_selected_pages(pdf_path, [len(fingerprints) - 1] if fingerprints else [])
+            for record in page.records]
+        _write_json(manifest_path(csv_path), manifest)
+
+
+def verify(dataset, csv_path=None):
+    # Compare the stored aggregates with a full recompute; returns the list of differences
+    schema = SCHEMAS[dataset]
+    csv_path = csv_path or schema.csv_file
+    date_column, name_column = schema.date_column, schema.name_column
+    stored = _read_json(aggregates_path(csv_path))
+    if stored is None:
+        return [f"{aggregates_path(csv_path)} is missing"]
+    expected = compute_aggregates(csv_path, date_column, name_column)
+
+    differences = []
+    for key, value in expected.items():
+        if isinstance(value, dict):
+            for item in sorted(set(value) | set(stored.get(key, {}))):
+                if value.get(item) != stored.get(key, {}).get(item):
+                    differences.append(f"{key}[{item!r}]: stored {stored.get(key, {}).get(item)}, expected {value.get(item)}")
+        elif stored.get(key) != value:
+            differences.append(f"{key}: stored {stored.get(key)}, expected {value}")
+    return differences
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description='Append new disclosure tranches to the cleaned CSVs and maintain their aggregates')
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    append_parser = commands.add_parser('append', help='Append the records of a tranche PDF')
+    append_parser.add_argument('dataset', choices=SCHEMAS)
+    append_parser.add_argument('pdf')
+    append_parser.add_argument('--cumulative', action='store_true',
+                               help='The PDF re-publishes the pages already ingested, only read the new ones')
+    append_parser.add_argument('--workers', type=int, default=None,
+                               help='Number of processes used to extract pages (default: number of cores, 1 = serial)')
+    append_parser.add_argument('--force', action='store_true',
+                               help='Append even if the tranche starts with rows the CSV already has')
+
+    verify_parser = commands.add_parser('verify', help='Check the stored aggregates against a full recompute')
+    verify_parser.add_argument('dataset', choices=SCHEMAS)
+
+    rebuild_parser = commands.add_parser('rebuild', help='Recompute the stored aggregates from the CSV')
+    rebuild_parser.add_argument('dataset', choices=SCHEMAS)
+    rebuild_parser.add_argument('--pdf', default=None,
+                                help='PDF the CSV was converted from, its pages count as ingested')
+
+    for command_parser in (append_parser, verify_parser, rebuild_parser):
+        command_parser.add_argument('--csv', default=None, help='CSV to work on (default: the dataset\'s CSV)')
+    args = parser.parse_args()
+
+    if args.command == 'append':
+        start = time.perf_counter()
+        try:
+            rows = append_tranche(args.dataset, args.pdf, args.csv, workers=args.workers,
+                                  cumulative=args.cumulative, force=args.force)
+        except ValueError as error:
+            print(error)
+            sys.exit(1)
+        print(f"Appended {rows} rows in {time.perf_counter() - start:.1f} s")
+    elif args.command == 'rebuild':
+        rebuild(args.dataset, args.csv, args.pdf)
+        print("Aggregates rebuilt")
+    else:
+        differences = verify(args.dataset, args.csv)
+        for difference in differences:
+            print(difference)
+        print("Aggregates match a full recompute" if not differences else f"{len(differences)} differences found")
+        sys.exit(1 if differences else 0)